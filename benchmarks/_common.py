@@ -0,0 +1,148 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Sólo usan la biblioteca estándar: los datos (status, logs, index.txt) se
+generan sintéticos en un directorio temporal y el management interface es
+un servidor TCP local que imita las respuestas de OpenVPN.
+"""
+
+import gc
+import importlib.util
+import socket
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "src" / "ovpn-manager.py"
+
+# Hora fija para que los datos generados no dependan del momento de la ejecución
+CONNECTED_SINCE_TS = 1791792000
+
+def load_manager():
+    """Importa src/ovpn-manager.py como módulo (el guion del nombre impide un import normal)"""
+    spec = importlib.util.spec_from_file_location("ovpn_manager", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def client_rows(clients: int):
+    """Datos de `clients` sesiones: (CN, dirección real, IP virtual, recibidos, enviados, Client ID)"""
+    for i in range(clients):
+        a, b = i // 250 % 250, i % 250
+        yield (f"user{i}", f"198.51.{a}.{b}:{40000 + i % 20000}", f"10.8.{a}.{b}",
+               i * 1000, i * 2000, str(i))
+
+def status_text(clients: int, version: int = 3):
+    """Archivo de status de OpenVPN (versión 1, 2 o 3) con `clients` sesiones"""
+    since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(CONNECTED_SINCE_TS))
+    if version == 1:
+        lines = ["OpenVPN CLIENT LIST", f"Updated,{since}",
+                 "Common Name,Real Address,Bytes Received,Bytes Sent,Connected Since"]
+        rows = list(client_rows(clients))
+        lines += [f"{cn},{real},{recv},{sent},{since}" for cn, real, _, recv, sent, _ in rows]
+        lines += ["ROUTING TABLE", "Virtual Address,Common Name,Real Address,Last Ref"]
+        lines += [f"{virtual},{cn},{real},{since}" for cn, real, virtual, _, _, _ in rows]
+        lines += ["GLOBAL STATS", "Max bcast/mcast queue length,0", "END"]
+        return "\n".join(lines) + "\n"
+    sep = '\t' if version == 3 else ','
+    return "\n".join(status3_lines(clients, sep)) + "\n"
+
+def status3_lines(clients: int, sep: str = '\t'):
+    """Líneas de un `status 3` (o versión 2 con sep=',') terminadas en END"""
+    since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(CONNECTED_SINCE_TS))
+    lines = [f"TITLE{sep}OpenVPN 2.6.8",
+             f"TIME{sep}{since}{sep}{CONNECTED_SINCE_TS}",
+             sep.join(["HEADER", "CLIENT_LIST", "Common Name", "Real Address", "Virtual Address",
+                       "Virtual IPv6 Address", "Bytes Received", "Bytes Sent", "Connected Since",
+                       "Connected Since (time_t)", "Username", "Client ID", "Peer ID",
+                       "Data Channel Cipher"])]
+    rows = list(client_rows(clients))
+    lines += [sep.join(["CLIENT_LIST", cn, real, virtual, "", str(recv), str(sent), since,
+                        str(CONNECTED_SINCE_TS), "UNDEF", cid, cid, "AES-256-GCM"])
+              for cn, real, virtual, recv, sent, cid in rows]
+    lines.append(sep.join(["HEADER", "ROUTING_TABLE", "Virtual Address", "Common Name",
+                           "Real Address", "Last Ref", "Last Ref (time_t)"]))
+    lines += [sep.join(["ROUTING_TABLE", virtual, cn, real, since, str(CONNECTED_SINCE_TS)])
+              for cn, real, virtual, _, _, _ in rows]
+    lines += [sep.join(["GLOBAL_STATS", "Max bcast/mcast queue length", "0"]), "END"]
+    return lines
+
+class FakeManagementServer:
+    """
+    Management interface falso en 127.0.0.1 (puerto libre).
+
+    Envía el banner al conectar, responde a `status` con `status_reply` y a
+    cualquier otro comando con SUCCESS.
+    """
+
+    def __init__(self, status_reply: bytes):
+        self.status_reply = status_reply
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                conn.sendall(b">INFO:OpenVPN Management Interface Version 3 -- type 'help' for more info\r\n")
+                for line in conn.makefile('rb'):
+                    if line.startswith(b"status"):
+                        conn.sendall(self.status_reply)
+                    elif line.startswith(b"quit"):
+                        return
+                    else:
+                        conn.sendall(b"SUCCESS: ok\r\n")
+            except OSError:
+                return
+
+def status_reply(clients: int):
+    """Respuesta de `status 3` tal como la envía OpenVPN (CRLF)"""
+    return ("\r\n".join(status3_lines(clients)) + "\r\n").encode()
+
+def best_of(func, repeat: int = 5):
+    """Mejor tiempo (segundos) de `repeat` ejecuciones de func()"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_memory(func):
+    """(resultado, pico de memoria en bytes) de func() medido con tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def retained_memory(func):
+    """(resultado, bytes que siguen reservados al terminar func()) medido con tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def report(label: str, value: str):
+    print(f"{label:<48} {value}")
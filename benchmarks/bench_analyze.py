@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+SnapshotAnalytics (`analyze`) sobre muchos snapshots del archivo de status.
+
+Genera `--snapshots` archivos de status versión 3, uno por minuto, con
+`--clients` filas cada uno; las sesiones se renuevan cada 5, 20 o 100
+snapshots, así que cada sesión aparece en muchos archivos. Mide la carga
+(del más reciente al más antiguo, como hace `analyze`), las consultas y la
+memoria que queda retenida por sesión y el pico durante la carga.
+
+Antes comprueba que leer con bloques diminutos (la cabecera y las filas
+caen en bloques distintos) da el mismo resultado que con bloques de 8 MB.
+
+    python benchmarks/bench_analyze.py [--snapshots 20] [--clients 50000]
+
+Con --snapshots 100 --clients 100000 son 10M filas (1,3 GB en disco).
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from _common import CONNECTED_SINCE_TS, load_manager, peak_memory, report, retained_memory
+
+HEADER = ("TITLE\tOpenVPN 2.6.8\nTIME\tx\t0\n"
+          "HEADER\tCLIENT_LIST\tCommon Name\tReal Address\tVirtual Address\tVirtual IPv6 Address\t"
+          "Bytes Received\tBytes Sent\tConnected Since\tConnected Since (time_t)\tUsername\t"
+          "Client ID\tPeer ID\tData Channel Cipher\n")
+
+def write_snapshots(directory: str, snapshots: int, clients: int):
+    """Archivos status-NNN.log con mtime un minuto posterior al anterior"""
+    rng = random.Random(3)
+    lifetimes = [rng.choice((5, 20, 100)) for _ in range(clients)]
+    paths = []
+    for k in range(snapshots):
+        lines = [HEADER]
+        for i, life in enumerate(lifetimes):
+            generation = k // life
+            since = CONNECTED_SINCE_TS + generation * life * 60
+            received = (k - generation * life + 1) * (i % 997 + 1) * 1000
+            lines.append(f"CLIENT_LIST\tuser{i % 20000}\t198.{i % 200}.{i // 200 % 250}.{i % 250}:"
+                         f"{40000 + generation}\t10.8.0.{i % 250}\t\t{received}\t{received * 2}\t"
+                         f"Mon Oct 12 09:00:00 2026\t{since}\tUNDEF\t{i}\t{i}\tAES-256-GCM\n")
+        lines.append("END\n")
+        path = os.path.join(directory, f"status-{k:03d}.log")
+        with open(path, 'w') as f:
+            f.write("".join(lines))
+        taken = CONNECTED_SINCE_TS + k * 60
+        os.utime(path, (taken, taken))
+        paths.append(path)
+    return paths
+
+def summary(ovpn, paths):
+    analytics = ovpn.SnapshotAnalytics()
+    for path in paths:
+        analytics.add_file(path)
+    return len(analytics), analytics.by_user(), analytics.by_subnet(), sorted(analytics.durations())
+
+def check_chunk_sizes(ovpn, directory: str):
+    """Tamaños de bloque cuyo resultado difiere del de ANALYTICS_CHUNK_BYTES = 8 MB"""
+    paths = write_snapshots(directory, 6, 300)[::-1]
+    saved = ovpn.ANALYTICS_CHUNK_BYTES
+    try:
+        ovpn.ANALYTICS_CHUNK_BYTES = 1 << 23
+        expected = summary(ovpn, paths)
+        wrong = []
+        for size in (1, 50, 200, 333, 4096):
+            ovpn.ANALYTICS_CHUNK_BYTES = size
+            if summary(ovpn, paths) != expected:
+                wrong.append(size)
+        return wrong
+    finally:
+        ovpn.ANALYTICS_CHUNK_BYTES = saved
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--snapshots", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=50000)
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="No medir memoria (tracemalloc multiplica el tiempo de carga)")
+    args = parser.parse_args()
+    ovpn = load_manager()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wrong = check_chunk_sizes(ovpn, tmp)
+        if wrong:
+            print(f"FALLO: bloques de {', '.join(map(str, wrong))} bytes no coinciden con los de 8 MB")
+            return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_snapshots(tmp, args.snapshots, args.clients)[::-1]
+
+        def load():
+            analytics = ovpn.SnapshotAnalytics()
+            for path in paths:
+                analytics.add_file(path)
+            return analytics
+
+        start = time.perf_counter()
+        analytics = load()
+        elapsed = time.perf_counter() - start
+        rows, sessions = analytics.rows, len(analytics)
+        print(f"{rows} filas de {args.snapshots} snapshots, {sessions} sesiones\n")
+        report("carga (add_file)", f"{elapsed:8.2f} s  ({elapsed / rows * 1e6:.2f} µs/fila)")
+
+        start = time.perf_counter()
+        ovpn.percentiles(analytics.durations())
+        ovpn.percentiles(analytics.throughputs())
+        report("percentiles de duración y throughput", f"{time.perf_counter() - start:8.2f} s")
+        for label, query in (("totales por usuario", analytics.by_user),
+                             ("totales por subred", analytics.by_subnet)):
+            start = time.perf_counter()
+            query()
+            report(label, f"{time.perf_counter() - start:8.2f} s")
+
+        if not args.no_tracemalloc:
+            del analytics
+            analytics, held = retained_memory(load)
+            report("memoria retenida", f"{held / 1e6:8.1f} MB ({held / sessions:.0f} B/sesión)")
+            _, peak = peak_memory(load)
+            report("pico durante la carga", f"{peak / 1e6:8.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
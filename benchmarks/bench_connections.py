@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Registros Connection (__slots__) frente a un diccionario por cliente.
+
+Usa una respuesta sintética de `status 3` con 10k clientes: la referencia
+con diccionarios es la conversión que hacía antes get_active_connections_mgmt
+(una fila -> dict por cabecera -> dict de conexión).
+
+    python benchmarks/bench_connections.py [--clients 10000]
+"""
+
+import argparse
+
+from _common import (FakeManagementServer, best_of, load_manager, report, retained_memory,
+                     status3_lines, status_reply)
+
+SNAPSHOTS = 5
+
+def connection_dict(row):
+    """Diccionario de conexión tal como se construía antes de Connection"""
+    return {
+        'user': row.get('Common Name', 'N/A'),
+        'real_ip': row.get('Real Address', 'N/A'),
+        'virtual_ip': row.get('Virtual Address') or 'N/A',
+        'bytes_recv': int(row.get('Bytes Received') or 0),
+        'bytes_sent': int(row.get('Bytes Sent') or 0),
+        'connected_since': row.get('Connected Since') or 'N/A',
+        'connected_since_ts': int(row.get('Connected Since (time_t)') or 0),
+        'client_id': row.get('Client ID', ''),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    args = parser.parse_args()
+    ovpn = load_manager()
+    lines = status3_lines(args.clients)
+
+    def parse_dicts():
+        return [connection_dict(row) for kind, row in ovpn.iter_status_rows(lines)
+                if kind == 'CLIENT_LIST']
+
+    class Lines:
+        # Cliente mínimo: get_active_connections_mgmt sólo llama a iter_command
+        def iter_command(self, cmd):
+            return iter(lines)
+
+    def parse_records():
+        return list(ovpn.get_active_connections_mgmt(Lines()))
+
+    dicts, records = parse_dicts(), parse_records()
+    assert len(dicts) == len(records) == args.clients
+    print(f"{args.clients} clientes, {SNAPSHOTS} snapshots en memoria\n")
+    report("análisis dict (filas ya leídas)", f"{best_of(parse_dicts) * 1000:8.1f} ms")
+    report("análisis Connection (filas ya leídas)", f"{best_of(parse_records) * 1000:8.1f} ms")
+
+    _, dict_bytes = retained_memory(lambda: [parse_dicts() for _ in range(SNAPSHOTS)])
+    _, record_bytes = retained_memory(lambda: [parse_records() for _ in range(SNAPSHOTS)])
+    per_client = SNAPSHOTS * args.clients
+    report("memoria dict", f"{dict_bytes / 1e6:8.1f} MB ({dict_bytes / per_client:.0f} B/cliente)")
+    report("memoria Connection", f"{record_bytes / 1e6:8.1f} MB ({record_bytes / per_client:.0f} B/cliente)")
+
+    def traffic_dicts():
+        key = lambda c: c.get('bytes_recv', 0) + c.get('bytes_sent', 0)
+        return sum(map(key, dicts)), sorted(dicts, key=key)
+
+    def traffic_records():
+        key = lambda c: c.bytes_total
+        return sum(map(key, records)), sorted(records, key=key)
+
+    report("suma + orden por tráfico dict", f"{best_of(traffic_dicts, 20) * 1000:8.2f} ms")
+    report("suma + orden por tráfico Connection", f"{best_of(traffic_records, 20) * 1000:8.2f} ms")
+
+    users = [conn['user'] for conn in dicts[::100]]
+    connection_set = ovpn.ConnectionSet(records)
+    connection_set.by_user(users[0])  # construye el índice
+    report(f"{len(users)} búsquedas por CN recorriendo la lista",
+           f"{best_of(lambda: [[c for c in dicts if c['user'] == u] for u in users]) * 1000:8.1f} ms")
+    report(f"{len(users)} búsquedas por CN con ConnectionSet",
+           f"{best_of(lambda: [connection_set.by_user(u) for u in users]) * 1000:8.3f} ms")
+
+    with FakeManagementServer(status_reply(args.clients)) as server:
+        client = ovpn.ManagementClient("127.0.0.1", server.port)
+        elapsed = best_of(lambda: list(ovpn.get_active_connections_mgmt(client)))
+        client.close()
+    report("get_active_connections_mgmt (socket local)", f"{elapsed * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
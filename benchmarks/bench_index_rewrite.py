@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Reescritura atómica de pki/index.txt (remove_index_entries) en un índice de 100k líneas.
+
+Mide el tiempo y el pico de memoria de eliminar las entradas de un CN bajo
+pki_lock(), y lo compara con la versión anterior (leer todo el archivo y
+reescribirlo en su sitio). También comprueba la coincidencia exacta del CN:
+restaurar 'user1' no debe tocar 'user10' ni 'user1-old'.
+
+    python benchmarks/bench_index_rewrite.py [--entries 100000]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from _common import load_manager, peak_memory, report
+
+def write_index(path: Path, entries: int):
+    """index.txt con `entries` certificados vigentes (más dos CN parecidos a user1)"""
+    lines = [f"V\t301231000000Z\t\t{i:X}\tunknown\t/CN=user{i}\n" for i in range(entries)]
+    lines.append(f"R\t301231000000Z\t260101000000Z\t{entries:X}\tunknown\t/CN=user1-old\n")
+    path.write_text("".join(lines))
+
+def remove_in_place(index_path: Path, username: str):
+    """Versión anterior: lectura completa y reescritura en el mismo archivo"""
+    with open(index_path) as f:
+        lines = f.readlines()
+    with open(index_path, 'w') as f:
+        for line in lines:
+            if f"/CN={username}" not in line:
+                f.write(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    ovpn = load_manager()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pki = Path(tmp) / "pki"
+        pki.mkdir()
+        index_path = pki / "index.txt"
+        reference = Path(tmp) / "index.reference"
+        write_index(reference, args.entries)
+        print(f"index.txt de {args.entries} entradas ({reference.stat().st_size / 1e6:.1f} MB)\n")
+
+        def remove():
+            with ovpn.pki_lock(tmp):
+                return ovpn.remove_index_entries("user1", index_path)
+
+        best = float('inf')
+        for _ in range(args.repeat):
+            shutil.copyfile(reference, index_path)
+            start = time.perf_counter()
+            removed = remove()
+            best = min(best, time.perf_counter() - start)
+        shutil.copyfile(reference, index_path)
+        _, peak = peak_memory(remove)
+        text = index_path.read_text()
+        assert removed == 1 and "/CN=user10\n" in text and "/CN=user1-old\n" in text
+        report("remove_index_entries (pki_lock + fsync + rename)",
+               f"{best * 1000:7.1f} ms  pico {peak / 1024:8.0f} KiB")
+
+        shutil.copyfile(reference, index_path)
+        start = time.perf_counter()
+        remove_in_place(index_path, "user1")
+        elapsed = time.perf_counter() - start
+        shutil.copyfile(reference, index_path)
+        _, peak = peak_memory(lambda: remove_in_place(index_path, "user1"))
+        lost = args.entries + 1 - len(index_path.read_text().splitlines())
+        report("versión anterior (readlines + 'w')",
+               f"{elapsed * 1000:7.1f} ms  pico {peak / 1024:8.0f} KiB  ({lost} entradas eliminadas)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Lectura de `status 3` del management interface por bloques hasta END.
+
+Un servidor local falso sirve una respuesta sintética de 10k clientes. Se
+mide la lectura completa y, como referencia, cuántas filas trae un único
+recv(8192), que es lo que leía la versión anterior.
+
+    python benchmarks/bench_management_status.py [--clients 10000]
+"""
+
+import argparse
+import socket
+import time
+
+from _common import FakeManagementServer, best_of, load_manager, report, status_reply
+
+def single_recv_rows(port: int):
+    """Filas CLIENT_LIST de una sola llamada recv(8192) tras pedir `status 3`"""
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.recv(8192)  # banner
+        sock.sendall(b"status 3\n")
+        time.sleep(0.05)
+        return sock.recv(8192).count(b"\nCLIENT_LIST\t")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    args = parser.parse_args()
+    ovpn = load_manager()
+    reply = status_reply(args.clients)
+
+    with FakeManagementServer(reply) as server:
+        client = ovpn.ManagementClient("127.0.0.1", server.port)
+        rows = list(ovpn.get_active_connections_mgmt(client))
+        assert len(rows) == args.clients, len(rows)
+        print(f"{args.clients} clientes, respuesta de {len(reply) / 1024:.0f} KiB\n")
+
+        report("status 3 completo", f"{best_of(lambda: list(ovpn.get_active_connections_mgmt(client))) * 1000:8.1f} ms")
+        client.close()
+        report("filas con un único recv(8192) (versión anterior)",
+               f"{single_recv_rows(server.port):8d} de {args.clients}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+parse_status_file con archivos de status de 20k clientes en las versiones 1, 2 y 3.
+
+Para cada versión mide el análisis completo (caché vacía) y la llamada con
+el archivo sin cambios (sólo copia las conexiones cacheadas), y comprueba
+que todas las conexiones traen su IP virtual (en la versión 1 sale de la
+tabla de rutas).
+
+    python benchmarks/bench_status_file.py [--clients 20000]
+"""
+
+import argparse
+import os
+import tempfile
+
+from _common import best_of, load_manager, report, status_text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20000)
+    args = parser.parse_args()
+    ovpn = load_manager()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for version in (1, 2, 3):
+            path = os.path.join(tmp, f"status-v{version}.log")
+            with open(path, 'w') as f:
+                f.write(status_text(args.clients, version))
+            connections = ovpn.parse_status_file(path)
+            assert len(connections) == args.clients
+            assert all(conn.virtual_ip != 'N/A' for conn in connections)
+
+            def cold():
+                ovpn._status_cache.clear()
+                return ovpn.parse_status_file(path)
+
+            report(f"versión {version}, {args.clients} clientes",
+                   f"{best_of(cold) * 1000:7.1f} ms  sin cambios "
+                   f"{best_of(lambda: ovpn.parse_status_file(path)) * 1000:6.1f} ms")
+
+if __name__ == "__main__":
+    main()
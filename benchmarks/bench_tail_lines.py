@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Últimas líneas del log leyendo hacia atrás por bloques (read_log_file).
+
+Genera logs sintéticos de varios tamaños (con texto UTF-8 multibyte y sin
+salto de línea final) y mide tiempo y pico de memoria al pedir 50 líneas:
+ambos deben ser iguales sea cual sea el tamaño del archivo. Como referencia
+se mide también readlines() completo, que es lo que hacía la versión anterior.
+
+    python benchmarks/bench_tail_lines.py [--sizes 10,200,1000] [--lines 50]
+"""
+
+import argparse
+import os
+import tempfile
+
+from _common import best_of, load_manager, peak_memory, report
+
+LINE = "2026-10-18 09:30:00 us=123456 user{}/198.51.100.7:40000 MULTI: ñandú → paquete reenviado\n"
+
+def write_log(path: str, size_mb: int):
+    """Log de unos `size_mb` MB sin salto de línea final"""
+    block = "".join(LINE.format(i) for i in range(10000)).encode()
+    with open(path, 'wb') as f:
+        for _ in range(max(1, size_mb * 1024 * 1024 // len(block))):
+            f.write(block)
+        f.write("última línea sin salto ✓".encode())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,200,1000", help="Tamaños en MB separados por comas")
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--readlines-max", type=int, default=200,
+                        help="Tamaño máximo (MB) al que se mide la referencia con readlines()")
+    args = parser.parse_args()
+    ovpn = load_manager()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in map(int, args.sizes.split(',')):
+            path = os.path.join(tmp, f"openvpn-{size_mb}.log")
+            write_log(path, size_mb)
+            lines, peak = peak_memory(lambda: ovpn.read_log_file(path, args.lines))
+            assert len(lines) == args.lines and lines[-1] == "última línea sin salto ✓"
+            elapsed = best_of(lambda: ovpn.read_log_file(path, args.lines))
+            report(f"{size_mb:>5} MB  read_log_file({args.lines})",
+                   f"{elapsed * 1000:7.2f} ms  pico {peak / 1024:8.0f} KiB")
+            if size_mb <= args.readlines_max:
+                def readlines():
+                    with open(path, encoding='utf-8', errors='replace') as f:
+                        return f.readlines()[-args.lines:]
+                _, peak = peak_memory(readlines)
+                report(f"{size_mb:>5} MB  readlines() (versión anterior)",
+                       f"{best_of(readlines, 1) * 1000:7.0f} ms  pico {peak / 1024:8.0f} KiB")
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
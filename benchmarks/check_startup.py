@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Presupuesto de arranque de los subcomandos: falla si se supera.
+
+Ejecuta cada subcomando con `python -X importtime` varias veces y suma el
+tiempo de los imports de primer nivel que hace el script: los que ya carga
+el intérprete vacío (`python -c pass`: site, encodings...) no cuentan, así
+que sólo se mide lo que añade el script. De cada import se toma el mejor
+tiempo de las ejecuciones, para no medir el ruido de la máquina. Termina
+con código 1 si algún módulo de rich se importa o si el tiempo supera el
+presupuesto.
+
+    python benchmarks/check_startup.py [--budget 50] [--runs 5] [--command=certs ...]
+"""
+
+import argparse
+import shlex
+import subprocess
+import sys
+
+from _common import SCRIPT, report
+
+# Modos no interactivos que no deben cargar rich
+DEFAULT_COMMANDS = ["certs", "connections --format json"]
+
+def imports(argv):
+    """[(módulo, µs acumulados, es de primer nivel)] de una ejecución con -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", *argv],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].rstrip()
+        modules.append((package.strip(), int(fields[1]), not package.startswith('   ')))
+    return modules
+
+def import_times(command, baseline, runs):
+    """(ms de imports de primer nivel del script, módulos de rich importados) de varias ejecuciones
+
+    De cada import se toma su mejor tiempo entre las ejecuciones: un pico
+    de la máquina en un módulo no cuenta aunque caiga en todas las pasadas.
+    """
+    best, rich = {}, set()
+    for _ in range(runs):
+        for module, cumulative, top_level in imports([str(SCRIPT), *command]):
+            if module.split('.')[0] == 'rich':
+                rich.add(module)
+            # Primer nivel: su tiempo acumulado ya incluye los imports que anida
+            if top_level and module not in baseline:
+                best[module] = min(best.get(module, cumulative), cumulative)
+    return sum(best.values()) / 1000, sorted(rich)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=50.0, help="Presupuesto en ms (por defecto 50)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--command", action="append",
+                        help="Subcomando a medir (repetible; por defecto 'certs' y "
+                             "'connections --format json')")
+    args = parser.parse_args()
+
+    baseline = {module for module, _, _ in imports(["-c", "pass"])}
+    failed = False
+    for command in args.command or DEFAULT_COMMANDS:
+        best, rich = import_times(shlex.split(command), baseline, args.runs)
+        ok = best <= args.budget and not rich
+        failed |= not ok
+        report(command, f"{best:6.1f} ms (presupuesto {args.budget:.0f} ms)  "
+                        f"{'OK' if ok else 'FALLO'}")
+        if rich:
+            print(f"  importa rich: {', '.join(rich[:5])}{' ...' if len(rich) > 5 else ''}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,28 +4,484 @@ OpenVPN Manager CLI
 Gestión interactiva de servidor OpenVPN
 """
 
-import socket
-import subprocess
-from pathlib import Path
-from datetime import datetime
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from rich.prompt import Prompt, Confirm
-from rich.live import Live
-from rich.layout import Layout
-from rich import box
+import os
+import sys
 import re
 import time
+import threading
+import heapq
+import itertools
+import zlib
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime, timedelta, timezone
 
-console = Console()
+# El resto de módulos (Rich incluido) se importan donde se usan: un subcomando
+# con salida JSON/CSV no debe pagar el coste de cargar la interfaz interactiva.
+
+class _DeferredConsole:
+    """Marcador de la consola de Rich hasta que load_ui() la crea en el primer uso"""
+
+    def __getattr__(self, name):
+        load_ui()
+        return getattr(console, name)
+
+console = _DeferredConsole()
+
+def load_ui():
+    """Importa Rich y crea la consola (menú interactivo y pantallas)"""
+    global console, ANSI_COLOR_SYSTEMS, Table, Panel, Style, Prompt, Confirm, Live, Layout, Group, box
+    global Progress, SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn, TimeElapsedColumn
+    if not isinstance(console, _DeferredConsole):
+        return
+    
+    from rich.console import Console, Group
+    from rich.table import Table
+    from rich.panel import Panel
+    from rich.style import Style
+    from rich.color import ColorSystem
+    from rich.prompt import Prompt, Confirm
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn, TimeElapsedColumn
+    from rich.live import Live
+    from rich.layout import Layout
+    from rich import box
+    
+    ANSI_COLOR_SYSTEMS = {
+        "standard": ColorSystem.STANDARD,
+        "256": ColorSystem.EIGHT_BIT,
+        "truecolor": ColorSystem.TRUECOLOR,
+        "windows": ColorSystem.WINDOWS,
+    }
+    console = Console()
+    if _timings is not None:
+        _instrument_ui()
+
+def _instrument_ui():
+    """Con --timings: el dibujado de Rich y la espera en los prompts se miden como tramos propios"""
+    global Prompt, Confirm, Live
+    draw = console.print
+    
+    def print_timed(*args, **kwargs):
+        with span(RENDER_SPAN):
+            draw(*args, **kwargs)
+    
+    def waiting(base):
+        ask = base.ask.__func__
+        
+        def ask_timed(cls, *args, **kwargs):
+            with span(WAIT_SPAN):
+                return ask(cls, *args, **kwargs)
+        return type(base.__name__, (base,), {'ask': classmethod(ask_timed)})
+    
+    class TimedLive(Live):
+        def refresh(self):
+            with span(RENDER_SPAN):
+                super().refresh()
+    
+    console.print = print_timed
+    Prompt, Confirm, Live = waiting(Prompt), waiting(Confirm), TimedLive
 
 # Configuración por defecto (ajustar según tu servidor)
 DEFAULT_LOG_PATH = "/var/log/openvpn/openvpn.log"
 DEFAULT_STATUS_PATH = "/var/log/openvpn/openvpn-status.log"
 DEFAULT_MGMT_HOST = "localhost"
 DEFAULT_MGMT_PORT = 7505
+DEFAULT_MGMT_UNIX_SOCKET = None      # Ej: "/run/openvpn/server.sock" con `management /run/openvpn/server.sock unix`
+DEFAULT_MGMT_PASSWORD_FILE = None    # Archivo de contraseña si se usa `management ... pw-file`
 EASYRSA_PATH = "/etc/openvpn/easy-rsa"
+CRL_PUBLISH_PATH = None              # Ruta de `crl-verify` si no es <easy-rsa>/pki/crl.pem (se copia ahí al regenerarla)
+
+# Inventario de instancias de OpenVPN (una sección INI por servidor). Si no
+# existe se gestiona un único servidor con los valores de arriba
+SERVERS_CONFIG_PATH = "/etc/ovpn-manager/servers.ini"
+
+# Archivo de bloqueo dentro de pki/ para serializar cambios en el PKI
+PKI_LOCK_NAME = ".ovpn-manager.lock"
+
+# Filas por página en los selectores de usuario
+USER_PAGE_SIZE = 20
+
+# Tamaño de bloque al leer el log desde el final
+LOG_BLOCK_SIZE = 65536
+
+# Índice de búsqueda en logs (fuera de /var/log para no requerir escribir allí)
+LOG_INDEX_PATH = os.path.expanduser("~/.cache/ovpn-manager/log-index.sqlite3")
+LOG_INDEX_BATCH = 10000
+LOG_SEARCH_LIMIT = 500
+
+# Sondeo del log en modo seguimiento cuando no hay inotify (segundos, se duplica en reposo)
+LOG_FOLLOW_MIN_INTERVAL = 0.05
+LOG_FOLLOW_MAX_INTERVAL = 1.0
+
+# Tamaño de lectura del management interface (la respuesta de status puede ocupar cientos de KB)
+MGMT_RECV_SIZE = 65536
+MGMT_RECONNECT_DELAY = 0.5           # Espera inicial entre reintentos de conexión (se duplica)
+MGMT_NOTIFICATION_BACKLOG = 1000     # Notificaciones asíncronas retenidas en memoria
+MGMT_PIPELINE_BATCH = 256            # Comandos enviados seguidos antes de leer sus respuestas
+LIVE_BYTECOUNT_INTERVAL = 2          # Segundos entre notificaciones >BYTECOUNT_CLI en modo en vivo
+LIVE_RESYNC_INTERVAL = 30            # Segundos entre snapshots completos en modo en vivo
+
+# Caducidad leída de pki/issued/*.crt cuando index.txt no la tiene (caché por archivo)
+CERT_EXPIRY_CACHE_PATH = os.path.expanduser("~/.cache/ovpn-manager/cert-expiry.json")
+CERT_SCAN_POOL_MIN = 256             # Archivos pendientes a partir de los que se usa un pool de procesos
+
+# Exportador de métricas de Prometheus (`ovpn-manager serve-metrics`)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9176
+METRICS_REFRESH_INTERVAL = 15.0      # Segundos entre consultas al management interface
+CERT_EXPIRING_DAYS = 30              # Un certificado "caduca pronto" dentro de este margen
+
+# Histórico de tráfico por usuario (datos propios: no vive en ~/.cache)
+TRAFFIC_HISTORY_PATH = os.path.expanduser("~/.local/share/ovpn-manager/traffic.sqlite3")
+TRAFFIC_RECORD_INTERVAL = 60         # Segundos entre snapshots en `traffic record`
+TRAFFIC_SESSION_TTL = 86400          # Sesiones sin ver durante este tiempo se olvidan
+# Retención en días de cada resolución
+TRAFFIC_RETENTION_DAYS = {'minute': 2, 'hour': 90, 'day': 1825}
+
+# Formato del inicio de sesión al mostrar una conexión (el del status de OpenVPN 2.5+)
+CONNECTED_SINCE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Tramos de --timings para la interfaz: dibujado de Rich y espera en los prompts
+# (la espera al usuario no cuenta como duración de la acción)
+RENDER_SPAN = "rich (dibujado)"
+WAIT_SPAN = "Prompt.ask (usuario)"
+
+# Bytes de status leídos por bloque en `analyze` (acota la memoria de lectura)
+ANALYTICS_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Plazo máximo por fuente al calcular estadísticas (segundos); el resto se muestra sin esperar
+STATS_SOURCE_DEADLINES = {
+    'management': 3,
+    'status_file': 5,
+    'valid': 10,
+    'revoked': 10,
+}
+
+# Archivos de configuración buscados en orden cuando no se indica --config ni OVPN_MANAGER_CONFIG
+CONFIG_PATHS = ("/etc/ovpn-manager/config.toml", "/etc/ovpn-manager/config.ini")
+CONFIG_SECTION = "ovpn-manager"
+CONFIG_ENV_PREFIX = "OVPN_MANAGER_"
+
+# Ajustes que se pueden sobrescribir: nombre -> valor por defecto (las constantes de arriba).
+# El tipo del valor por defecto decide cómo se interpreta el texto de archivo/entorno
+SETTINGS_DEFAULTS = {
+    'log_path': DEFAULT_LOG_PATH,
+    'status_path': DEFAULT_STATUS_PATH,
+    'mgmt_host': DEFAULT_MGMT_HOST,
+    'mgmt_port': DEFAULT_MGMT_PORT,
+    'mgmt_unix_socket': DEFAULT_MGMT_UNIX_SOCKET,
+    'mgmt_password_file': DEFAULT_MGMT_PASSWORD_FILE,
+    'easyrsa_path': EASYRSA_PATH,
+    'crl_path': CRL_PUBLISH_PATH,
+    'servers_path': SERVERS_CONFIG_PATH,
+    'log_index_path': LOG_INDEX_PATH,
+    'cert_cache_path': CERT_EXPIRY_CACHE_PATH,
+    'traffic_history_path': TRAFFIC_HISTORY_PATH,
+    'metrics_host': METRICS_HOST,
+    'metrics_port': METRICS_PORT,
+    'metrics_interval': METRICS_REFRESH_INTERVAL,
+    'cert_expiring_days': CERT_EXPIRING_DAYS,
+}
+SETTINGS_PATH_FIELDS = {
+    'log_path', 'status_path', 'mgmt_unix_socket', 'mgmt_password_file', 'easyrsa_path', 'crl_path',
+    'servers_path', 'log_index_path', 'cert_cache_path', 'traffic_history_path',
+}
+
+Settings = namedtuple('Settings', list(SETTINGS_DEFAULTS) + ['config_path'])
+
+# Ajustes activos de la sesión: main() los sustituye con configure(load_settings(...))
+settings = Settings(config_path=None, **SETTINGS_DEFAULTS)
+
+def _setting_value(name: str, value, origin: str):
+    """Convierte un valor de archivo/entorno/opción al tipo del ajuste"""
+    default = SETTINGS_DEFAULTS[name]
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "" and default is None:
+            return None
+    try:
+        if isinstance(default, bool):
+            raise TypeError
+        if isinstance(default, int):
+            value = int(value)
+        elif isinstance(default, float):
+            value = float(value)
+        else:
+            value = str(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{origin}: valor no válido para {name}: {value!r}") from None
+    if name in SETTINGS_PATH_FIELDS:
+        value = os.path.expanduser(value)
+    return value
+
+def read_config_file(path: str):
+    """
+    Lee los ajustes de un archivo TOML o INI (sección [ovpn-manager]).
+
+    En TOML también se aceptan las claves en el nivel superior. Leer TOML
+    requiere Python 3.11+ o el paquete tomli.
+
+    Returns:
+        Diccionario nombre -> valor sin convertir
+    """
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError(f"{path}: leer TOML requiere Python 3.11+ o el paquete tomli (usa un .ini)") from None
+        with open(path, 'rb') as f:
+            try:
+                data = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"{path}: {e}") from None
+        data = data.get(CONFIG_SECTION, data)
+    else:
+        import configparser
+
+        parser = configparser.ConfigParser(interpolation=None)
+        with open(path, encoding='utf-8') as f:
+            try:
+                parser.read_file(f)
+            except configparser.Error as e:
+                raise ValueError(f"{path}: {e}") from None
+        data = dict(parser[CONFIG_SECTION]) if parser.has_section(CONFIG_SECTION) else {}
+    unknown = sorted(set(data) - set(SETTINGS_DEFAULTS))
+    if unknown:
+        raise ValueError(f"{path}: ajustes desconocidos: {', '.join(unknown)}")
+    return data
+
+def load_settings(config_path: str = None, overrides: dict = None, environ=None):
+    """
+    Construye los ajustes por capas; cada una sobrescribe a la anterior:
+
+        1. Constantes del script (valores por defecto)
+        2. Archivo de configuración: `config_path`, OVPN_MANAGER_CONFIG o el
+           primero de CONFIG_PATHS que exista
+        3. Variables de entorno OVPN_MANAGER_<AJUSTE> (p. ej. OVPN_MANAGER_MGMT_PORT)
+        4. `overrides` (opciones de la línea de comandos; None = no indicada)
+
+    Args:
+        config_path: Archivo explícito (debe existir)
+        overrides: Diccionario nombre -> valor
+        environ: Entorno a usar (por defecto os.environ)
+
+    Returns:
+        Settings inmutable
+    """
+    environ = os.environ if environ is None else environ
+    values = dict(SETTINGS_DEFAULTS)
+
+    path = config_path or environ.get(CONFIG_ENV_PREFIX + "CONFIG") or None
+    if path is None:
+        path = next((candidate for candidate in CONFIG_PATHS if os.path.exists(candidate)), None)
+    if path is not None:
+        for name, value in read_config_file(path).items():
+            values[name] = _setting_value(name, value, path)
+
+    for name in SETTINGS_DEFAULTS:
+        variable = CONFIG_ENV_PREFIX + name.upper()
+        if variable in environ:
+            values[name] = _setting_value(name, environ[variable], variable)
+
+    for name, value in (overrides or {}).items():
+        if value is not None:
+            values[name] = _setting_value(name, value, "--" + name.replace('_', '-'))
+    return Settings(config_path=path, **values)
+
+def configure(new_settings: Settings):
+    """Activa unos ajustes para el resto de la sesión (descarta lo que dependía de los anteriores)"""
+    global settings, _servers
+    close_mgmt_client()
+    _servers = None
+    settings = new_settings
+
+# Ajustes explícitos de la llamada en curso (using_settings); sin ellos, los globales
+_active_settings = ContextVar('ovpn_manager_settings', default=None)
+
+def current_settings():
+    """Ajustes en vigor: los activados con using_settings() en este contexto o, si no, los globales"""
+    return _active_settings.get() or settings
+
+@contextmanager
+def using_settings(explicit: Settings = None):
+    """
+    Usa unos ajustes sólo durante el bloque y sólo en el contexto actual.
+
+    A diferencia de configure(), no toca el estado global: otros hilos y
+    llamadas siguen con sus ajustes. Los hilos que se lanzan dentro del
+    bloque (gather_sources, pools) heredan el contexto. None no cambia nada.
+    """
+    if explicit is None:
+        yield current_settings()
+        return
+    token = _active_settings.set(explicit)
+    try:
+        yield explicit
+    finally:
+        _active_settings.reset(token)
+
+class Timings:
+    """
+    Tiempo acumulado por tramo (span) durante una acción.
+
+    Lo alimentan las funciones marcadas con @timed y los bloques span(); los
+    tramos de fuentes consultadas en paralelo se solapan, así que la suma
+    puede superar la duración de la acción. El tiempo esperando al usuario
+    (WAIT_SPAN) se descuenta del total.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, elapsed: float):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def total(self):
+        """Duración de la acción sin la espera al usuario"""
+        return time.perf_counter() - self.started - self.spans.get(WAIT_SPAN, (0, 0.0))[1]
+
+    def rows(self):
+        """Filas span, calls, ms y % del total, de más a menos tiempo (sin la espera al usuario)"""
+        total = self.total()
+        return [{'span': name, 'calls': calls, 'ms': round(seconds * 1000, 1),
+                 'percent': round(seconds / total * 100, 1) if total > 0 else 0.0}
+                for name, (calls, seconds) in sorted(self.spans.items(), key=lambda item: -item[1][1])
+                if name != WAIT_SPAN]
+
+# Medición activa (--timings / --profile) y perfilador de cProfile; None sin esas opciones
+_timings = None
+_profiler = None
+_profile_path = None
+# Perfil acumulado de los hilos de gather_sources (pstats.Stats): antes de Python 3.12
+# cProfile sólo mide el hilo que lo activa. Se funden al terminar cada hilo, así que
+# ocupa lo mismo en una sesión larga o en serve-metrics
+_thread_stats = None
+_thread_stats_lock = threading.Lock()
+
+def enable_profiling(timings: bool, profile_path: str = None):
+    """Activa la medición por acción; con `profile_path` también cProfile (implica timings)"""
+    global _timings, _profiler, _profile_path
+    if profile_path:
+        import cProfile
+        
+        _profiler = cProfile.Profile()
+        _profile_path = profile_path
+    if timings or profile_path:
+        _timings = Timings()
+
+def profiled(func):
+    """Llama a func() con un perfil propio si --profile está activo (para hilos auxiliares)"""
+    global _thread_stats
+    # Desde 3.12 cProfile usa sys.monitoring: el perfil principal ya ve todos los
+    # hilos y activar un segundo perfil falla ("Another profiling tool is already active")
+    if _profiler is None or sys.version_info >= (3, 12):
+        return func()
+    import cProfile
+    import pstats
+    
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func)
+    finally:
+        with _thread_stats_lock:
+            if _thread_stats is None:
+                _thread_stats = pstats.Stats(profile)
+            else:
+                _thread_stats.add(profile)
+
+@contextmanager
+def span(name: str):
+    """Suma la duración del bloque al tramo `name` si hay medición activa"""
+    timings = _timings
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+def _timed_generator(timings: Timings, name: str, gen):
+    # Sólo cuenta el tiempo dentro del generador, no el de quien consume las filas
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        gen.close()
+        timings.add(name, elapsed)
+
+def timed(func):
+    """
+    Decorador: cada llamada suma su duración al tramo con el nombre de la
+    función. Sin medición activa sólo añade una comprobación por llamada.
+    """
+    import functools
+    
+    name = func.__qualname__
+    # CO_GENERATOR: en un generador se mide la iteración, no la creación
+    generator = bool(func.__code__.co_flags & 0x20)
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = _timings
+        if timings is None:
+            return func(*args, **kwargs)
+        if generator:
+            return _timed_generator(timings, name, func(*args, **kwargs))
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.add(name, time.perf_counter() - start)
+    return wrapper
+
+@contextmanager
+def measure(action: str, report):
+    """
+    Mide una acción completa con --timings / --profile; sin ellos no hace nada.
+
+    Al terminar llama a `report(acción, timings)` y, con --profile, vuelve a
+    escribir el archivo de cProfile con lo acumulado en la sesión (hilo
+    principal más los hilos de gather_sources).
+    """
+    global _timings
+    if _timings is None:
+        yield
+        return
+    _timings = timings = Timings()
+    if _profiler is not None:
+        _profiler.enable()
+    try:
+        yield
+    finally:
+        if _profiler is not None:
+            import pstats
+            
+            _profiler.disable()
+            stats = pstats.Stats(_profiler)
+            with _thread_stats_lock:
+                if _thread_stats is not None:
+                    stats.add(_thread_stats)
+            stats.dump_stats(_profile_path)
+        report(action, timings)
 
 def clear_screen():
     """Limpia la pantalla"""
@@ -55,17 +511,56 @@ def show_menu():
     menu.add_row("5", "👢 Desconectar usuario activo")
     menu.add_row("6", "📊 Estadísticas generales")
     menu.add_row("7", "⚙️  Configuración")
+    menu.add_row("8", "🔎 Buscar en logs")
+    menu.add_row("9", "🆕 Alta masiva de usuarios")
     menu.add_row("0", "❌ Salir")
     
     console.print(Panel(menu, title="[bold]Menú Principal[/bold]", border_style="blue"))
     console.print()
 
+def tail_lines(f, lines: int, block_size: int = LOG_BLOCK_SIZE):
+    """
+    Obtiene las últimas líneas de un archivo binario leyendo bloques desde el final.
+
+    Sólo se lee lo necesario para reunir `lines` líneas, por lo que el coste no
+    depende del tamaño del archivo. Se separan las líneas antes de decodificar:
+    el byte de salto de línea nunca forma parte de un carácter UTF-8 multibyte.
+
+    Args:
+        f: Archivo abierto en modo binario
+        lines: Número de líneas a devolver
+        block_size: Tamaño de cada lectura hacia atrás
+
+    Returns:
+        Lista de líneas decodificadas, sin salto de línea
+    """
+    if lines <= 0:
+        return []
+    
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    chunks = []
+    newlines = 0
+    # Con salto de línea final hacen falta lines + 1 separadores para tener la primera línea completa
+    while pos > 0 and newlines <= lines:
+        size = min(block_size, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size)
+        chunks.append(chunk)
+        newlines += chunk.count(b"\n")
+    
+    data = b"".join(reversed(chunks))
+    parts = data.split(b"\n")
+    if parts and parts[-1] == b"":
+        parts.pop()
+    return [part.rstrip(b"\r").decode('utf-8', errors='replace') for part in parts[-lines:]]
+
 def read_log_file(log_path: str, lines: int = 50):
     """Lee las últimas líneas del log"""
     try:
-        with open(log_path, 'r') as f:
-            all_lines = f.readlines()
-            return all_lines[-lines:]
+        with open(log_path, 'rb') as f:
+            return tail_lines(f, lines)
     except FileNotFoundError:
         console.print(f"[red]❌ No se encontró el archivo de log: {log_path}[/red]")
         return []
@@ -73,9 +568,206 @@ def read_log_file(log_path: str, lines: int = 50):
         console.print(f"[red]❌ Sin permisos para leer: {log_path}. Usa sudo.[/red]")
         return []
 
+def utc_now():
+    """Hora actual en UTC como datetime sin zona (igual que las fechas de index.txt)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Fechas guardadas como 'YYYYMMDDHHMMSS' (UTC): compactas y comparables como texto
+CertificateEntry = namedtuple('CertificateEntry', 'status expires revoked serial cn')
+
+def normalize_openssl_date(value: str):
+    """Normaliza una fecha de index.txt (YYMMDDHHMMSSZ o YYYYMMDDHHMMSSZ) a 'YYYYMMDDHHMMSS'"""
+    value = value.split(',')[0].rstrip('Z')
+    if len(value) == 12:
+        # Regla de OpenSSL para UTCTime: 50-99 -> 19xx, 00-49 -> 20xx
+        value = ('19' if value[:2] >= '50' else '20') + value
+    if len(value) != 14 or not value.isdigit():
+        return None
+    return value
+
+def parse_openssl_date(value: str):
+    """Convierte una fecha de index.txt (o ya normalizada) a datetime UTC"""
+    value = normalize_openssl_date(value) if value else None
+    if value is None:
+        return None
+    return datetime.strptime(value, '%Y%m%d%H%M%S')
+
+def openssl_date_iso(value: str):
+    """Fecha normalizada de CertificateEntry en ISO 8601 UTC (None si no hay fecha)"""
+    parsed = parse_openssl_date(value) if value else None
+    return parsed.strftime('%Y-%m-%dT%H:%M:%SZ') if parsed else None
+
+def openssl_now():
+    """Hora actual en el formato normalizado de CertificateEntry"""
+    return utc_now().strftime('%Y%m%d%H%M%S')
+
+def dn_common_name(dn: str):
+    """Extrae el CN exacto de un DN de index.txt ('/C=ES/CN=alice' -> 'alice')"""
+    start = dn.find('/CN=')
+    if start < 0:
+        return None
+    return dn[start + 4:].split('/', 1)[0]
+
+class CertificateInventory:
+    """
+    Inventario de certificados construido a partir de pki/index.txt.
+
+    El archivo se analiza una sola vez y queda en memoria indexado por CN y
+    estado. Mientras su mtime/tamaño no cambien no se vuelve a leer; si sólo
+    ha crecido (mismo contenido previo), se analizan únicamente las líneas
+    nuevas. Usar `CertificateInventory.load()` para compartir la instancia.
+
+    Las estadísticas consultan varias fuentes en hilos a la vez y todas usan
+    la misma instancia: la lectura y las vistas se serializan con `_lock`.
+    """
+
+    _cache = {}
+    _lock = threading.RLock()
+
+    def __init__(self, index_path):
+        from pathlib import Path
+        
+        self.index_path = Path(index_path)
+        self.by_cn = {}
+        self._signature = None
+        self._offset = 0
+        self._crc = 0
+        self._views = None
+        self._views_until = None
+
+    @classmethod
+    @timed
+    def load(cls, easyrsa_path: str = None, settings: Settings = None):
+        """
+        Devuelve el inventario cacheado del PKI indicado, actualizado si index.txt cambió.
+
+        Sin `easyrsa_path` se usa el de `settings` o, si no se pasan, el de los ajustes en vigor.
+        """
+        from pathlib import Path
+        
+        settings = settings or current_settings()
+        index_path = Path(easyrsa_path or settings.easyrsa_path) / "pki" / "index.txt"
+        with cls._lock:
+            inventory = cls._cache.get(index_path)
+            if inventory is None:
+                inventory = cls._cache[index_path] = cls(index_path)
+            inventory.refresh()
+        return inventory
+
+    def refresh(self):
+        """Relee index.txt sólo si cambió y sólo la parte nueva cuando el archivo creció"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        st = self.index_path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        
+        with open(self.index_path, 'rb') as f:
+            appended = False
+            if self._signature and st.st_size > self._offset:
+                # openssl reescribe index.txt completo: comprobar que lo ya leído no cambió
+                appended = zlib.crc32(f.read(self._offset)) == self._crc
+            if not appended:
+                f.seek(0)
+                self.by_cn = {}
+                self._offset = 0
+                self._crc = 0
+            data = f.read()
+        
+        # Sólo se consumen líneas completas
+        end = data.rfind(b"\n") + 1
+        data = data[:end]
+        for line in data.decode('utf-8', errors='replace').splitlines():
+            entry = self._parse_line(line)
+            if entry:
+                self.by_cn.setdefault(entry.cn, []).append(entry)
+        self._crc = zlib.crc32(data, self._crc)
+        self._offset += end
+        self._signature = signature
+        self._views = None
+
+    @staticmethod
+    def _parse_line(line):
+        parts = line.split('\t')
+        if len(parts) < 6:
+            return None
+        cn = dn_common_name(parts[5])
+        if cn is None:
+            return None
+        return CertificateEntry(
+            status=parts[0],
+            expires=normalize_openssl_date(parts[1]),
+            revoked=normalize_openssl_date(parts[2]) if parts[2] else None,
+            serial=parts[3],
+            cn=cn,
+        )
+
+    def _build_views(self):
+        now = openssl_now()
+        valid, revoked, expired = set(), set(), set()
+        next_expiry = None
+        for cn, entries in self.by_cn.items():
+            is_valid = False
+            for entry in entries:
+                if entry.status == 'V' and (entry.expires is None or entry.expires > now):
+                    is_valid = True
+                    if entry.expires and (next_expiry is None or entry.expires < next_expiry):
+                        next_expiry = entry.expires
+            if is_valid:
+                valid.add(cn)
+            elif any(entry.status == 'R' for entry in entries):
+                revoked.add(cn)
+            else:
+                expired.add(cn)
+        
+        for names in (valid, revoked, expired):
+            names.discard("server")  # Excluir certificado del servidor
+        self._views = {
+            'valid': sorted(valid),
+            'revoked': sorted(revoked),
+            'expired': sorted(expired),
+        }
+        # Las vistas dependen de la hora: se recalculan cuando caduque el próximo certificado
+        self._views_until = next_expiry
+
+    def _view(self, name):
+        with self._lock:
+            if self._views is None or (self._views_until and openssl_now() >= self._views_until):
+                self._build_views()
+            return self._views[name]
+
+    def valid(self):
+        """CNs con al menos un certificado vigente"""
+        return self._view('valid')
+
+    def revoked(self):
+        """CNs revocados sin ningún certificado vigente"""
+        return self._view('revoked')
+
+    def expired(self):
+        """CNs cuyos certificados han caducado sin haber sido revocados"""
+        return self._view('expired')
+
+    def entries(self, cn: str):
+        """Historial de certificados de un CN en el orden de index.txt"""
+        with self._lock:
+            return list(self.by_cn.get(cn, ()))
+
+@timed
 def get_valid_certificates():
     """Obtiene la lista de certificados válidos"""
-    easyrsa_dir = Path(EASYRSA_PATH)
+    from pathlib import Path
+    
+    easyrsa_dir = Path(current_settings().easyrsa_path)
+    index_file = easyrsa_dir / "pki" / "index.txt"
+    
+    if index_file.exists():
+        return list(CertificateInventory.load().valid())
+    
+    # Sin index.txt se recurre a los certificados emitidos
     pki_dir = easyrsa_dir / "pki" / "issued"
     
     if not pki_dir.exists():
@@ -89,254 +781,3153 @@ def get_valid_certificates():
     
     return sorted(valid_certs)
 
+@timed
 def get_revoked_certificates():
     """Obtiene la lista de certificados revocados"""
-    easyrsa_dir = Path(EASYRSA_PATH)
+    from pathlib import Path
+    
+    easyrsa_dir = Path(current_settings().easyrsa_path)
     index_file = easyrsa_dir / "pki" / "index.txt"
     
     if not index_file.exists():
         return []
     
-    revoked = []
     try:
-        with open(index_file, 'r') as f:
-            for line in f:
-                if line.startswith('R'):  # R = Revoked
-                    parts = line.split('\t')
-                    if len(parts) >= 6:
-                        # Extraer el nombre del Common Name
-                        cn_match = re.search(r'/CN=([^/]+)', parts[5])
-                        if cn_match:
-                            cert_name = cn_match.group(1)
-                            if cert_name != "server":
-                                revoked.append(cert_name)
+        return list(CertificateInventory.load().revoked())
     except Exception as e:
         console.print(f"[yellow]⚠️  Error al leer certificados revocados: {e}[/yellow]")
-    
-    return sorted(list(set(revoked)))
+        return []
 
-def select_user_from_list(users, title="Selecciona un usuario"):
-    """Permite seleccionar un usuario por número o nombre"""
-    if not users:
-        return None
-    
-    table = Table(title=title, box=box.ROUNDED)
-    table.add_column("#", style="cyan bold", width=5)
-    table.add_column("Usuario", style="white")
-    
-    for i, user in enumerate(users, 1):
-        table.add_row(str(i), user)
-    
-    table.add_row("[dim]0[/dim]", "[dim]← Volver al menú[/dim]")
-    
-    console.print(table)
-    console.print()
-    
-    selection = Prompt.ask(
-        f"Selecciona por [cyan]número (0-{len(users)})[/cyan] o escribe el [cyan]nombre[/cyan]"
-    )
-    
-    # Validar entrada vacía
-    if not selection or selection.strip() == "":
-        console.print(f"[red]❌ Debes seleccionar una opción[/red]")
-        return None
+def _der_element(data: bytes, pos: int):
+    """Cabecera de un elemento DER: (etiqueta, inicio del contenido, fin)"""
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    return tag, pos, pos + length
+
+def read_certificate_expiry(path: str):
+    """
+    Serie y fecha de caducidad (notAfter) de un certificado X.509 en PEM o DER.
+
+    Recorre el DER hasta Validity sin depender de openssl ni de paquetes
+    externos. Es una función de módulo para poder usarla desde un pool de
+    procesos.
+
+    Returns:
+        Tupla (serie en hexadecimal, fecha normalizada 'YYYYMMDDHHMMSS'),
+        (None, None) si el archivo no es un certificado legible
+    """
+    import base64
+    import binascii
     
-    # Intentar convertir a número
     try:
-        num = int(selection)
-        if num == 0:
-            return "CANCEL"  # Señal para cancelar
-        elif 1 <= num <= len(users):
-            return users[num - 1]
-        else:
-            console.print(f"[red]❌ Número fuera de rango[/red]")
-            return None
-    except ValueError:
-        # Es un nombre
-        if selection in users:
-            return selection
-        else:
-            # Buscar coincidencia parcial
-            matches = [u for u in users if selection.lower() in u.lower()]
-            if len(matches) == 1:
-                console.print(f"[green]✓ Encontrado: {matches[0]}[/green]")
-                return matches[0]
-            elif len(matches) > 1:
-                console.print(f"[yellow]⚠️  Múltiples coincidencias encontradas:[/yellow]")
-                for m in matches:
-                    console.print(f"  - {m}")
-                return None
-            else:
-                console.print(f"[red]❌ Usuario '{selection}' no encontrado[/red]")
-                return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = data.find(b"-----BEGIN CERTIFICATE-----")
+        if start >= 0:
+            end = data.index(b"-----END CERTIFICATE-----", start)
+            data = base64.b64decode(b"".join(data[start + 27:end].split()))
+        _, pos, _ = _der_element(data, 0)              # Certificate
+        _, pos, _ = _der_element(data, pos)            # TBSCertificate
+        tag, start, end = _der_element(data, pos)
+        if tag == 0xa0:                                # [0] version (opcional)
+            tag, start, end = _der_element(data, end)
+        serial = data[start:end].lstrip(b"\x00").hex().upper()
+        _, _, pos = _der_element(data, end)            # signature
+        _, _, pos = _der_element(data, pos)            # issuer
+        _, pos, _ = _der_element(data, pos)            # validity
+        _, _, pos = _der_element(data, pos)            # notBefore
+        _, start, end = _der_element(data, pos)        # notAfter (UTCTime o GeneralizedTime)
+        return serial, normalize_openssl_date(data[start:end].decode('ascii'))
+    except (OSError, ValueError, IndexError, binascii.Error, UnicodeDecodeError):
+        return None, None
 
-def view_logs():
-    """Opción 1: Ver logs"""
-    clear_screen()
-    show_header()
-    
-    console.print(Panel("[bold]📋 Visualización de Logs[/bold]", border_style="green"))
-    console.print()
+def scan_issued_certificates(names=None, easyrsa_path: str = None, workers: int = None):
+    """
+    Caducidad de los certificados de pki/issued leyendo los .crt.
+
+    Cada archivo analizado se guarda en una caché en disco (cert_cache_path)
+    con su mtime y tamaño: en los siguientes escaneos sólo se vuelven a
+    leer los archivos que cambiaron. Con muchos archivos pendientes el
+    análisis se reparte entre `workers` procesos.
+
+    Args:
+        names: CNs a consultar (None = todos los .crt)
+        easyrsa_path: Directorio de easy-rsa (por defecto el configurado)
+        workers: Procesos del pool (por defecto, número de CPUs)
+
+    Returns:
+        Diccionario CN -> (serie, fecha normalizada o None)
+    """
+    import json
+    from pathlib import Path
     
-    lines = Prompt.ask("¿Cuántas líneas mostrar?", default="50")
-    follow = Confirm.ask("¿Seguir logs en tiempo real?", default=False)
+    issued = os.path.join(easyrsa_path or current_settings().easyrsa_path, "pki", "issued")
+    if names is None:
+        try:
+            files = [entry.name for entry in os.scandir(issued) if entry.name.endswith('.crt')]
+        except FileNotFoundError:
+            files = []
+    else:
+        files = [f"{name}.crt" for name in names]
     
+    # Caché: directorio issued -> {archivo: [mtime_ns, tamaño, serie, caducidad]}
+    cache_path = Path(current_settings().cert_cache_path)
     try:
-        lines = int(lines)
-    except:
-        lines = 50
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    known = cache.get(issued, {})
+    # Al recorrer el directorio entero se reconstruye: los archivos borrados desaparecen
+    entries = {} if names is None else known
     
-    console.print()
-    
-    if follow:
-        console.print("[yellow]📡 Siguiendo logs en tiempo real (Ctrl+C para volver)...[/yellow]\n")
+    result = {}
+    stale = []
+    for name in files:
         try:
-            subprocess.run(["tail", "-f", "-n", str(lines), DEFAULT_LOG_PATH])
-        except KeyboardInterrupt:
-            console.print("\n[yellow]✋ Detenido[/yellow]")
-    else:
-        log_lines = read_log_file(DEFAULT_LOG_PATH, lines)
-        
-        for line in log_lines:
-            line = line.strip()
-            if "ERROR" in line or "error" in line:
-                console.print(f"[red]{line}[/red]")
-            elif "WARNING" in line or "warning" in line:
-                console.print(f"[yellow]{line}[/yellow]")
-            elif "Connected" in line or "connected" in line:
-                console.print(f"[green]{line}[/green]")
-            else:
-                console.print(line)
+            st = os.stat(os.path.join(issued, name))
+        except OSError:
+            continue
+        cached = known.get(name)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            entries[name] = cached
+            result[name[:-4]] = (cached[2], cached[3])
+        else:
+            stale.append((name, st))
     
-    console.print()
-    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+    changed = bool(stale) or len(entries) != len(known)
+    if stale:
+        paths = [os.path.join(issued, name) for name, _ in stale]
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(paths) >= CERT_SCAN_POOL_MIN:
+            from concurrent.futures import ProcessPoolExecutor
+            
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(read_certificate_expiry, paths,
+                                       chunksize=max(1, len(paths) // (workers * 4))))
+        else:
+            parsed = [read_certificate_expiry(path) for path in paths]
+        for (name, st), (serial, expires) in zip(stale, parsed):
+            entries[name] = [st.st_mtime_ns, st.st_size, serial, expires]
+            result[name[:-4]] = (serial, expires)
+    cache[issued] = entries
+    
+    if changed:
+        import tempfile
+        
+        # La caché sólo ahorra trabajo: si no se puede guardar se sigue sin ella
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=f".{cache_path.name}.")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, separators=(',', ':'))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return result
+
+CertificateExpiry = namedtuple('CertificateExpiry', 'cn serial expires source')
+
+@timed
+def certificate_expiry_report(days: int = None, easyrsa_path: str = None):
+    """
+    Caducidad de los certificados vigentes, del que antes caduca al último.
+
+    Las fechas salen de index.txt (ya en memoria en CertificateInventory);
+    los .crt de pki/issued sólo se analizan para las entradas sin fecha
+    legible o si no hay index.txt. Por CN cuenta el certificado vigente más
+    duradero: un usuario ya renovado no aparece como próximo a caducar.
+
+    Args:
+        days: Sólo los que caducan dentro de `days` días (None = todos)
+        easyrsa_path: Directorio de easy-rsa (por defecto el configurado)
 
-def get_active_connections_mgmt(host: str, port: int):
-    """Obtiene conexiones usando management interface"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5)
-    sock.connect((host, port))
+    Returns:
+        Lista de CertificateExpiry ordenada por fecha de caducidad
+    """
+    from pathlib import Path
     
-    sock.recv(1024)
-    sock.send(b"status\n")
-    data = sock.recv(8192).decode('utf-8')
-    sock.close()
+    easyrsa_dir = Path(easyrsa_path or current_settings().easyrsa_path)
+    index_file = easyrsa_dir / "pki" / "index.txt"
+    now = openssl_now()
+    report = {}
     
-    connections = []
-    lines = data.split('\n')
+    if index_file.exists():
+        inventory = CertificateInventory.load(easyrsa_path)
+        undated = []
+        for cn in inventory.valid():
+            current = [entry for entry in inventory.by_cn[cn]
+                       if entry.status == 'V' and (entry.expires is None or entry.expires > now)]
+            if any(entry.expires is None for entry in current):
+                undated.append(cn)
+                continue
+            latest = max(current, key=lambda entry: entry.expires)
+            report[cn] = CertificateExpiry(cn, latest.serial, latest.expires, 'index')
+        scanned = scan_issued_certificates(undated, easyrsa_dir) if undated else {}
+    else:
+        scanned = scan_issued_certificates(None, easyrsa_dir)
     
-    for line in lines:
-        if line.startswith('CLIENT_LIST'):
-            parts = line.split(',')
-            if len(parts) >= 5:
-                connections.append({
-                    'user': parts[1],
-                    'real_ip': parts[2],
-                    'virtual_ip': parts[3],
-                    'bytes_recv': int(parts[4]) if parts[4].isdigit() else 0,
-                    'bytes_sent': int(parts[5]) if len(parts) > 5 and parts[5].isdigit() else 0,
-                    'connected_since': parts[7] if len(parts) > 7 else 'N/A'
-                })
+    for cn, (serial, expires) in scanned.items():
+        if cn != "server" and expires and expires > now:
+            report[cn] = CertificateExpiry(cn, serial, expires, 'crt')
     
-    return connections
+    entries = report.values()
+    if days is not None:
+        limit = (utc_now() + timedelta(days=days)).strftime('%Y%m%d%H%M%S')
+        entries = [entry for entry in entries if entry.expires <= limit]
+    return sorted(entries, key=lambda entry: (entry.expires, entry.cn))
 
-def parse_status_file(status_path: str):
-    """Parse del archivo de status"""
-    connections = []
+def days_until(value: str):
+    """Días completos que faltan hasta una fecha normalizada de certificado"""
+    return (parse_openssl_date(value) - utc_now()).days
+
+def read_user_list(source: str):
+    """Lee nombres de usuario de un archivo (uno por línea, '#' para comentarios) o de stdin con '-'"""
+    from pathlib import Path
     
-    try:
-        with open(status_path, 'r') as f:
-            lines = f.readlines()
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(source).expanduser().read_text().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def parse_multi_selection(selection: str, users):
+    """
+    Resuelve una selección múltiple.
+
+    Acepta números y rangos ('1,4,7-9'), nombres exactos separados por comas
+    y listas en archivo con '@ruta'. Se usa desde el menú, así que no acepta
+    '@-': leer stdin entero en mitad de la interfaz dejaría sin entrada a los
+    siguientes prompts (stdin sólo con `--file -` en los subcomandos).
+
+    Returns:
+        Lista de nombres sin duplicados (puede incluir nombres que no están en `users`)
+
+    Raises:
+        OSError: Si no se puede leer un archivo
+        ValueError: Con '@-'
+    """
+    selected = []
+    for token in selection.split(','):
+        token = token.strip()
+        if not token:
+            continue
+        if token.startswith('@'):
+            source = token[1:].strip()
+            if source == '-':
+                raise ValueError("'@-' no está disponible en el menú; usa --file - con los subcomandos")
+            selected.extend(read_user_list(source))
+            continue
+        range_match = re.fullmatch(r'(\d+)-(\d+)', token)
+        if range_match:
+            start, end = int(range_match.group(1)), int(range_match.group(2))
+            selected.extend(users[i - 1] for i in range(start, end + 1) if 1 <= i <= len(users))
+        elif token.isdigit() and 1 <= int(token) <= len(users):
+            selected.append(users[int(token) - 1])
+        else:
+            selected.append(token)
+    return list(dict.fromkeys(selected))
+
+class UserIndex:
+    """
+    Índice de búsqueda sobre una lista de usuarios, construido una sola vez.
+
+    Combina una lista ordenada (prefijos por búsqueda binaria) con un índice
+    de trigramas que da los candidatos de subcadena y las coincidencias
+    aproximadas (p. ej. letras cambiadas) sin recorrer toda la lista. Como en
+    pg_trgm, los nombres se rellenan con espacios para que el principio y el
+    final pesen en la similitud.
+    """
+
+    def __init__(self, users):
+        self.users = users
+        self.position = {user: i for i, user in enumerate(users)}
+        self._lower = [user.lower() for user in users]
+        self._sorted = sorted(range(len(users)), key=self._lower.__getitem__)
+        self._sorted_keys = [self._lower[i] for i in self._sorted]
+        self._trigrams = {}
+        self._gram_count = []
+        for i, name in enumerate(self._lower):
+            grams = self._grams(f"  {name} ")
+            self._gram_count.append(len(grams))
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(i)
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _count(self, grams):
+        from collections import Counter
         
-        in_client_section = False
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('Common Name,'):
-                in_client_section = True
-                continue
-            
-            if in_client_section and line and not line.startswith('ROUTING'):
-                parts = line.split(',')
-                if len(parts) >= 4:
-                    connections.append({
-                        'user': parts[0],
-                        'real_ip': parts[1],
-                        'bytes_recv': int(parts[2]) if parts[2].isdigit() else 0,
-                        'bytes_sent': int(parts[3]) if parts[3].isdigit() else 0,
-                        'connected_since': parts[4] if len(parts) > 4 else 'N/A',
-                        'virtual_ip': 'N/A'
-                    })
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._trigrams.get(gram, ()))
+        return counts
+
+    def prefixed(self, prefix: str):
+        """Posiciones de los usuarios que empiezan por `prefix` (sin distinguir mayúsculas)"""
+        import bisect
+        
+        prefix = prefix.lower()
+        lo = bisect.bisect_left(self._sorted_keys, prefix)
+        hi = bisect.bisect_left(self._sorted_keys, prefix + '\uffff', lo)
+        return self._sorted[lo:hi]
+
+    def search(self, query: str, min_similarity: float = 0.3):
+        """
+        Coincidencias ordenadas por relevancia.
+
+        Primero el nombre exacto, después los que empiezan por el texto y los
+        que lo contienen (antes cuanto más al principio); dentro de cada grupo,
+        los nombres más cortos. Si nada contiene el texto (p. ej. una errata),
+        se devuelven los nombres parecidos ordenados por trigramas compartidos.
+
+        Returns:
+            Lista de posiciones en `users`
+        """
+        q = query.strip().lower()
+        if not q:
+            return []
+        lower = self._lower
+        ranked = {}
+        for i in self.prefixed(q):
+            ranked[i] = (0 if lower[i] == q else 1, 0)
+        
+        inner = self._grams(q)
+        if not inner:
+            # Menos de tres letras: no hay trigramas, se recorre la lista
+            for i, name in enumerate(lower):
+                pos = name.find(q)
+                if pos > 0:
+                    ranked[i] = (2, pos)
+        else:
+            # Contener el texto exige tener todos sus trigramas interiores
+            for i, count in self._count(inner).items():
+                if count == len(inner) and i not in ranked:
+                    pos = lower[i].find(q)
+                    if pos >= 0:
+                        ranked[i] = (2, pos)
             
-            if line.startswith('ROUTING'):
-                break
-    except:
-        pass
-    
-    return connections
+            if not ranked:
+                padded = self._grams(f"  {q} ")
+                for i, count in self._count(padded).items():
+                    similarity = count / (len(padded) + self._gram_count[i] - count)
+                    if similarity >= min_similarity:
+                        ranked[i] = (3, -similarity)
+        
+        return sorted(ranked, key=lambda i: (ranked[i], len(lower[i]), lower[i]))
 
-def format_bytes(bytes_val):
-    """Convierte bytes a formato legible"""
-    try:
-        b = float(bytes_val)
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if b < 1024:
-                return f"{b:.2f} {unit}"
-            b /= 1024
-        return f"{b:.2f} TB"
-    except:
-        return str(bytes_val)
+def select_user_from_list(users, title="Selecciona un usuario", multiple=False):
+    """
+    Permite seleccionar un usuario por número o nombre.
 
-def view_connections():
-    """Opción 2: Ver conexiones activas"""
-    clear_screen()
-    show_header()
+    La lista se muestra por páginas. Un texto que no es un número ni un
+    nombre exacto filtra la lista con UserIndex (si sólo hay una coincidencia
+    se selecciona directamente). Los números son siempre los de la lista
+    completa, también dentro de una búsqueda.
+
+    Con `multiple=True` también acepta varios usuarios (ver
+    parse_multi_selection) y devuelve siempre una lista.
+    """
+    if not users:
+        return None
+    
+    index = UserIndex(users)
+    matches = range(len(users))
+    query = ""
+    page = 0
+    
+    while True:
+        pages = max(1, -(-len(matches) // USER_PAGE_SIZE))
+        page = min(page, pages - 1)
+        caption = f"Página {page + 1}/{pages} · {len(matches)} de {len(users)} usuario(s)"
+        if query:
+            caption += f" · búsqueda: '{query}'"
+        
+        table = Table(title=title, caption=caption, box=box.ROUNDED)
+        table.add_column("#", style="cyan bold", width=len(str(len(users))) + 2)
+        table.add_column("Usuario", style="white")
+        
+        # Sólo se construye la página visible
+        for i in matches[page * USER_PAGE_SIZE:(page + 1) * USER_PAGE_SIZE]:
+            table.add_row(str(i + 1), users[i])
+        
+        table.add_row("[dim]0[/dim]", "[dim]← Volver al menú[/dim]")
+        
+        console.print(table)
+        console.print()
+        
+        if pages > 1 or query:
+            console.print("[dim]💡 Escribe parte del nombre para buscar · Enter o > página siguiente · < anterior · * lista completa[/dim]")
+        if multiple:
+            console.print("[dim]💡 Varios usuarios: 1,4,7-9 · nombres separados por coma · @archivo (uno por línea)[/dim]")
+        
+        selection = Prompt.ask(
+            f"Selecciona por [cyan]número (0-{len(users)})[/cyan] o escribe el [cyan]nombre[/cyan]",
+            default="", show_default=False
+        ).strip()
+        
+        # Navegación
+        if selection == ">" or (not selection and pages > 1):
+            page = (page + 1) % pages
+            continue
+        if selection == "<":
+            page = max(page - 1, 0)
+            continue
+        if selection == "*":
+            matches, query, page = range(len(users)), "", 0
+            continue
+        
+        # Validar entrada vacía
+        if not selection:
+            console.print(f"[red]❌ Debes seleccionar una opción[/red]")
+            return None
+        
+        if multiple and (',' in selection or selection.startswith('@') or re.fullmatch(r'\d+-\d+', selection)):
+            try:
+                return parse_multi_selection(selection, users) or None
+            except ValueError as e:
+                console.print(f"[red]❌ {e}[/red]")
+                return None
+            except OSError as e:
+                console.print(f"[red]❌ No se pudo leer la lista: {e}[/red]")
+                return None
+        
+        if selection.isdigit() or selection in index.position:
+            user = resolve_user_selection(selection, users)
+        else:
+            found = index.search(selection)
+            if not found:
+                console.print(f"[red]❌ Usuario '{selection}' no encontrado[/red]\n")
+                continue
+            if len(found) > 1:
+                console.print(f"[yellow]⚠️  {len(found)} coincidencias para '{selection}'[/yellow]\n")
+                matches, query, page = found, selection, 0
+                continue
+            user = users[found[0]]
+            console.print(f"[green]✓ Encontrado: {user}[/green]")
+        
+        if multiple:
+            return [user] if user and user != "CANCEL" else user
+        return user
+
+def resolve_user_selection(selection: str, users):
+    """Resuelve una selección individual por número o nombre exacto"""
+    if selection.isdigit():
+        num = int(selection)
+        if num == 0:
+            return "CANCEL"  # Señal para cancelar
+        elif 1 <= num <= len(users):
+            return users[num - 1]
+        else:
+            console.print(f"[red]❌ Número fuera de rango[/red]")
+            return None
+    return selection if selection in users else None
+
+def log_line_style(line: str):
+    """Color según el tipo de mensaje (error, warning, conexión) o None"""
+    if "ERROR" in line or "error" in line:
+        return "red"
+    elif "WARNING" in line or "warning" in line:
+        return "yellow"
+    elif "Connected" in line or "connected" in line:
+        return "green"
+    return None
+
+def print_log_lines(lines):
+    """
+    Imprime un bloque de líneas de log coloreadas en una única escritura a consola.
+
+    Las líneas se escriben ya convertidas a secuencias ANSI en lugar de pasar
+    por el renderizado de Rich, que con ráfagas de miles de líneas por segundo
+    se convertiría en el cuello de botella (y además interpretaría los
+    corchetes del log como markup).
+    """
+    if not lines:
+        return
+    color_system = ANSI_COLOR_SYSTEMS.get(console.color_system)
+    output = []
+    for line in lines:
+        line = line.strip()
+        style = log_line_style(line)
+        if style and color_system:
+            line = Style.parse(style).render(line, color_system=color_system)
+        output.append(line)
+    console.file.write("\n".join(output) + "\n")
+    console.file.flush()
+
+class _Inotify:
+    """Espera cambios en un directorio usando inotify (sólo Linux, vía ctypes)"""
+
+    # IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x002 | 0x004 | 0x040 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, directory: str):
+        import ctypes
+        import ctypes.util
+        
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"No se pudo vigilar {directory}")
+
+    def wait(self, timeout: float):
+        """Bloquea hasta que haya eventos o venza el timeout; devuelve si hubo eventos"""
+        import select
+        
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class LogFollower:
+    """
+    Sigue un archivo de log dentro del proceso, sin lanzar `tail -f`.
+
+    Lee sólo los bytes añadidos desde la última lectura y detecta tanto la
+    rotación por renombrado (cambio de inodo) como `copytruncate` (el archivo
+    encoge). Usa inotify cuando está disponible y, si no, un sondeo adaptativo
+    que se ralentiza mientras el log está inactivo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._inode = None
+        self._partial = b""
+        self._watcher = None
+        self._interval = LOG_FOLLOW_MIN_INTERVAL
+
+    def __enter__(self):
+        try:
+            self._watcher = _Inotify(os.path.dirname(os.path.abspath(self.path)))
+        except (OSError, AttributeError):
+            self._watcher = None
+        self._open(from_end=True)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file:
+            self._file.close()
+        if self._watcher:
+            self._watcher.close()
+
+    def _open(self, from_end: bool):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            # Durante la rotación el archivo puede no existir todavía
+            self._file = None
+            return
+        st = os.fstat(f.fileno())
+        if from_end:
+            f.seek(0, os.SEEK_END)
+        self._file = f
+        self._inode = (st.st_dev, st.st_ino)
+        self._partial = b""
+
+    def _read_appended(self):
+        data = self._file.read()
+        if not data:
+            return []
+        data = self._partial + data
+        parts = data.split(b"\n")
+        self._partial = parts.pop()
+        return [part.rstrip(b"\r").decode('utf-8', errors='replace') for part in parts]
+
+    def _flush_partial(self):
+        # Una línea sin terminar cuando el archivo se rota ya no se completará: se entrega tal cual
+        partial, self._partial = self._partial, b""
+        return [partial.rstrip(b"\r").decode('utf-8', errors='replace')] if partial else []
+
+    def _check_rotation(self):
+        """Reabre el archivo si fue rotado o truncado; devuelve las líneas pendientes del anterior"""
+        if self._file is None:
+            self._open(from_end=False)
+            return []
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if (st.st_dev, st.st_ino) != self._inode:
+            # Rotado por renombrado: terminar el archivo viejo y empezar el nuevo desde el inicio
+            pending = self._read_appended() + self._flush_partial()
+            self._file.close()
+            self._open(from_end=False)
+            return pending
+        if st.st_size < self._file.tell():
+            # copytruncate: el mismo inodo vuelve a empezar
+            self._file.seek(0)
+            return self._flush_partial()
+        return []
+
+    def batches(self):
+        """
+        Genera bloques de líneas nuevas a medida que se escriben en el log.
+
+        Returns:
+            Generador de listas de líneas (una lista por lectura)
+        """
+        while True:
+            lines = self._check_rotation()
+            if self._file is not None:
+                lines += self._read_appended()
+            if lines:
+                self._interval = LOG_FOLLOW_MIN_INTERVAL
+                yield lines
+                continue
+            
+            if self._watcher:
+                # Con inotify el timeout sólo cubre rotaciones en otros sistemas de archivos
+                self._watcher.wait(LOG_FOLLOW_MAX_INTERVAL)
+            else:
+                time.sleep(self._interval)
+                self._interval = min(self._interval * 2, LOG_FOLLOW_MAX_INTERVAL)
+
+# Formatos de fecha al inicio de línea: ISO (--log con timestamp), ctime (OpenVPN) y syslog,
+# con la posición de los segundos dentro del texto capturado
+LOG_TIMESTAMP_FORMATS = (
+    (re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})'), '%Y-%m-%d %H:%M', slice(17, 19)),
+    (re.compile(r'^(\w{3} \w{3} [ \d]\d \d{2}:\d{2}:\d{2} \d{4})'), '%a %b %d %H:%M %Y', slice(17, 19)),
+    (re.compile(r'^(\w{3} [ \d]\d \d{2}:\d{2}:\d{2})'), '%b %d %H:%M', slice(13, 15)),
+)
+# "alice/203.0.113.5:51234 ..." y "203.0.113.5:51234 [alice] Peer Connection Initiated"
+LOG_PEER_RE = re.compile(r' ([^\s/\[\]]+)/([\d.]+|[0-9a-fA-F:]+):\d+')
+LOG_PEER_INIT_RE = re.compile(r' (?:\[AF_INET6?\])?([\d.]+|[0-9a-fA-F:]+):\d+ \[([^\]]+)\]')
+LOG_IP_RE = re.compile(r'[\s=\]/](\d{1,3}(?:\.\d{1,3}){3}):\d+')
+
+class LogIndex:
+    """
+    Índice persistente de eventos del log de OpenVPN para búsquedas por usuario, IP y fecha.
+
+    Se guarda en SQLite fuera del directorio de logs y cubre el log activo y
+    sus rotaciones (incluidas las comprimidas con gzip). Cada archivo se
+    identifica por su inodo, así que una rotación por renombrado no obliga a
+    reindexar, y en cada actualización sólo se procesa lo escrito desde el
+    último offset indexado. Sólo se indexan líneas que mencionan un usuario o
+    una IP real.
+    """
+
+    def __init__(self, log_path: str = None, index_path: str = None):
+        import sqlite3
+        from pathlib import Path
+        
+        self.log_path = log_path or current_settings().log_path
+        self.index_path = index_path or current_settings().log_index_path
+        Path(self.index_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.index_path)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                dev INTEGER, ino INTEGER, path TEXT,
+                size INTEGER, mtime REAL, offset INTEGER, compressed INTEGER,
+                UNIQUE (dev, ino)
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                file_id INTEGER, offset INTEGER, ts INTEGER, cn TEXT, ip TEXT, line TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_cn ON events (cn, ts);
+            CREATE INDEX IF NOT EXISTS events_ip ON events (ip, ts);
+            CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+        """)
+        self._ts_cache = (None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.db.close()
+
+    def log_files(self):
+        """Log activo y rotaciones (openvpn.log.1, openvpn.log.2.gz, openvpn.log-20261012.gz...)"""
+        import glob
+        
+        return sorted(p for p in glob.glob(glob.escape(self.log_path) + '*') if os.path.isfile(p))
+
+    def update(self):
+        """
+        Actualiza el índice con lo escrito desde la última vez.
+
+        Returns:
+            Número de eventos añadidos
+        """
+        known = {(row[1], row[2]): row for row in self.db.execute(
+            "SELECT id, dev, ino, size, mtime, offset, compressed FROM files")}
+        seen = set()
+        added = 0
+        
+        for path in self.log_files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            seen.add(key)
+            compressed = path.endswith('.gz')
+            row = known.get(key)
+            
+            if row is None:
+                cur = self.db.execute(
+                    "INSERT INTO files (dev, ino, path, size, mtime, offset, compressed) VALUES (?, ?, ?, 0, 0, 0, ?)",
+                    (st.st_dev, st.st_ino, path, int(compressed)))
+                file_id, offset = cur.lastrowid, 0
+            else:
+                file_id, offset = row[0], row[5]
+                if compressed and row[3] == st.st_size and row[4] == st.st_mtime:
+                    self.db.execute("UPDATE files SET path = ? WHERE id = ?", (path, file_id))
+                    continue
+                if compressed or st.st_size < offset:
+                    # Archivo truncado (copytruncate) o gzip reescrito: reindexar desde cero
+                    self.db.execute("DELETE FROM events WHERE file_id = ?", (file_id,))
+                    offset = 0
+            
+            if compressed:
+                offset, count = self._index_gzip(path, file_id)
+            else:
+                offset, count = self._index_plain(path, file_id, offset)
+            added += count
+            self.db.execute(
+                "UPDATE files SET path = ?, size = ?, mtime = ?, offset = ? WHERE id = ?",
+                (path, st.st_size, st.st_mtime, offset, file_id))
+        
+        # Archivos que ya no existen (p. ej. rotación comprimida que sustituye al .1)
+        for key, row in known.items():
+            if key not in seen:
+                self.db.execute("DELETE FROM events WHERE file_id = ?", (row[0],))
+                self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+        
+        self.db.commit()
+        return added
+
+    def _index_plain(self, path, file_id, offset):
+        batch = []
+        count = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Línea a medio escribir: se indexará en la próxima actualización
+                    break
+                event = self._parse_line(raw.decode('utf-8', errors='replace'))
+                if event:
+                    batch.append((file_id, offset) + event + (None,))
+                offset += len(raw)
+                if len(batch) >= LOG_INDEX_BATCH:
+                    count += self._flush(batch)
+        count += self._flush(batch)
+        return offset, count
+
+    def _index_gzip(self, path, file_id):
+        # En un gzip no se puede saltar a un offset, así que se guarda el texto de la línea
+        import gzip
+        
+        batch = []
+        count = 0
+        offset = 0
+        with gzip.open(path, 'rb') as f:
+            for raw in f:
+                line = raw.decode('utf-8', errors='replace')
+                event = self._parse_line(line)
+                if event:
+                    batch.append((file_id, offset) + event + (line.rstrip('\r\n'),))
+                offset += len(raw)
+                if len(batch) >= LOG_INDEX_BATCH:
+                    count += self._flush(batch)
+        count += self._flush(batch)
+        return offset, count
+
+    def _flush(self, batch):
+        count = len(batch)
+        if batch:
+            self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+        return count
+
+    def _parse_timestamp(self, line):
+        for pattern, fmt, seconds in LOG_TIMESTAMP_FORMATS:
+            match = pattern.match(line)
+            if not match:
+                continue
+            text = match.group(1)
+            # strptime es caro: se cachea el minuto y se suman los segundos
+            minute = text[:seconds.start - 1] + text[seconds.stop:]
+            if self._ts_cache[0] != minute:
+                try:
+                    parsed = datetime.strptime(minute, fmt)
+                except ValueError:
+                    return None
+                if '%Y' not in fmt:
+                    parsed = parsed.replace(year=datetime.now().year)
+                self._ts_cache = (minute, int(parsed.timestamp()))
+            return self._ts_cache[1] + int(text[seconds])
+        return None
+
+    def _parse_line(self, line):
+        """Extrae (timestamp, usuario, ip) de una línea o None si no menciona ninguno"""
+        cn = ip = None
+        match = LOG_PEER_RE.search(line) if '/' in line else None
+        if match:
+            cn, ip = match.group(1), match.group(2)
+        else:
+            match = LOG_PEER_INIT_RE.search(line) if ' [' in line else None
+            if match:
+                ip, cn = match.group(1), match.group(2)
+            else:
+                match = LOG_IP_RE.search(line)
+                if match:
+                    ip = match.group(1)
+        if cn is None and ip is None:
+            return None
+        if cn == 'UNDEF':
+            cn = None
+        return (self._parse_timestamp(line), cn, ip)
+
+    def search(self, user: str = None, ip: str = None, since: datetime = None,
+               until: datetime = None, limit: int = 500):
+        """
+        Busca eventos por usuario, IP real y rango de fechas.
+
+        Returns:
+            Lista de líneas ordenadas por fecha
+        """
+        clauses, params = [], []
+        if user:
+            clauses.append("cn = ?")
+            params.append(user)
+        if ip:
+            clauses.append("ip = ?")
+            params.append(ip)
+        if since:
+            clauses.append("ts >= ?")
+            params.append(int(since.timestamp()))
+        if until:
+            clauses.append("ts < ?")
+            params.append(int(until.timestamp()))
+        where = " AND ".join(clauses) or "1"
+        rows = self.db.execute(
+            f"SELECT e.file_id, e.offset, e.line, f.path FROM events e JOIN files f ON f.id = e.file_id "
+            f"WHERE {where} ORDER BY e.ts, e.file_id, e.offset LIMIT ?",
+            params + [limit]).fetchall()
+        
+        # Para archivos sin comprimir se lee cada línea por su offset, abriendo cada archivo una vez
+        handles = {}
+        results = []
+        try:
+            for file_id, offset, line, path in rows:
+                if line is None:
+                    f = handles.get(file_id)
+                    if f is None:
+                        f = handles[file_id] = open(path, 'rb')
+                    f.seek(offset)
+                    line = f.readline().rstrip(b"\r\n").decode('utf-8', errors='replace')
+                results.append(line)
+        finally:
+            for f in handles.values():
+                f.close()
+        return results
+
+def follow_log(log_path: str, lines: int):
+    """Muestra las últimas líneas del log y sigue las nuevas en tiempo real"""
+    print_log_lines(read_log_file(log_path, lines))
+    with LogFollower(log_path) as follower:
+        for batch in follower.batches():
+            print_log_lines(batch)
+
+def view_logs():
+    """Opción 1: Ver logs"""
+    clear_screen()
+    show_header()
+    
+    console.print(Panel("[bold]📋 Visualización de Logs[/bold]", border_style="green"))
+    console.print()
+    
+    lines = Prompt.ask("¿Cuántas líneas mostrar?", default="50")
+    follow = Confirm.ask("¿Seguir logs en tiempo real?", default=False)
+    
+    try:
+        lines = int(lines)
+    except:
+        lines = 50
+    
+    console.print()
+    
+    if follow:
+        console.print("[yellow]📡 Siguiendo logs en tiempo real (Ctrl+C para volver)...[/yellow]\n")
+        try:
+            follow_log(current_settings().log_path, lines)
+        except KeyboardInterrupt:
+            console.print("\n[yellow]✋ Detenido[/yellow]")
+        except PermissionError:
+            console.print(f"[red]❌ Sin permisos para leer: {current_settings().log_path}. Usa sudo.[/red]")
+    else:
+        print_log_lines(read_log_file(current_settings().log_path, lines))
+    
+    console.print()
+    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+
+def parse_date_input(value: str):
+    """Convierte 'YYYY-MM-DD' o 'YYYY-MM-DD HH:MM' en datetime (None si está vacío)"""
+    value = value.strip()
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no válida: '{value}' (usa YYYY-MM-DD o YYYY-MM-DD HH:MM)")
+
+def search_logs():
+    """Opción 8: Buscar en logs"""
+    clear_screen()
+    show_header()
+    
+    console.print(Panel("[bold]🔎 Búsqueda en Logs[/bold]", border_style="green"))
+    console.print("[dim]Deja vacío cualquier filtro para no aplicarlo[/dim]\n")
+    
+    user = Prompt.ask("Usuario (Common Name)", default="").strip()
+    ip = Prompt.ask("IP real", default="").strip()
+    try:
+        since = parse_date_input(Prompt.ask("Desde (YYYY-MM-DD [HH:MM])", default=""))
+        until = parse_date_input(Prompt.ask("Hasta (YYYY-MM-DD [HH:MM])", default=""))
+    except ValueError as e:
+        console.print(f"[red]❌ {e}[/red]")
+        console.print()
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    
+    # Una fecha sin hora como límite superior incluye el día completo
+    if until and until.hour == 0 and until.minute == 0:
+        until += timedelta(days=1)
+    
+    console.print()
+    try:
+        with LogIndex() as index:
+            with console.status("[bold green]🗂️  Actualizando índice de logs..."):
+                started = time.perf_counter()
+                added = index.update()
+                indexed_in = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            results = index.search(user or None, ip or None, since, until, limit=LOG_SEARCH_LIMIT)
+            searched_in = time.perf_counter() - started
+    except PermissionError as e:
+        console.print(f"[red]❌ Sin permisos: {e}. Usa sudo.[/red]")
+        console.print()
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    
+    console.print(f"[dim]🗂️  {added} evento(s) nuevos indexados en {indexed_in:.2f}s · "
+                  f"búsqueda en {searched_in * 1000:.1f} ms[/dim]\n")
+    
+    if not results:
+        console.print("[yellow]ℹ️  No se encontraron eventos[/yellow]")
+    else:
+        print_log_lines(results)
+        if len(results) == LOG_SEARCH_LIMIT:
+            console.print(f"\n[yellow]⚠️  Mostrando los primeros {LOG_SEARCH_LIMIT} resultados; acota la búsqueda[/yellow]")
+    
+    console.print()
+    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+
+def _to_int(value, default=0):
+    """Convierte un contador a entero tolerando campos vacíos o no numéricos"""
+    return int(value) if value and value.isdigit() else default
+
+class ManagementClient:
+    """
+    Cliente persistente del management interface de OpenVPN.
+
+    Mantiene una única conexión autenticada por sesión (TCP o socket unix),
+    reconecta con backoff exponencial cuando se pierde y serializa los comandos
+    con un lock. Las notificaciones asíncronas (líneas que empiezan por '>')
+    se separan de las respuestas y se guardan en `notifications` o se
+    entregan a los listeners registrados.
+    """
+
+    def __init__(self, host: str = None, port: int = None, unix_path: str = None,
+                 password_file: str = None, timeout: float = 5, retries: int = 3):
+        self.host = host or current_settings().mgmt_host
+        self.port = port or current_settings().mgmt_port
+        self.unix_path = unix_path
+        self.password_file = password_file
+        self.timeout = timeout
+        self.retries = retries
+        self.notifications = deque(maxlen=MGMT_NOTIFICATION_BACKLOG)
+        self._listeners = []
+        self._sock = None
+        self._buffer = bytearray()
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def address(self):
+        """Dirección legible del management interface"""
+        return self.unix_path or f"{self.host}:{self.port}"
+
+    def add_listener(self, callback):
+        """Registra una función que recibe cada notificación asíncrona"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Elimina un listener registrado con add_listener"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def connect(self):
+        """
+        Abre la conexión si no existe, reintentando con backoff exponencial.
+
+        Los intentos de conexión y las esperas entre ellos se hacen sin el
+        lock, que sólo se toma para instalar la conexión: un hilo que espera a
+        un management interface caído (p. ej. una fuente que gather_sources ya
+        abandonó por plazo) no bloquea los comandos de los demás.
+        """
+        delay = MGMT_RECONNECT_DELAY
+        for attempt in range(self.retries):
+            if self._sock is not None:
+                return
+            try:
+                sock = self._dial()
+                with self._lock:
+                    if self._sock is not None:
+                        # Otro hilo conectó mientras tanto
+                        sock.close()
+                        return
+                    self._login(sock)
+                    return
+            except OSError:
+                if attempt == self.retries - 1:
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    @contextmanager
+    def _connected(self):
+        # Conecta (con reintentos) antes de tomar el lock y lo mantiene durante el bloque
+        self.connect()
+        with self._lock:
+            self._reopen()
+            yield
+
+    def _reopen(self):
+        # Con el lock tomado: si la conexión se cayó, un único intento sin backoff
+        if self._sock is None:
+            self._login(self._dial())
+
+    def close(self):
+        """Cierra la conexión enviando `quit` si sigue abierta"""
+        if not self._lock.acquire(timeout=1):
+            # Otro hilo sigue esperando respuesta (p. ej. una fuente abandonada
+            # por plazo): cortar el socket lo despierta y él mismo lo descarta
+            sock = self._sock
+            if sock is not None:
+                try:
+                    sock.shutdown(2)  # socket.SHUT_RDWR
+                except OSError:
+                    pass
+            return
+        try:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(b"quit\n")
+                except OSError:
+                    pass
+            self._drop()
+        finally:
+            self._lock.release()
+
+    def _dial(self):
+        import socket
+        
+        if self.unix_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.unix_path)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+        return socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    def _login(self, sock):
+        # Con el lock tomado: instala el socket y se autentica si hace falta
+        self._sock = sock
+        self._buffer.clear()
+        if not self.password_file:
+            return
+        from pathlib import Path
+
+        try:
+            # El prompt de contraseña no termina en salto de línea
+            self._read_until(b"ENTER PASSWORD:")
+            password = Path(self.password_file).read_text().splitlines()[0]
+            sock.sendall(password.encode() + b"\n")
+            reply = self._read_line()
+            if not reply.startswith('SUCCESS'):
+                raise PermissionError(f"Autenticación rechazada por el management interface: {reply}")
+        except OSError:
+            self._drop()
+            raise
+
+    def _drop(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._buffer.clear()
+
+    def _fill(self):
+        chunk = self._sock.recv(MGMT_RECV_SIZE)
+        if not chunk:
+            raise ConnectionError("El management interface cerró la conexión")
+        self._buffer += chunk
+
+    def _read_until(self, marker: bytes):
+        while True:
+            pos = self._buffer.find(marker)
+            if pos >= 0:
+                del self._buffer[:pos + len(marker)]
+                return
+            self._fill()
+
+    def _next_raw_line(self):
+        while True:
+            end = self._buffer.find(b"\n")
+            if end >= 0:
+                line = bytes(self._buffer[:end]).rstrip(b"\r").decode('utf-8', errors='replace')
+                del self._buffer[:end + 1]
+                return line
+            self._fill()
+
+    def _dispatch(self, line: str):
+        self.notifications.append(line)
+        for callback in list(self._listeners):
+            callback(line)
+
+    def _read_line(self):
+        """Devuelve la siguiente línea de respuesta, despachando las notificaciones intermedias"""
+        while True:
+            line = self._next_raw_line()
+            if line.startswith('>'):
+                self._dispatch(line)
+                continue
+            return line
+
+    def poll(self, timeout: float):
+        """
+        Espera notificaciones asíncronas durante `timeout` segundos y las despacha.
+
+        Pensado para modos en vivo que no envían comandos entre actualizaciones.
+        """
+        import socket
+        
+        with self._connected():
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    while b"\n" in self._buffer:
+                        line = self._next_raw_line()
+                        if line.startswith('>'):
+                            self._dispatch(line)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._sock.settimeout(remaining)
+                    try:
+                        self._fill()
+                    except socket.timeout:
+                        return
+            except OSError:
+                self._drop()
+                raise
+            finally:
+                if self._sock is not None:
+                    self._sock.settimeout(self.timeout)
+
+    def command(self, cmd: str):
+        """
+        Envía un comando de respuesta de una línea (SUCCESS:/ERROR:).
+
+        Returns:
+            Línea de respuesta del servidor
+
+        Raises:
+            RuntimeError: si el servidor responde con ERROR
+        """
+        with self._connected():
+            for attempt in range(2):
+                self._reopen()
+                try:
+                    self._sock.sendall(cmd.encode() + b"\n")
+                    reply = self._read_line()
+                    break
+                except OSError:
+                    # Conexión caída (reinicio de OpenVPN, timeout...): un único reintento
+                    self._drop()
+                    if attempt:
+                        raise
+        if reply.startswith('ERROR:'):
+            raise RuntimeError(reply)
+        return reply
+
+    def pipeline(self, commands):
+        """
+        Envía varios comandos de una línea seguidos y lee las respuestas en orden.
+
+        Un viaje de ida y vuelta por bloque de MGMT_PIPELINE_BATCH comandos en
+        lugar de uno por comando. No se reintenta si la conexión se pierde a
+        medias: parte de los comandos ya se habrán ejecutado.
+
+        Returns:
+            Lista de respuestas (SUCCESS:/ERROR:) en el orden de `commands`; las
+            que no llegaron por un fallo de conexión son 'ERROR: <motivo>'
+        """
+        commands = list(commands)
+        replies = []
+        with self._connected():
+            try:
+                for start in range(0, len(commands), MGMT_PIPELINE_BATCH):
+                    batch = commands[start:start + MGMT_PIPELINE_BATCH]
+                    self._sock.sendall(b"".join(cmd.encode() + b"\n" for cmd in batch))
+                    for _ in batch:
+                        replies.append(self._read_line())
+            except OSError as e:
+                self._drop()
+                replies += [f"ERROR: {e}"] * (len(commands) - len(replies))
+        return replies
+
+    def iter_command(self, cmd: str, terminator: str = "END"):
+        """
+        Envía un comando de respuesta multilínea y entrega sus líneas.
+
+        La respuesta se lee por bloques hasta el terminador, así que los
+        cientos de KB de un `status` con miles de clientes llegan completos.
+        Se lee entera con el lock tomado y las líneas se entregan después:
+        un consumidor lento, o que abandona a medias, no retiene la conexión
+        ni la deja con una respuesta pendiente.
+
+        Returns:
+            Generador de líneas (sin salto de línea)
+
+        Raises:
+            RuntimeError: si el servidor responde con ERROR
+        """
+        with self._connected():
+            for attempt in range(2):
+                self._reopen()
+                try:
+                    self._sock.sendall(cmd.encode() + b"\n")
+                    line = self._read_line()
+                    break
+                except OSError:
+                    self._drop()
+                    if attempt:
+                        raise
+            lines = []
+            try:
+                while line != terminator:
+                    if line.startswith('ERROR:'):
+                        raise RuntimeError(line)
+                    lines.append(line)
+                    line = self._read_line()
+            except OSError:
+                # Respuesta cortada: lo que quede por leer desincronizaría la conexión
+                self._drop()
+                raise
+        yield from lines
+
+Server = namedtuple('Server', 'name host port unix_path password_file status_path')
+
+_servers = None
+_mgmt_clients = {}
+
+def load_servers(path: str = None):
+    """
+    Inventario de instancias de OpenVPN gestionadas desde esta sesión.
+
+    Cada sección del INI es un servidor:
+
+        [udp-1194]
+        host = 10.0.0.5
+        port = 7505
+        unix_socket = /run/openvpn/udp.sock   (opcional, sustituye a host/port)
+        password_file = /etc/openvpn/mgmt-pw  (opcional)
+        status = /var/log/openvpn/udp.log     (opcional, sólo instancias locales)
+
+    Sin archivo (o sin secciones) se devuelve un único servidor 'local' con
+    los ajustes mgmt_* y status_path. El inventario se lee una vez por sesión.
+
+    Returns:
+        Lista de Server; el primero es el que usan las vistas de un solo servidor
+    """
+    global _servers
+    current = current_settings()
+    # La caché es de unos ajustes concretos: con otros (using_settings) se vuelve a leer
+    if _servers is not None and _servers[0] is current and path is None:
+        return _servers[1]
+    servers_path = path or current.servers_path
+    servers = []
+    # Sin inventario no se importa configparser: es parte del arranque de cada subcomando
+    if os.path.exists(servers_path):
+        import configparser
+
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(servers_path)
+        servers = [
+            Server(
+                name=name,
+                host=section.get('host', current.mgmt_host),
+                port=section.getint('port', current.mgmt_port),
+                unix_path=section.get('unix_socket'),
+                password_file=section.get('password_file'),
+                status_path=section.get('status'),
+            )
+            for name, section in parser.items() if name != parser.default_section
+        ]
+    servers = servers or [Server('local', current.mgmt_host, current.mgmt_port, current.mgmt_unix_socket,
+                                 current.mgmt_password_file, current.status_path)]
+    if path is None:
+        _servers = (current, servers)
+    return servers
+
+def is_multi_server():
+    """True si el inventario tiene más de una instancia"""
+    return len(load_servers()) > 1
+
+def get_mgmt_client(server: Server = None):
+    """Devuelve el cliente del management interface de un servidor (por defecto el primero), compartido por toda la sesión"""
+    server = server or load_servers()[0]
+    # Clave: el servidor completo, no el nombre ('local' apunta a sitios distintos según los ajustes)
+    client = _mgmt_clients.get(server)
+    if client is None:
+        client = _mgmt_clients[server] = ManagementClient(
+            server.host,
+            server.port,
+            unix_path=server.unix_path,
+            password_file=server.password_file,
+        )
+    return client
+
+def close_mgmt_client():
+    """Cierra las conexiones compartidas a los management interface"""
+    while _mgmt_clients:
+        _, client = _mgmt_clients.popitem()
+        client.close()
+
+def iter_status_records(lines, separator='\t'):
+    """
+    Registros de status versión 2/3 sin convertir a diccionario.
+
+    Returns:
+        Generador de tuplas (tipo, cabeceras, valores)
+    """
+    headers = {}
+    for line in lines:
+        parts = line.split(separator)
+        kind = parts[0]
+        if kind == 'HEADER' and len(parts) > 1:
+            headers[parts[1]] = parts[2:]
+        elif kind in headers:
+            yield kind, headers[kind], parts[1:]
+
+def iter_status_rows(lines, separator='\t'):
+    """
+    Interpreta líneas de status versión 2/3 usando las cabeceras HEADER.
+
+    Args:
+        lines: Iterable de líneas del status
+        separator: ',' para versión 2, tabulador para versión 3
+
+    Returns:
+        Generador de tuplas (tipo, fila) donde fila es un diccionario columna -> valor
+    """
+    for kind, headers, values in iter_status_records(lines, separator):
+        yield kind, dict(zip(headers, values))
+
+# Inicio de sesión en texto -> timestamp (status versión 1, sin columna time_t)
+_since_cache = {}
+
+def parse_connected_since(text: str):
+    """
+    Timestamp de un 'Connected Since' en texto.
+
+    Acepta el formato de OpenVPN 2.5+ ('2026-10-18 09:30:00') y el de ctime
+    ('Sun Oct 18 09:30:00 2026'). Hay pocos valores distintos: se cachean.
+
+    Returns:
+        Segundos desde epoch, o 0 si no se reconoce
+    """
+    value = _since_cache.get(text)
+    if value is None:
+        value = 0
+        for fmt in (CONNECTED_SINCE_FORMAT, '%a %b %d %H:%M:%S %Y'):
+            try:
+                value = int(datetime.strptime(text.strip(), fmt).timestamp())
+                break
+            except ValueError:
+                continue
+        if len(_since_cache) > 65536:
+            _since_cache.clear()
+        _since_cache[text] = value
+    return value
+
+class Connection:
+    """
+    Sesión de un cliente de OpenVPN.
+
+    Registro compacto (sin diccionario por instancia) común al management
+    interface, al archivo de status y a las notificaciones. El inicio de la
+    sesión se guarda como timestamp; `connected_since` es sólo su texto.
+
+    `server` se rellena con varias instancias y `last_ref_ts` con
+    attach_last_activity; ambos valen None mientras no hay dato.
+    """
+
+    __slots__ = ('user', 'real_ip', 'virtual_ip', 'bytes_recv', 'bytes_sent',
+                 'connected_since_ts', 'client_id', 'server', 'last_ref_ts')
+
+    def __init__(self, user: str, real_ip: str = 'N/A', virtual_ip: str = 'N/A',
+                 bytes_recv: int = 0, bytes_sent: int = 0, connected_since_ts: int = 0,
+                 client_id: str = '', server: str = None, last_ref_ts: int = None):
+        self.user = user
+        self.real_ip = real_ip
+        self.virtual_ip = virtual_ip
+        self.bytes_recv = bytes_recv
+        self.bytes_sent = bytes_sent
+        self.connected_since_ts = connected_since_ts
+        self.client_id = client_id
+        self.server = server
+        self.last_ref_ts = last_ref_ts
+
+    @classmethod
+    def from_status(cls, user: str, real_ip: str, virtual_ip: str, recv: str, sent: str,
+                    since: str, since_ts: str, client_id: str):
+        """Conexión a partir de las columnas STATUS_CLIENT_COLUMNS de una fila CLIENT_LIST"""
+        return cls(user, real_ip, virtual_ip or 'N/A',
+                   int(recv) if recv.isdigit() else 0,
+                   int(sent) if sent.isdigit() else 0,
+                   int(since_ts) if since_ts.isdigit() else parse_connected_since(since) if since else 0,
+                   client_id)
+
+    @property
+    def bytes_total(self):
+        return self.bytes_recv + self.bytes_sent
+
+    @property
+    def connected_since(self):
+        """Inicio de la sesión en texto ('N/A' si se desconoce)"""
+        if not self.connected_since_ts:
+            return 'N/A'
+        return datetime.fromtimestamp(self.connected_since_ts).strftime(CONNECTED_SINCE_FORMAT)
+
+    def copy(self):
+        return Connection(self.user, self.real_ip, self.virtual_ip, self.bytes_recv, self.bytes_sent,
+                          self.connected_since_ts, self.client_id, self.server, self.last_ref_ts)
+
+    def as_dict(self, fields=None):
+        """Diccionario con los campos indicados (por defecto CONNECTION_FIELDS) para emit_rows"""
+        return {field: getattr(self, field) for field in fields or CONNECTION_FIELDS}
+
+    def __repr__(self):
+        return (f"Connection({self.user!r}, {self.real_ip!r}, {self.virtual_ip!r}, "
+                f"client_id={self.client_id!r}, server={self.server!r})")
+
+class ConnectionSet:
+    """
+    Conexiones de un snapshot con índices por CN, IP real e IP virtual.
+
+    Se recorre y se mide como una lista. No se modifica después de crearla,
+    así que los índices se construyen la primera vez que se consultan y no
+    hay que mantenerlos: un listado o una suma no pagan por ellos.
+    """
+
+    __slots__ = ('_items', '_indexes')
+
+    def __init__(self, connections=()):
+        self._items = tuple(connections)
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, position):
+        return self._items[position]
+
+    def __repr__(self):
+        return f"ConnectionSet({len(self._items)} conexiones)"
+
+    def _index(self, name: str, key):
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = {}
+            for conn in self._items:
+                index.setdefault(key(conn), []).append(conn)
+        return index
+
+    def by_user(self, user: str):
+        """Sesiones de un Common Name (lista vacía si no está conectado)"""
+        return self._index('user', lambda conn: conn.user).get(user, [])
+
+    def by_real_ip(self, address: str):
+        """Sesiones desde una IP real; acepta la dirección con o sin puerto/protocolo"""
+        host = real_address_host(address)
+        index = self._index('real_ip', lambda conn: str(real_address_host(conn.real_ip)))
+        return index.get(str(host) if host is not None else address, [])
+
+    def by_virtual_ip(self, address: str):
+        """Sesiones con una IP virtual (una por servidor como mucho)"""
+        return self._index('virtual_ip', lambda conn: conn.virtual_ip).get(address, [])
+
+    def users(self):
+        """Common Names conectados, sin repetir y en orden de aparición"""
+        return list(self._index('user', lambda conn: conn.user))
+
+@timed
+def get_active_connections_mgmt(client: ManagementClient = None):
+    """
+    Obtiene conexiones usando management interface.
+
+    Usa `status 3` (columnas separadas por tabulador y descritas por HEADER)
+    y procesa las filas a medida que llegan, localizando las columnas una
+    vez por cabecera.
+
+    Args:
+        client: Cliente del management interface (por defecto el de la sesión)
+
+    Returns:
+        Generador de Connection
+    """
+    client = client or get_mgmt_client()
+    layout = None
+    for kind, headers, values in iter_status_records(client.iter_command("status 3")):
+        if kind != 'CLIENT_LIST':
+            continue
+        if layout is None or layout[0] is not headers:
+            layout = (headers, len(headers)) + _status_layout(headers, STATUS_CLIENT_COLUMNS)
+        _, width, columns, pad = layout
+        if pad or len(values) < width:
+            values += [''] * (width + 1 - len(values))
+        yield Connection.from_status(*columns(values))
+
+def iter_active_connections():
+    """
+    Conexiones activas del management interface o, si falla, del archivo de status.
+
+    La respuesta del management se analiza entera antes de entregar la
+    primera conexión: un fallo a mitad pasa al archivo de status sin haber
+    emitido ya parte de las filas.
+
+    Returns:
+        Generador de Connection
+    """
+    try:
+        connections = list(get_active_connections_mgmt())
+    except Exception:
+        connections = parse_status_file(current_settings().status_path)
+    yield from connections
+
+SourceResult = namedtuple('SourceResult', 'name value error elapsed')
+
+def gather_sources(sources: dict, deadlines: dict = None, default_deadline: float = 10):
+    """
+    Ejecuta varias fuentes de datos en paralelo con un plazo máximo para cada una.
+
+    Cada fuente corre en un hilo daemon: si no termina a tiempo se abandona
+    (no bloquea la salida del programa) y se informa como TimeoutError.
+
+    Args:
+        sources: Diccionario nombre -> función sin argumentos
+        deadlines: Plazo en segundos por nombre de fuente
+        default_deadline: Plazo de las fuentes sin entrada en `deadlines`
+
+    Returns:
+        Generador de SourceResult en el orden en que terminan las fuentes
+    """
+    import queue
+    
+    deadlines = deadlines or {}
+    finished = queue.Queue()
+    start = time.monotonic()
+    
+    def run(name, func):
+        t0 = time.monotonic()
+        try:
+            result = SourceResult(name, profiled(func), None, 0)
+        except Exception as e:
+            result = SourceResult(name, None, e, 0)
+        finished.put(result._replace(elapsed=time.monotonic() - t0))
+    
+    for name, func in sources.items():
+        # Cada hilo con una copia del contexto: conserva los ajustes de using_settings()
+        threading.Thread(target=copy_context().run, args=(run, name, func), daemon=True,
+                         name=f"source-{name}").start()
+    
+    expires = {name: start + deadlines.get(name, default_deadline) for name in sources}
+    while expires:
+        try:
+            result = finished.get(timeout=max(0, min(expires.values()) - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            for name in [n for n, limit in expires.items() if limit <= now]:
+                del expires[name]
+                yield SourceResult(name, None, TimeoutError(f"sin respuesta en {now - start:.1f} s"),
+                                   now - start)
+            continue
+        if expires.pop(result.name, None) is not None:
+            yield result
+
+def server_connections(server: Server):
+    """
+    Conexiones de una instancia: management interface o, si falla, su archivo de status.
+
+    Returns:
+        ConnectionSet con `server` rellenado en cada conexión
+    """
+    try:
+        connections = ConnectionSet(get_active_connections_mgmt(get_mgmt_client(server)))
+    except Exception:
+        if not server.status_path:
+            raise
+        connections = parse_status_file(server.status_path)
+    for conn in connections:
+        conn.server = server.name
+    return connections
+
+def server_sources(servers=None):
+    """Una fuente por servidor para gather_sources (nombre 'server:<nombre>')"""
+    return {f"server:{server.name}": (lambda server=server: server_connections(server))
+            for server in (servers or load_servers())}
+
+def gather_connections(servers=None):
+    """
+    Conexiones de todas las instancias, consultadas a la vez.
+
+    La latencia total es la del servidor más lento (con el plazo del
+    management interface como máximo), no la suma.
+
+    Returns:
+        (ConnectionSet de los servidores que respondieron, {nombre: SourceResult})
+    """
+    servers = servers or load_servers()
+    results = {result.name[7:]: result for result in gather_sources(
+        server_sources(servers), default_deadline=STATS_SOURCE_DEADLINES['management'])}
+    connections = ConnectionSet(conn for server in servers if results[server.name].error is None
+                                for conn in results[server.name].value)
+    return connections, results
+
+def connection_sources():
+    """Fuentes de conexiones: management + status con un servidor, una por instancia con varios"""
+    servers = load_servers()
+    if len(servers) > 1:
+        return server_sources(servers)
+    return {
+        'management': lambda: ConnectionSet(get_active_connections_mgmt()),
+        'status_file': lambda: parse_status_file(servers[0].status_path or current_settings().status_path),
+    }
+
+def real_address_host(real_ip: str):
+    """
+    IP de la dirección real de un cliente ('1.2.3.4:5000', 'udp4:1.2.3.4:5000',
+    '[AF_INET6]2001:db8::1:5000', '2001:db8::1'...).
+
+    Returns:
+        ipaddress.IPv4Address / IPv6Address, o None si no se reconoce
+    """
+    import ipaddress
+    
+    with_port = real_ip.startswith('[AF_INET')
+    address = real_ip.split(']', 1)[1] if with_port else real_ip
+    address = re.sub(r'^(udp|tcp)[46]?(-server|-client)?:', '', address)
+    candidates = [address.strip('[]'), address.rsplit(':', 1)[0].strip('[]')]
+    # Con el prefijo [AF_INET6] el puerto va siempre detrás de la dirección
+    for candidate in (candidates[::-1] if with_port else candidates):
+        try:
+            return ipaddress.ip_address(candidate)
+        except ValueError:
+            continue
+    return None
+
+@timed
+def attach_last_activity(connections):
+    """
+    Rellena `last_ref_ts` (último paquete del cliente según la tabla de rutas)
+    en las conexiones, consultando `status 3` de cada servidor a la vez.
+
+    Las conexiones sin dato (servidor que no responde, archivo de status de
+    respaldo) se quedan con None.
+    """
+    by_name = {server.name: server for server in load_servers()}
+    default = load_servers()[0].name
+    servers = {conn.server or default for conn in connections}
+    
+    def last_refs(server):
+        refs = {}
+        for kind, row in iter_status_rows(get_mgmt_client(by_name[server]).iter_command("status 3")):
+            if kind == 'ROUTING_TABLE':
+                key = (row.get('Common Name'), row.get('Real Address'))
+                refs[key] = max(refs.get(key, 0), _to_int(row.get('Last Ref (time_t)')))
+        return refs
+    
+    refs = {}
+    for result in gather_sources({server: (lambda server=server: last_refs(server)) for server in servers},
+                                 default_deadline=STATS_SOURCE_DEADLINES['management']):
+        if result.error is None:
+            refs[result.name] = result.value
+    for conn in connections:
+        ref = refs.get(conn.server or default, {}).get((conn.user, conn.real_ip))
+        if ref:
+            conn.last_ref_ts = ref
+
+def filter_connections(connections, users=None, pattern: str = None, network: str = None,
+                       idle: float = None, min_bytes: int = None, max_bytes: int = None, now: float = None):
+    """
+    Sesiones que cumplen todos los filtros indicados (None = sin filtro).
+
+    Args:
+        users: Common Names exactos
+        pattern: Patrón de CN con comodines (`*`, `?`, `[...]`)
+        network: Red en notación CIDR que debe contener la IP real (p. ej. 203.0.113.0/24)
+        idle: Segundos mínimos sin tráfico (requiere attach_last_activity; sin
+              dato la sesión no se selecciona)
+        min_bytes / max_bytes: Límites del tráfico total (recibido + enviado)
+
+    Returns:
+        Lista de conexiones seleccionadas
+
+    Raises:
+        ValueError: Si la red no es un CIDR válido
+    """
+    import ipaddress
+    from fnmatch import fnmatchcase
+    
+    if users and isinstance(connections, ConnectionSet):
+        # Con el índice por CN sólo se recorren las sesiones de esos usuarios
+        connections = [conn for user in dict.fromkeys(users) for conn in connections.by_user(user)]
+    users = set(users) if users else None
+    network = ipaddress.ip_network(network, strict=False) if network else None
+    now = time.time() if now is None else now
+    selected = []
+    for conn in connections:
+        if users is not None and conn.user not in users:
+            continue
+        if pattern and not fnmatchcase(conn.user, pattern):
+            continue
+        total = conn.bytes_recv + conn.bytes_sent
+        if min_bytes is not None and total < min_bytes:
+            continue
+        if max_bytes is not None and total > max_bytes:
+            continue
+        if idle is not None and not (conn.last_ref_ts and now - conn.last_ref_ts >= idle):
+            continue
+        if network is not None:
+            host = real_address_host(conn.real_ip)
+            if host is None or host.version != network.version or host not in network:
+                continue
+        selected.append(conn)
+    return selected
+
+@timed
+def kill_connections(connections):
+    """
+    Desconecta sesiones concretas: `client-kill <CID>` con el Client ID del
+    status o, si no lo hay (archivo de status v1), `kill <IP:puerto>`. Ambos
+    afectan sólo a esa sesión, no a todas las del mismo CN como `kill <CN>`.
+
+    Los comandos de cada servidor viajan seguidos por su conexión de gestión
+    (ManagementClient.pipeline) y los servidores se atienden a la vez.
+
+    Returns:
+        Lista de diccionarios user, server, real_ip, client_id, ok, detail
+    """
+    by_name = {server.name: server for server in load_servers()}
+    default = load_servers()[0].name
+    targets = {}
+    for conn in connections:
+        targets.setdefault(conn.server or default, []).append(conn)
+    
+    def command(conn):
+        if conn.client_id.isdigit():
+            return f"client-kill {conn.client_id}"
+        return f"kill {conn.real_ip}"
+    
+    def kill_all(server, conns):
+        replies = get_mgmt_client(by_name[server]).pipeline(command(conn) for conn in conns)
+        return [(conn, not reply.startswith('ERROR'), reply) for conn, reply in zip(conns, replies)]
+    
+    rows = []
+    for result in gather_sources({server: (lambda server=server, conns=conns: kill_all(server, conns))
+                                  for server, conns in targets.items()}):
+        outcomes = result.value if result.error is None else [
+            (conn, False, str(result.error)) for conn in targets[result.name]]
+        rows.extend({'user': conn.user, 'server': result.name, 'real_ip': conn.real_ip,
+                     'client_id': conn.client_id, 'ok': ok, 'detail': detail}
+                    for conn, ok, detail in outcomes)
+    return rows
+
+def kick_users(usernames, connections):
+    """
+    Desconecta todas las sesiones de unos usuarios en las instancias donde
+    aparecen en `connections` (una fila por sesión).
+
+    Returns:
+        Filas de kill_connections, más una fila con ok False y server None
+        por cada usuario que no está conectado en ninguna instancia
+    """
+    rows = kill_connections(filter_connections(connections, users=usernames))
+    found = {row['user'] for row in rows}
+    rows.extend({'user': user, 'server': None, 'real_ip': '', 'client_id': '', 'ok': False,
+                 'detail': "no está conectado"}
+                for user in usernames if user not in found)
+    return rows
+
+def stats_sources():
+    """Fuentes de datos de las estadísticas, independientes entre sí"""
+    return dict(connection_sources(), valid=get_valid_certificates, revoked=get_revoked_certificates)
+
+def stats_connections(results: dict):
+    """
+    Elige las conexiones a usar según las fuentes ya terminadas.
+
+    El management interface tiene prioridad; el archivo de status sólo se usa
+    si el management falló o agotó su plazo. Con varios servidores se unen
+    las conexiones de todas las instancias que ya respondieron.
+
+    Returns:
+        (conexiones, nombre de la fuente) o (None, None) si aún no hay datos
+    """
+    if is_multi_server():
+        # Varias instancias: se suman las que ya respondieron
+        done = [result for name, result in results.items() if name.startswith('server:')]
+        if not done:
+            return None, None
+        return ConnectionSet(conn for result in done if result.error is None
+                             for conn in result.value), 'servers'
+    mgmt = results.get('management')
+    if mgmt is not None and mgmt.error is None:
+        return mgmt.value, 'management'
+    status = results.get('status_file')
+    if mgmt is not None and status is not None:
+        return (status.value or ConnectionSet()), 'status_file'
+    return None, None
+
+def certificate_counts(expiring_days: int = None):
+    """Número de certificados por estado, incluidos los que caducan pronto"""
+    from pathlib import Path
+    
+    expiring_days = current_settings().cert_expiring_days if expiring_days is None else expiring_days
+    index_file = Path(current_settings().easyrsa_path) / "pki" / "index.txt"
+    expiring = len(certificate_expiry_report(expiring_days))
+    if not index_file.exists():
+        return {'valid': len(get_valid_certificates()), 'expiring': expiring}
+    inventory = CertificateInventory.load()
+    return {
+        'valid': len(inventory.valid()),
+        'revoked': len(inventory.revoked()),
+        'expired': len(inventory.expired()),
+        'expiring': expiring,
+    }
+
+def _metric_labels(**labels):
+    """Etiquetas en formato de exposición de Prometheus ({a="1",b="2"})"""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class MetricsCollector:
+    """
+    Métricas de Prometheus calculadas en segundo plano.
+
+    Un hilo consulta las fuentes cada `interval` segundos y guarda el texto ya
+    generado; cada scrape sólo devuelve ese texto, así que da igual cuántos
+    lleguen: el management interface se consulta una vez por intervalo.
+    """
+
+    def __init__(self, interval: float = None, expiring_days: int = None):
+        self.interval = current_settings().metrics_interval if interval is None else interval
+        self.expiring_days = current_settings().cert_expiring_days if expiring_days is None else expiring_days
+        self.body = b""
+        self.refreshes = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sources(self):
+        return dict(connection_sources(),
+                    certificates=lambda: certificate_counts(self.expiring_days))
+
+    def refresh(self):
+        """Consulta las fuentes y sustituye el texto servido"""
+        results = {r.name: r for r in gather_sources(self.sources(), STATS_SOURCE_DEADLINES)}
+        self.refreshes += 1
+        # Asignar el atributo es atómico: un scrape ve el texto anterior o el nuevo
+        self.body = self.render(results).encode()
+
+    def render(self, results: dict):
+        """Texto de exposición de Prometheus a partir de los resultados de las fuentes"""
+        lines = []
+        
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+        
+        connections, source = stats_connections(results)
+        connections = connections or ConnectionSet()
+        # Ni client_id ni puerto de origen: cambian en cada reconexión y cada
+        # valor nuevo sería otra serie en Prometheus
+        clients = {}
+        for c in connections:
+            host = real_address_host(c.real_ip)
+            labels = _metric_labels(common_name=c.user, real_address=c.real_ip if host is None else host,
+                                    virtual_address=c.virtual_ip,
+                                    **({'server': c.server} if c.server is not None else {}))
+            row = clients.get(labels)
+            if row is None:
+                clients[labels] = [c.bytes_recv, c.bytes_sent, c.connected_since_ts]
+                continue
+            # Sesiones con las mismas etiquetas (p. ej. tras NAT y sin IP virtual): una sola serie
+            row[0] += c.bytes_recv
+            row[1] += c.bytes_sent
+            if c.connected_since_ts and (not row[2] or c.connected_since_ts < row[2]):
+                row[2] = c.connected_since_ts
+        
+        if 'management' in results:
+            up = [("", int(results['management'].error is None))]
+        else:
+            up = [(_metric_labels(server=name[7:]), int(r.error is None))
+                  for name, r in results.items() if name.startswith('server:')]
+        metric("openvpn_up", "gauge", "1 si el management interface (o el servidor) respondió", up)
+        metric("openvpn_server_connected_clients", "gauge", "Sesiones de cliente activas",
+               [("", len(connections))])
+        metric("openvpn_server_connected_users", "gauge", "Usuarios (CN) distintos conectados",
+               [("", len(connections.users()))])
+        metric("openvpn_client_received_bytes_total", "counter", "Bytes recibidos del cliente en la sesión",
+               [(labels, recv) for labels, (recv, _, _) in clients.items()])
+        metric("openvpn_client_sent_bytes_total", "counter", "Bytes enviados al cliente en la sesión",
+               [(labels, sent) for labels, (_, sent, _) in clients.items()])
+        metric("openvpn_client_connected_since_seconds", "gauge", "Inicio de la sesión (epoch)",
+               [(labels, since) for labels, (_, _, since) in clients.items() if since])
+        
+        certs = results['certificates']
+        if certs.error is None:
+            counts = certs.value
+            metric("openvpn_certificates", "gauge", "Certificados de cliente por estado",
+                   [(_metric_labels(status=status), counts[status])
+                    for status in ('valid', 'revoked', 'expired') if status in counts])
+            if 'expiring' in counts:
+                metric("openvpn_certificates_expiring", "gauge",
+                       f"Certificados vigentes que caducan en {self.expiring_days} días o menos",
+                       [(_metric_labels(days=self.expiring_days), counts['expiring'])])
+        
+        metric("ovpn_manager_source_up", "gauge", "1 si la fuente respondió en plazo",
+               [(_metric_labels(source=name), int(r.error is None)) for name, r in results.items()])
+        metric("ovpn_manager_source_duration_seconds", "gauge", "Duración de la última consulta a la fuente",
+               [(_metric_labels(source=name), f"{r.elapsed:.6f}") for name, r in results.items()])
+        metric("ovpn_manager_connections_source", "gauge", "Fuente usada para las conexiones",
+               [(_metric_labels(source=source), 1)] if source else [])
+        metric("ovpn_manager_refresh_failures_total", "counter", "Actualizaciones fallidas",
+               [("", self.failures)])
+        metric("ovpn_manager_last_refresh_timestamp_seconds", "gauge", "Hora de la última actualización (epoch)",
+               [("", f"{time.time():.3f}")])
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        """Primera actualización inmediata y después en segundo plano"""
+        self.refresh()
+        self._thread = threading.Thread(target=copy_context().run, args=(self._run,), daemon=True,
+                                        name="metrics-refresh")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                # Se sigue sirviendo el último texto bueno
+                self.failures += 1
+
+class TrafficHistory:
+    """
+    Histórico de tráfico por usuario en SQLite con agregados por minuto, hora y día.
+
+    Se alimenta con snapshots periódicos del status y con los contadores
+    finales de `>CLIENT:DISCONNECT`. Para cada sesión se guarda el último
+    contador visto y sólo se acumula la diferencia; un contador menor que el
+    anterior se trata como reinicio. La primera vez que se ve una sesión se
+    cuenta todo su tráfico.
+
+    Cada delta se suma a la vez a las tres resoluciones, así que una consulta
+    de un mes lee días completos de la tabla diaria y sólo usa horas y minutos
+    para los extremos del intervalo.
+    """
+
+    LEVELS = (('day', 86400), ('hour', 3600), ('minute', 60))
+
+    def __init__(self, path: str = None):
+        import sqlite3
+        from pathlib import Path
+        
+        self.path = path or current_settings().traffic_history_path
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY, cn TEXT, client_id TEXT,
+                bytes_recv INTEGER, bytes_sent INTEGER, seen INTEGER
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;
+        """ + "".join(f"""
+            CREATE TABLE IF NOT EXISTS traffic_{level} (
+                bucket INTEGER, cn TEXT, bytes_recv INTEGER, bytes_sent INTEGER,
+                PRIMARY KEY (bucket, cn)
+            ) WITHOUT ROWID;
+        """ for level, _ in self.LEVELS))
+        self._pending = None
+        self._disconnects = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.db.close()
+
+    @staticmethod
+    def session_key(conn):
+        """
+        Identifica una sesión: CN + IP real + inicio.
+
+        Es la misma clave para los snapshots (management o archivo de status,
+        que no siempre tiene Client ID) y para `>CLIENT:DISCONNECT`; la IP se
+        normaliza porque cada fuente la escribe a su manera (prefijo de
+        protocolo, puerto, [AF_INET6]) y el puerto no siempre aparece.
+        """
+        host = real_address_host(conn.real_ip)
+        return f"{conn.user}|{host if host is not None else conn.real_ip}|{conn.connected_since_ts}"
+
+    def record(self, connections, ts: float = None):
+        """
+        Acumula el tráfico de un snapshot de conexiones.
+
+        Returns:
+            Número de usuarios (CN) con tráfico nuevo
+        """
+        ts = int(ts or time.time())
+        known = {row[0]: row[1:] for row in self.db.execute(
+            "SELECT key, bytes_recv, bytes_sent FROM sessions")}
+        deltas = {}
+        sessions = []
+        for conn in connections:
+            key = self.session_key(conn)
+            recv, sent = conn.bytes_recv, conn.bytes_sent
+            self._add_delta(deltas, conn.user, known.get(key), recv, sent)
+            sessions.append((key, conn.user, conn.client_id, recv, sent, ts))
+        
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO sessions (key, cn, client_id, bytes_recv, bytes_sent, seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)", sessions)
+            self._store(deltas, ts)
+            # No se borran al instante las sesiones ausentes: un snapshot
+            # fallido o vacío haría contar de nuevo todo su tráfico después
+            self.db.execute("DELETE FROM sessions WHERE seen < ?", (ts - TRAFFIC_SESSION_TTL,))
+            self._prune(ts)
+        return len(deltas)
+
+    def handle(self, line: str):
+        """Listener para ManagementClient: guarda los contadores finales de cada desconexión"""
+        if line.startswith('>CLIENT:ENV,'):
+            if self._pending is None:
+                return
+            entry = line[12:]
+            if entry == 'END':
+                cid, env = self._pending
+                self._pending = None
+                self._disconnects.append(Connection(
+                    env.get('common_name', 'N/A'),
+                    real_ip=env.get('trusted_ip') or env.get('trusted_ip6') or 'N/A',
+                    bytes_recv=_to_int(env.get('bytes_received')),
+                    bytes_sent=_to_int(env.get('bytes_sent')),
+                    connected_since_ts=_to_int(env.get('time_unix')),
+                    client_id=cid,
+                ))
+            else:
+                key, _, value = entry.partition('=')
+                self._pending[1][key] = value
+        elif line.startswith('>CLIENT:'):
+            event, _, args = line[8:].partition(',')
+            self._pending = (args.split(',')[0], {}) if event == 'DISCONNECT' else None
+
+    def flush_disconnects(self, ts: float = None):
+        """Acumula el tramo final de las sesiones desconectadas desde la última llamada"""
+        if not self._disconnects:
+            return 0
+        ts = int(ts or time.time())
+        disconnects, self._disconnects = self._disconnects, []
+        deltas = {}
+        with self.db:
+            for conn in disconnects:
+                key = self.session_key(conn)
+                row = self.db.execute(
+                    "SELECT bytes_recv, bytes_sent FROM sessions WHERE key = ?", (key,)).fetchone()
+                self._add_delta(deltas, conn.user, row, conn.bytes_recv, conn.bytes_sent)
+                self.db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            self._store(deltas, ts)
+        return len(disconnects)
+
+    @staticmethod
+    def _add_delta(deltas, cn, previous, recv, sent):
+        if previous is not None:
+            # Contador menor que el anterior: la sesión se reinició
+            recv = recv - previous[0] if recv >= previous[0] else recv
+            sent = sent - previous[1] if sent >= previous[1] else sent
+        if recv or sent:
+            total = deltas.setdefault(cn, [0, 0])
+            total[0] += recv
+            total[1] += sent
+
+    def _store(self, deltas, ts):
+        for level, size in self.LEVELS:
+            bucket = ts - ts % size
+            self.db.executemany(
+                f"INSERT INTO traffic_{level} (bucket, cn, bytes_recv, bytes_sent) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (bucket, cn) DO UPDATE SET "
+                "bytes_recv = bytes_recv + excluded.bytes_recv, bytes_sent = bytes_sent + excluded.bytes_sent",
+                ((bucket, cn, recv, sent) for cn, (recv, sent) in deltas.items()))
+
+    def _prune(self, ts):
+        """Aplica la retención como mucho una vez por hora"""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'pruned'").fetchone()
+        if row and ts - row[0] < 3600:
+            return
+        for level, _ in self.LEVELS:
+            limit = ts - TRAFFIC_RETENTION_DAYS[level] * 86400
+            self.db.execute(f"DELETE FROM traffic_{level} WHERE bucket < ?", (limit,))
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pruned', ?)", (ts,))
+
+    def _segments(self, start, end, levels=None, now: int = None):
+        """
+        Divide [start, end) en tramos alineados empezando por la resolución más gruesa.
+
+        Los extremos que no caen en un límite se resuelven con la resolución
+        siguiente sólo si ésta conserva todavía datos de ese momento
+        (TRAFFIC_RETENTION_DAYS). Si no, o en la más fina, el extremo se
+        redondea hacia fuera al tramo de la resolución actual: se cuenta el
+        tramo completo en lugar de perder lo que ya se purgó (p. ej. el inicio
+        de mes en una zona horaria con desfase de media hora).
+        """
+        levels = levels if levels is not None else self.LEVELS
+        now = int(time.time()) if now is None else now
+        if start >= end:
+            return []
+        (level, size), rest = levels[0], levels[1:]
+        if rest:
+            finer, finer_size = rest[0]
+            if start - start % finer_size < now - TRAFFIC_RETENTION_DAYS[finer] * 86400:
+                rest = ()
+        if not rest:
+            return [(level, start - start % size, end)]
+        first = -(-start // size) * size
+        last = end - end % size
+        if first >= last:
+            return self._segments(start, end, rest, now)
+        return (self._segments(start, first, rest, now) + [(level, first, last)]
+                + self._segments(last, end, rest, now))
+
+    def top(self, since: datetime = None, until: datetime = None, limit: int = 20):
+        """
+        Usuarios con más tráfico en un intervalo.
+
+        Args:
+            since: Inicio (hora local; None = todo el histórico)
+            until: Fin (hora local; None = ahora)
+            limit: Máximo de usuarios
+
+        Returns:
+            Lista de diccionarios user, bytes_recv, bytes_sent, bytes_total
+        """
+        start = int(since.timestamp()) if since else 0
+        end = int(until.timestamp()) if until else int(time.time()) + 1
+        segments = self._segments(start, end)
+        if not segments:
+            return []
+        union = " UNION ALL ".join(
+            f"SELECT cn, bytes_recv, bytes_sent FROM traffic_{level} WHERE bucket >= ? AND bucket < ?"
+            for level, _, _ in segments)
+        params = [value for _, first, last in segments for value in (first, last)]
+        rows = self.db.execute(
+            f"SELECT cn, SUM(bytes_recv), SUM(bytes_sent), SUM(bytes_recv) + SUM(bytes_sent) AS total "
+            f"FROM ({union}) GROUP BY cn ORDER BY total DESC LIMIT ?", params + [limit])
+        return [{'user': cn, 'bytes_recv': recv, 'bytes_sent': sent, 'bytes_total': total}
+                for cn, recv, sent, total in rows]
+
+def month_start():
+    """Primer instante del mes en curso (hora local)"""
+    return datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+@timed
+def history_top_users(limit: int = 5):
+    """Top de tráfico del mes desde el histórico (None si no se ha registrado nada)"""
+    if not os.path.exists(current_settings().traffic_history_path):
+        return None
+    with TrafficHistory() as history:
+        return history.top(month_start(), limit=limit)
+
+# Columnas de cada fila CLIENT_LIST que usa `analyze`: CN, dirección real, inicio
+# (time_t y texto) y contadores
+ANALYTICS_COLUMNS = ('Common Name', 'Real Address', 'Connected Since (time_t)', 'Connected Since',
+                     'Bytes Received', 'Bytes Sent')
+
+class SnapshotAnalytics:
+    """
+    Análisis de muchos snapshots del archivo de status guardados en disco.
+
+    Una sesión es CN + dirección real + inicio y recibe un id la primera vez
+    que aparece: el diccionario de sesiones sólo guarda la clave (con las
+    cadenas internadas) y los contadores van en columnas array('q') indexadas
+    por ese id, así que la memoria depende del número de sesiones distintas
+    y no de las filas leídas.
+
+    Los archivos se leen por bloques de ANALYTICS_CHUNK_BYTES y la lista de
+    clientes de cada bloque se divide de una vez en columnas (un split del
+    bloque entero y un slice por columna). Leyendo del snapshot más reciente
+    al más antiguo, las filas de sesiones ya vistas sólo cuestan una búsqueda
+    en el diccionario: sus contadores más nuevos ya están guardados.
+
+    La hora de cada snapshot es su mtime (el de la última escritura de
+    OpenVPN; conservarlo al archivar, p. ej. con `cp -p`).
+    """
+
+    def __init__(self):
+        from array import array
+        
+        self._ids = {}
+        self._since = array('q')
+        self._last_seen = array('q')
+        self._recv = array('q')
+        self._sent = array('q')
+        self.rows = 0
+        self.snapshots = 0
+        self._oldest = None
+        self._columns = None
+        self._durations = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    @timed
+    def add_file(self, path: str):
+        """
+        Añade un snapshot (versión 1, 2 o 3, también comprimido con gzip).
+
+        Conviene añadirlos del más reciente al más antiguo: un snapshot más
+        nuevo que otro ya leído se incorpora comparando fila a fila, más despacio.
+        """
+        import gc
+        import gzip
+        
+        taken = int(os.stat(path).st_mtime)
+        opener = gzip.open if path.endswith('.gz') else open
+        # Los bloques crean millones de cadenas y tuplas que nunca forman ciclos;
+        # el recolector cíclico sólo añadiría pasadas sobre ellas
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+                first = f.readline()
+                if first.startswith(('TITLE', 'HEADER')):
+                    chunks = self._chunks(f, first)
+                else:
+                    f.seek(0)
+                    chunks = self._chunks_v1(f)
+                for columns in chunks:
+                    self._add_columns(columns, taken)
+        finally:
+            if collecting:
+                gc.enable()
+        self.snapshots += 1
+        self._oldest = taken if self._oldest is None else min(self._oldest, taken)
+        self._columns = self._durations = None
+
+    @staticmethod
+    def _chunks(f, first: str):
+        # Versiones 2/3: las filas CLIENT_LIST son consecutivas, así que en cada
+        # bloque forman un único tramo de texto; la lectura termina con la lista
+        # de clientes, sin recorrer la tabla de rutas
+        separator = '\t' if '\t' in first else ','
+        marker = '\nCLIENT_LIST' + separator
+        header = '\nHEADER' + separator + 'CLIENT_LIST' + separator
+        sections = ('\nHEADER' + separator + 'ROUTING_TABLE', '\nROUTING_TABLE' + separator,
+                    '\nGLOBAL_STATS' + separator, '\nEND')
+        headers, started = None, False
+        text = '\n' + first + f.read(ANALYTICS_CHUNK_BYTES) + f.readline()
+        while len(text) > 1:
+            if '\r' in text:
+                text = text.replace('\r', '')
+            if headers is None:
+                at = text.find(header)
+                if at >= 0:
+                    end = text.find('\n', at + 1)
+                    headers = ['CLIENT_LIST'] + text[at + 1:end if end >= 0 else None].split(separator)[2:]
+            start = text.find(marker)
+            if start >= 0:
+                if headers is None:
+                    raise ValueError("filas CLIENT_LIST sin cabecera HEADER")
+                end = text.find('\n', text.rfind(marker) + 1)
+                if end < 0:
+                    end = len(text)
+                yield SnapshotAnalytics._split_block(text[start + 1:end], headers, separator)
+                started = True
+                if end < len(text) - 1:
+                    return
+            elif started or (headers is not None and any(section in text for section in sections)):
+                # Lista de clientes terminada justo en el bloque anterior, o
+                # vacía; si no, las filas empiezan en el bloque siguiente
+                return
+            text = '\n' + f.read(ANALYTICS_CHUNK_BYTES) + f.readline()
+
+    @staticmethod
+    def _split_block(block: str, headers, separator: str):
+        # Todas las filas tienen tantos campos como la cabecera: el bloque se
+        # divide entero y cada columna es un slice con paso = nº de campos
+        width = len(headers)
+        fields = block.replace('\n', separator).split(separator)
+        if len(fields) % width or fields[::width].count('CLIENT_LIST') * width != len(fields):
+            return SnapshotAnalytics._rows_to_columns(headers, [line.split(separator)
+                                                               for line in block.split('\n')])
+        rows = len(fields) // width
+        return [fields[headers.index(name)::width] if name in headers else [''] * rows
+                for name in ANALYTICS_COLUMNS]
+
+    @staticmethod
+    def _rows_to_columns(headers, rows):
+        positions = [headers.index(name) if name in headers else len(headers) for name in ANALYTICS_COLUMNS]
+        return [[row[position] if position < len(row) else '' for row in rows] for position in positions]
+
+    @staticmethod
+    def _chunks_v1(f):
+        records = iter_status_file_records(f)
+        while True:
+            chunk = list(itertools.islice(records, ANALYTICS_CHUNK_BYTES // 128))
+            rows = [values for kind, _, values in chunk if kind == 'CLIENT_LIST']
+            if rows:
+                yield SnapshotAnalytics._rows_to_columns(chunk[0][1], rows)
+            if len(rows) < len(chunk) or not chunk:
+                return
+
+    def _add_columns(self, columns, taken: int):
+        import operator
+        
+        users, addresses, stamps, texts, recv, sent = columns
+        # La versión 1 no trae el time_t: la sesión se identifica con la fecha en texto
+        since = stamps if stamps[0] else texts
+        to_seconds = int if since is stamps else parse_connected_since
+        self.rows += len(users)
+        ids = list(map(self._ids.get, zip(users, addresses, since)))
+        if self._oldest is None or taken <= self._oldest:
+            # Del más reciente al más antiguo: sólo las sesiones nuevas cuentan
+            if None not in ids:
+                return
+            for i in itertools.compress(range(len(ids)), map(operator.is_, ids, itertools.repeat(None))):
+                self._new_session(users[i], addresses[i], since[i], to_seconds, recv[i], sent[i], taken)
+            return
+        for i, session in enumerate(ids):
+            if session is None:
+                self._new_session(users[i], addresses[i], since[i], to_seconds, recv[i], sent[i], taken)
+            elif self._last_seen[session] < taken:
+                self._recv[session] = int(recv[i] or 0)
+                self._sent[session] = int(sent[i] or 0)
+                self._last_seen[session] = taken
+
+    def _new_session(self, user: str, address: str, since: str, to_seconds, recv: str, sent: str,
+                     taken: int):
+        key = (sys.intern(user), sys.intern(address), sys.intern(since))
+        if key in self._ids:
+            # Repetida dentro del mismo bloque
+            return
+        self._ids[key] = len(self._ids)
+        self._since.append(to_seconds(since) if since else 0)
+        self._last_seen.append(taken)
+        self._recv.append(int(recv or 0))
+        self._sent.append(int(sent or 0))
+
+    @timed
+    def columns(self):
+        """
+        Sesiones en columnas, ordenadas por id de sesión.
+
+        Returns:
+            Diccionario con 'user' y 'real_ip' (listas) y 'since', 'last_seen',
+            'recv', 'sent' (array('q'))
+        """
+        if self._columns is None:
+            keys = list(self._ids)
+            self._columns = {
+                'user': [key[0] for key in keys],
+                'real_ip': [key[1] for key in keys],
+                'since': self._since,
+                'last_seen': self._last_seen,
+                'recv': self._recv,
+                'sent': self._sent,
+            }
+        return self._columns
+
+    def durations(self):
+        """Duración observada de cada sesión (último snapshot - inicio), en segundos"""
+        from array import array
+        import operator
+        
+        if self._durations is None:
+            self._durations = array('q', [d if d > 0 else 0
+                                          for d in map(operator.sub, self._last_seen, self._since)])
+        return self._durations
+
+    def throughputs(self):
+        """Bytes/s medios de cada sesión con duración > 0"""
+        from array import array
+        
+        return array('d', [(r + s) / d for r, s, d in zip(self._recv, self._sent, self.durations())
+                           if d > 0])
+
+    def by_user(self):
+        """
+        Totales por usuario.
+
+        Returns:
+            Diccionario usuario -> [sesiones, bytes recibidos, bytes enviados, segundos]
+        """
+        columns = self.columns()
+        totals = {}
+        for user, r, s, d in zip(columns['user'], columns['recv'], columns['sent'], self.durations()):
+            row = totals.get(user)
+            if row is None:
+                totals[user] = [1, r, s, d]
+            else:
+                row[0] += 1
+                row[1] += r
+                row[2] += s
+                row[3] += d
+        return totals
+
+    def by_subnet(self):
+        """
+        Totales por red de origen: /24 para IPv4 y /64 para IPv6.
+
+        Returns:
+            Diccionario red -> [sesiones, usuarios distintos, bytes totales]
+        """
+        columns = self.columns()
+        subnets = {}
+        for user, real_ip, r, s in zip(columns['user'], columns['real_ip'], columns['recv'], columns['sent']):
+            network = subnet_of(real_ip)
+            row = subnets.get(network)
+            if row is None:
+                row = subnets[network] = [0, set(), 0]
+            row[0] += 1
+            row[1].add(user)
+            row[2] += r + s
+        return {network: [sessions, len(users), total]
+                for network, (sessions, users, total) in subnets.items()}
+
+IPV4_REAL_ADDRESS = re.compile(r'(?:^|:)(\d{1,3}\.\d{1,3}\.\d{1,3})\.\d{1,3}(?::\d+)?$')
+
+def subnet_of(real_ip: str):
+    """Red /24 (IPv4) o /64 (IPv6) de una dirección real del status ('N/A' si no se reconoce)"""
+    match = IPV4_REAL_ADDRESS.search(real_ip)
+    if match:
+        return f"{match.group(1)}.0/24"
+    import ipaddress
+    
+    host = real_address_host(real_ip)
+    if host is None:
+        return 'N/A'
+    return str(ipaddress.ip_network(f"{host}/{24 if host.version == 4 else 64}", strict=False))
+
+def percentiles(values, points=(50, 90, 99)):
+    """Percentiles (rango más cercano) de una secuencia numérica; None si está vacía"""
+    ordered = sorted(values)
+    if not ordered:
+        return {point: None for point in points}
+    return {point: ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))]
+            for point in points}
+
+class LiveConnection(Connection):
+    """Connection del modo en vivo: añade el throughput medido y la hora de la última medida"""
+
+    __slots__ = ('rate_recv', 'rate_sent', 'updated')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_recv = self.rate_sent = 0.0
+        self.updated = time.monotonic()
+
+class LiveConnectionTracker:
+    """
+    Mapa de conexiones en memoria actualizado con notificaciones del management interface.
+
+    Parte de un snapshot de `status 3` y después aplica de forma incremental
+    `>BYTECOUNT_CLI` y `>CLIENT:ESTABLISHED/CONNECT/DISCONNECT`, calculando el
+    throughput de cada cliente. Sólo las filas modificadas se vuelven a formatear.
+    """
+
+    def __init__(self):
+        self.connections = {}
+        self._rows = {}
+        self._pending = None
+
+    def load_snapshot(self, connections):
+        """Sincroniza el mapa con un snapshot completo conservando los ritmos ya medidos"""
+        now = time.monotonic()
+        fresh = {}
+        for conn in connections:
+            cid = conn.client_id
+            if not cid:
+                continue
+            live = LiveConnection(conn.user, conn.real_ip, conn.virtual_ip, conn.bytes_recv,
+                                  conn.bytes_sent, conn.connected_since_ts, cid)
+            previous = self.connections.get(cid)
+            if previous and previous.user == conn.user:
+                live.rate_recv = previous.rate_recv
+                live.rate_sent = previous.rate_sent
+            live.updated = now
+            fresh[cid] = live
+        self._rows.clear()
+        self.connections = fresh
+
+    def handle(self, line: str):
+        """Listener para ManagementClient: aplica una notificación al mapa"""
+        if line.startswith('>BYTECOUNT_CLI:'):
+            fields = line[15:].split(',')
+            if len(fields) == 3:
+                self._update_bytes(fields[0], _to_int(fields[1]), _to_int(fields[2]))
+        elif line.startswith('>CLIENT:ENV,'):
+            if self._pending is None:
+                return
+            entry = line[12:]
+            if entry == 'END':
+                self._apply_client_event(*self._pending)
+                self._pending = None
+            else:
+                key, _, value = entry.partition('=')
+                self._pending[2][key] = value
+        elif line.startswith('>CLIENT:'):
+            event, _, args = line[8:].partition(',')
+            cid = args.split(',')[0]
+            self._pending = (event, cid, {})
+
+    def _update_bytes(self, cid, bytes_recv, bytes_sent):
+        conn = self.connections.get(cid)
+        if conn is None:
+            return
+        now = time.monotonic()
+        elapsed = now - conn.updated
+        if elapsed > 0:
+            # Un contador menor indica reinicio de sesión: no se calcula ritmo negativo
+            conn.rate_recv = max(bytes_recv - conn.bytes_recv, 0) / elapsed
+            conn.rate_sent = max(bytes_sent - conn.bytes_sent, 0) / elapsed
+        conn.bytes_recv = bytes_recv
+        conn.bytes_sent = bytes_sent
+        conn.updated = now
+        self._rows.pop(cid, None)
+
+    def _apply_client_event(self, event, cid, env):
+        if event == 'DISCONNECT':
+            self.connections.pop(cid, None)
+            self._rows.pop(cid, None)
+        elif event in ('ESTABLISHED', 'CONNECT', 'REAUTH'):
+            conn = self.connections.get(cid) or LiveConnection('N/A', client_id=cid)
+            conn.user = env.get('common_name', 'N/A')
+            conn.real_ip = f"{env.get('trusted_ip', 'N/A')}:{env.get('trusted_port', '')}".rstrip(':')
+            conn.virtual_ip = env.get('ifconfig_pool_remote_ip') or 'N/A'
+            conn.connected_since_ts = _to_int(env.get('time_unix'))
+            conn.updated = time.monotonic()
+            self.connections[cid] = conn
+            self._rows.pop(cid, None)
+
+    def row(self, cid):
+        """Celdas formateadas de una conexión, cacheadas hasta su próximo cambio"""
+        cells = self._rows.get(cid)
+        if cells is None:
+            conn = self.connections[cid]
+            cells = (
+                conn.user,
+                conn.real_ip,
+                conn.virtual_ip,
+                format_bytes(conn.bytes_recv),
+                format_bytes(conn.bytes_sent),
+                f"{format_bytes(conn.rate_recv)}/s",
+                f"{format_bytes(conn.rate_sent)}/s",
+            )
+            self._rows[cid] = cells
+        return cells
+
+    def top(self, limit: int):
+        """IDs de las conexiones con más throughput, limitados a las filas visibles"""
+        return heapq.nlargest(
+            limit, self.connections,
+            key=lambda cid: self.connections[cid].rate_recv + self.connections[cid].rate_sent,
+        )
+
+# Último análisis de cada archivo de status: ruta -> (firma, conexiones)
+_status_cache = {}
+
+# Columnas usadas de cada sección del status (mismos nombres en las versiones 1, 2 y 3)
+STATUS_CLIENT_COLUMNS = ('Common Name', 'Real Address', 'Virtual Address', 'Bytes Received',
+                         'Bytes Sent', 'Connected Since', 'Connected Since (time_t)', 'Client ID')
+STATUS_ROUTE_COLUMNS = ('Virtual Address', 'Common Name', 'Real Address')
+
+def iter_status_file_records(f):
+    """
+    Registros de un archivo de status de OpenVPN en cualquiera de sus versiones.
+
+    La versión se detecta por la primera línea: 'OpenVPN CLIENT LIST' (1),
+    'TITLE,' (2, separado por comas) o 'TITLE<tab>' (3). La versión 1 no
+    tiene líneas HEADER: la cabecera es la primera línea de cada sección.
+
+    Args:
+        f: Archivo de texto abierto (se lee línea a línea)
+
+    Returns:
+        Generador de tuplas (tipo, cabeceras, valores) como iter_status_records
+    """
+    first = f.readline().rstrip('\r\n')
+    lines = (line.rstrip('\r\n') for line in f)
+    if first.startswith(('TITLE', 'HEADER')):
+        separator = '\t' if '\t' in first else ','
+        yield from iter_status_records(itertools.chain([first], lines), separator)
+        return
+    if first != 'OpenVPN CLIENT LIST':
+        raise ValueError(f"formato de status no reconocido: {first[:40]!r}")
+    
+    kind, headers = 'CLIENT_LIST', None
+    for line in lines:
+        if line == 'ROUTING TABLE':
+            kind, headers = 'ROUTING_TABLE', None
+        elif line in ('GLOBAL STATS', 'END'):
+            kind = None
+        elif kind is None or not line or line.startswith('Updated,'):
+            continue
+        elif headers is None:
+            headers = line.split(',')
+        else:
+            yield kind, headers, line.split(',')
+
+def _status_layout(headers, names):
+    """
+    Extractor de columnas para una cabecera del status.
+
+    Returns:
+        (función valores -> tupla de columnas, True si hay que añadir un campo vacío)
+    """
+    from operator import itemgetter
+    
+    # Las columnas que faltan apuntan a un campo vacío añadido al final de la fila
+    index = [headers.index(name) if name in headers else len(headers) for name in names]
+    return itemgetter(*index), max(index) >= len(headers)
+
+@timed
+def parse_status_file(status_path: str):
+    """
+    Conexiones activas según el archivo de status (versiones 1, 2 y 3).
+
+    La IP virtual sale de la lista de clientes o, si no la trae (versión 1),
+    de la tabla de rutas indexada por CN + dirección real. Las columnas se
+    localizan una vez por cabecera en lugar de crear un diccionario por fila,
+    y el resultado se reutiliza mientras el archivo no cambie.
+
+    Returns:
+        ConnectionSet
+
+    Raises:
+        OSError: Si el archivo no se puede leer
+        ValueError: Si no es un archivo de status reconocible
+    """
+    st = os.stat(status_path)
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _status_cache.get(status_path)
+    if cached is None or cached[0] != signature:
+        connections = []
+        missing = 0
+        routes = {}
+        layouts = {}
+        with open(status_path, 'r', encoding='utf-8', errors='replace') as f:
+            for kind, headers, values in iter_status_file_records(f):
+                if kind == 'ROUTING_TABLE' and not missing:
+                    break  # Todas las conexiones traen ya su IP virtual: el resto sobra
+                # Una cabecera por tipo de sección; se guarda la propia lista y se compara
+                # identidad (un id() puede reutilizarse cuando la lista anterior se libera)
+                layout = layouts.get(kind)
+                if layout is None or layout[0] is not headers:
+                    names = STATUS_CLIENT_COLUMNS if kind == 'CLIENT_LIST' else STATUS_ROUTE_COLUMNS
+                    layout = layouts[kind] = (headers, len(headers)) + _status_layout(headers, names)
+                _, width, columns, pad = layout
+                if pad or len(values) < width:
+                    values += [''] * (width + 1 - len(values))
+                
+                if kind == 'CLIENT_LIST':
+                    conn = Connection.from_status(*columns(values))
+                    if conn.virtual_ip == 'N/A':
+                        missing += 1
+                    connections.append(conn)
+                elif kind == 'ROUTING_TABLE':
+                    address, user, real_ip = columns(values)
+                    key = (user, real_ip)
+                    # Con iroute un cliente tiene también rutas de subred: se prefiere su dirección
+                    if address and (key not in routes or ('/' in routes[key] and '/' not in address)):
+                        routes[key] = address
+        if routes:
+            for conn in connections:
+                if conn.virtual_ip == 'N/A':
+                    conn.virtual_ip = routes.get((conn.user, conn.real_ip), 'N/A')
+        cached = _status_cache[status_path] = (signature, connections)
+    # Copias: quien llama puede modificar las conexiones sin alterar la caché
+    return ConnectionSet(conn.copy() for conn in cached[1])
+
+def format_bytes(bytes_val):
+    """Convierte bytes a formato legible"""
+    try:
+        b = float(bytes_val)
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if b < 1024:
+                return f"{b:.2f} {unit}"
+            b /= 1024
+        return f"{b:.2f} TB"
+    except:
+        return str(bytes_val)
+
+def view_connections():
+    """Opción 2: Ver conexiones activas"""
+    clear_screen()
+    show_header()
+    
+    console.print(Panel("[bold]👥 Conexiones Activas[/bold]", border_style="green"))
+    console.print()
+    
+    multi = is_multi_server()
+    # El modo en vivo sigue las notificaciones de una sola instancia
+    if not multi and Confirm.ask("¿Ver en modo en vivo?", default=False):
+        watch_connections()
+        return
+    
+    console.print()
+    
+    if multi:
+        with console.status(f"[bold green]🔍 Consultando {len(load_servers())} servidores..."):
+            connections, results = gather_connections()
+        for name, result in results.items():
+            if result.error is not None:
+                console.print(f"[yellow]⚠️  {name}: {result.error}[/yellow]")
+    else:
+        with console.status("[bold green]🔍 Obteniendo conexiones activas..."):
+            connections = ConnectionSet()
+            try:
+                connections = ConnectionSet(get_active_connections_mgmt())
+            except Exception as e:
+                console.print(f"[yellow]⚠️  Management interface no disponible, usando archivo de status...[/yellow]")
+                try:
+                    connections = parse_status_file(current_settings().status_path)
+                except Exception as e2:
+                    console.print(f"[red]❌ Error: {e2}[/red]")
+    
+    console.print()
+    
+    if not connections:
+        console.print("[yellow]ℹ️  No hay conexiones activas[/yellow]")
+    else:
+        table = Table(title=f"✅ {len(connections)} conexión(es) activa(s)", box=box.ROUNDED)
+        
+        if multi:
+            table.add_column("Servidor", style="white bold", no_wrap=True)
+        table.add_column("Usuario", style="cyan bold", no_wrap=True)
+        table.add_column("IP Real", style="magenta")
+        table.add_column("IP Virtual", style="blue")
+        table.add_column("Descarga", style="green", justify="right")
+        table.add_column("Subida", style="yellow", justify="right")
+        table.add_column("Conectado desde", style="dim")
+        
+        for conn in connections:
+            table.add_row(
+                *([conn.server] if multi else []),
+                conn.user,
+                conn.real_ip,
+                conn.virtual_ip,
+                format_bytes(conn.bytes_recv),
+                format_bytes(conn.bytes_sent),
+                conn.connected_since
+            )
+        
+        console.print(table)
+    
+    console.print()
+    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+
+def render_live_dashboard(tracker: LiveConnectionTracker, interval: int):
+    """Construye el layout del modo en vivo con resumen y filas visibles"""
+    connections = tracker.connections.values()
+    total_recv = sum(conn.rate_recv for conn in connections)
+    total_sent = sum(conn.rate_sent for conn in connections)
+    
+    summary = (
+        f"[bold cyan]👥 {len(tracker.connections)} conexión(es)[/bold cyan]   "
+        f"[green]📥 {format_bytes(total_recv)}/s[/green]   "
+        f"[yellow]📤 {format_bytes(total_sent)}/s[/yellow]   "
+        f"[dim]Actualización cada {interval}s · Ctrl+C para volver[/dim]"
+    )
+    
+    # Sólo se construyen las filas que caben en pantalla
+    visible = max(console.size.height - 10, 1)
+    table = Table(box=box.ROUNDED, expand=True)
+    table.add_column("Usuario", style="cyan bold", no_wrap=True)
+    table.add_column("IP Real", style="magenta")
+    table.add_column("IP Virtual", style="blue")
+    table.add_column("Descarga", style="green", justify="right")
+    table.add_column("Subida", style="yellow", justify="right")
+    table.add_column("↓ Ritmo", style="green bold", justify="right")
+    table.add_column("↑ Ritmo", style="yellow bold", justify="right")
+    
+    for cid in tracker.top(visible):
+        table.add_row(*tracker.row(cid))
+    
+    layout = Layout()
+    layout.split_column(
+        Layout(Panel(summary, title="[bold]📡 Conexiones en vivo[/bold]", border_style="green"), size=3),
+        Layout(table),
+    )
+    return layout
+
+def watch_connections(interval: int = LIVE_BYTECOUNT_INTERVAL):
+    """Modo en vivo de conexiones activas basado en notificaciones del management interface"""
+    client = get_mgmt_client()
+    tracker = LiveConnectionTracker()
+    
+    try:
+        with console.status("[bold green]🔍 Obteniendo conexiones activas..."):
+            tracker.load_snapshot(get_active_connections_mgmt(client))
+        client.add_listener(tracker.handle)
+        client.command(f"bytecount {interval}")
+    except Exception as e:
+        client.remove_listener(tracker.handle)
+        console.print(f"[red]❌ Error: {e}[/red]")
+        console.print("[yellow]💡 El modo en vivo requiere el management interface[/yellow]")
+        console.print()
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    
+    last_sync = time.monotonic()
+    try:
+        with Live(render_live_dashboard(tracker, interval), console=console,
+                  screen=True, auto_refresh=False) as live:
+            while True:
+                client.poll(interval)
+                # Resincronización periódica: sin management-client-auth no llegan eventos >CLIENT
+                if time.monotonic() - last_sync >= LIVE_RESYNC_INTERVAL:
+                    tracker.load_snapshot(get_active_connections_mgmt(client))
+                    last_sync = time.monotonic()
+                live.update(render_live_dashboard(tracker, interval), refresh=True)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        console.print(f"[red]❌ Error: {e}[/red]")
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+    finally:
+        client.remove_listener(tracker.handle)
+        try:
+            client.command("bytecount 0")
+        except Exception:
+            pass
+
+@contextmanager
+def pki_lock(easyrsa_path: str = None):
+    """
+    Bloqueo exclusivo del PKI compartido por todas las operaciones del manager.
+
+    Usa flock sobre un archivo propio dentro de pki/ (no sobre index.txt,
+    que se sustituye por renombrado), así que también coordina varias
+    instancias del manager ejecutándose a la vez.
+    """
+    import fcntl
+    from pathlib import Path
+    
+    lock_path = Path(easyrsa_path or current_settings().easyrsa_path) / "pki" / PKI_LOCK_NAME
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def remove_index_entries(username: str, index_path=None):
+    """
+    Elimina de index.txt las entradas cuyo CN es exactamente `username`.
+
+    El archivo se reescribe línea a línea a un temporal en el mismo
+    directorio, se hace fsync y se sustituye con un rename atómico: una
+    interrupción nunca deja la base de datos del PKI truncada. Debe llamarse
+    con pki_lock() adquirido.
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    import stat
+    import tempfile
+    from pathlib import Path
+    
+    index_path = Path(index_path or Path(current_settings().easyrsa_path) / "pki" / "index.txt")
+    fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix=f".{index_path.name}.")
+    # Envolver el descriptor antes de nada: así se cierra aunque falle la apertura de index.txt
+    dst = os.fdopen(fd, 'wb')
+    marker = f"/CN={username}".encode()
+    removed = 0
+    try:
+        with dst, open(index_path, 'rb') as src:
+            for line in src:
+                # Filtro rápido por subcadena; la comparación exacta sólo para candidatas
+                if marker not in line:
+                    dst.write(line)
+                    continue
+                parts = line.rstrip(b"\r\n").split(b"\t")
+                if len(parts) >= 6 and dn_common_name(parts[5].decode('utf-8', errors='replace')) == username:
+                    removed += 1
+                    continue
+                dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        st = os.stat(index_path)
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    
+    # Persistir también la entrada de directorio del rename
+    dir_fd = os.open(index_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return removed
+
+def run_easyrsa(*args, input=None, settings: Settings = None):
+    """Ejecuta un comando de easy-rsa dentro de easyrsa_path (de `settings` o de los ajustes en vigor)"""
+    import subprocess
+    from pathlib import Path
+    
+    settings = settings or current_settings()
+    # El span se nombra por el subcomando (gen-req, sign-req...), no por opciones como --batch
+    command = next((arg for arg in args if not arg.startswith('-')), None)
+    with span(f"run_easyrsa {command}" if command else "run_easyrsa"):
+        return subprocess.run(
+            ["./easyrsa", *args],
+            cwd=Path(settings.easyrsa_path),
+            capture_output=True,
+            text=True,
+            input=input
+        )
+
+def easyrsa_error(result):
+    """Motivo de error de una ejecución de easy-rsa (suele estar en la última línea)"""
+    output = (result.stderr or result.stdout).strip().splitlines()
+    return output[-1] if output else "Error"
+
+def publish_crl(crl_path: str = None, easyrsa_path: str = None):
+    """
+    Copia pki/crl.pem a la ruta que lee OpenVPN (`crl-verify`) de forma atómica.
+
+    OpenVPN vuelve a leer la CRL en el siguiente handshake TLS cuando el
+    archivo cambia, así que no hace falta reiniciar el servicio. Se escribe
+    un temporal en el mismo directorio y se sustituye con un rename: OpenVPN
+    nunca ve un archivo a medio escribir.
+
+    Returns:
+        Ruta publicada, o None si no hay ruta configurada o es la del propio PKI
+
+    Raises:
+        OSError: Si no se puede leer o escribir
+        ValueError: Si pki/crl.pem no es una CRL en formato PEM
+    """
+    import tempfile
+    from pathlib import Path
+    
+    source = Path(easyrsa_path or current_settings().easyrsa_path) / "pki" / "crl.pem"
+    target = Path(crl_path or current_settings().crl_path or source)
+    if target.resolve() == source.resolve():
+        return None
+    data = source.read_bytes()
+    if b"-----BEGIN X509 CRL-----" not in data:
+        raise ValueError(f"{source} no contiene una CRL")
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # OpenVPN la relee tras bajar privilegios (user nobody): debe ser legible por todos
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return target
+
+def regenerate_crl():
+    """
+    Regenera la CRL con easy-rsa y la publica en crl_path. Debe llamarse con
+    pki_lock() adquirido.
+
+    Returns:
+        Mensaje de error, o None si la CRL quedó generada y publicada
+    """
+    result = run_easyrsa("gen-crl")
+    if result.returncode != 0:
+        return result.stderr or easyrsa_error(result)
+    try:
+        publish_crl()
+    except (OSError, ValueError) as e:
+        return f"CRL generada pero no publicada en {current_settings().crl_path}: {e}"
+    return None
+
+def disconnect_users(usernames):
+    """
+    Corta las sesiones activas de unos usuarios en todas las instancias
+    (tras revocarlos: al reconectar, la CRL nueva rechaza el handshake).
+
+    Returns:
+        Tupla (filas de kill_connections, {servidor: error} de los que no respondieron)
+    """
+    connections, results = gather_connections()
+    failed = {name: result.error for name, result in results.items() if result.error is not None}
+    return kill_connections(filter_connections(connections, users=usernames)), failed
+
+def revoke_certificates(usernames, progress=None):
+    """
+    Revoca uno o varios certificados y regenera la CRL una única vez.
+
+    Args:
+        usernames: Nombres de usuario a revocar
+        progress: Función opcional llamada con (índice, total, usuario) antes de cada revocación
+
+    Returns:
+        Tupla (resultados, crl_error, tiempos): resultados es una lista de
+        (usuario, ok, detalle), crl_error el mensaje de gen-crl si falló y
+        tiempos un diccionario fase -> segundos
+    """
+    results = []
+    timings = {}
+    
+    crl_error = None
+    
+    with pki_lock():
+        started = time.perf_counter()
+        for i, username in enumerate(usernames, 1):
+            if progress:
+                progress(i, len(usernames), username)
+            result = run_easyrsa("revoke", username, input="yes\n")
+            if result.returncode == 0:
+                results.append((username, True, "Revocado"))
+            else:
+                results.append((username, False, easyrsa_error(result)))
+        timings['revoke'] = time.perf_counter() - started
+        
+        if any(ok for _, ok, _ in results):
+            started = time.perf_counter()
+            crl_error = regenerate_crl()
+            timings['gen-crl'] = time.perf_counter() - started
     
-    console.print(Panel("[bold]👥 Conexiones Activas[/bold]", border_style="green"))
-    console.print()
+    return results, crl_error, timings
+
+def show_revocation_summary(results, crl_error, timings):
+    """Muestra la tabla de resultados de una revocación múltiple"""
+    table = Table(title="📋 Resultado de la revocación", box=box.ROUNDED)
+    table.add_column("Usuario", style="cyan bold")
+    table.add_column("Resultado", justify="center")
+    table.add_column("Detalle", style="dim")
     
-    with console.status("[bold green]🔍 Obteniendo conexiones activas..."):
-        connections = []
-        try:
-            connections = get_active_connections_mgmt(DEFAULT_MGMT_HOST, DEFAULT_MGMT_PORT)
-        except Exception as e:
-            console.print(f"[yellow]⚠️  Management interface no disponible, usando archivo de status...[/yellow]")
-            try:
-                connections = parse_status_file(DEFAULT_STATUS_PATH)
-            except Exception as e2:
-                console.print(f"[red]❌ Error: {e2}[/red]")
+    for username, ok, detail in results:
+        table.add_row(username, "[green]✅[/green]" if ok else "[red]❌[/red]", detail)
     
-    console.print()
+    console.print(table)
     
-    if not connections:
-        console.print("[yellow]ℹ️  No hay conexiones activas[/yellow]")
-    else:
-        table = Table(title=f"✅ {len(connections)} conexión(es) activa(s)", box=box.ROUNDED)
-        
-        table.add_column("Usuario", style="cyan bold", no_wrap=True)
-        table.add_column("IP Real", style="magenta")
-        table.add_column("IP Virtual", style="blue")
-        table.add_column("Descarga", style="green", justify="right")
-        table.add_column("Subida", style="yellow", justify="right")
-        table.add_column("Conectado desde", style="dim")
-        
-        for conn in connections:
-            table.add_row(
-                conn['user'],
-                conn['real_ip'],
-                conn.get('virtual_ip', 'N/A'),
-                format_bytes(conn.get('bytes_recv', 0)),
-                format_bytes(conn.get('bytes_sent', 0)),
-                conn.get('connected_since', 'N/A')
-            )
-        
-        console.print(table)
+    revoked = sum(1 for _, ok, _ in results if ok)
+    console.print(f"\n[bold]{revoked}/{len(results)}[/bold] certificado(s) revocado(s)")
     
-    console.print()
-    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+    phases = f"⏱️  Revocación: {timings.get('revoke', 0):.2f}s"
+    if 'gen-crl' in timings:
+        phases += f" · CRL: {timings['gen-crl']:.2f}s"
+    if 'kill' in timings:
+        phases += f" · Desconexión: {timings['kill']:.2f}s"
+    console.print(f"[dim]{phases}[/dim]")
+    
+    if crl_error:
+        console.print(f"[red]⚠️  Error al generar CRL: {crl_error}[/red]")
+    elif revoked:
+        console.print("[green]✅ CRL actualizada (una sola vez)[/green]")
+
+def revoked_disconnect(usernames, timings: dict):
+    """Desconecta a los usuarios recién revocados, midiendo el tiempo en timings['kill']"""
+    started = time.perf_counter()
+    with console.status("[bold yellow]👢 Desconectando sesiones activas de los revocados..."):
+        try:
+            rows, failed = disconnect_users(usernames)
+        except Exception as e:
+            rows, failed = [], {'management': e}
+    timings['kill'] = time.perf_counter() - started
+    return rows, failed
+
+def show_disconnect_result(rows, failed):
+    """Resumen de las sesiones cortadas tras una revocación"""
+    if rows:
+        killed = sum(1 for row in rows if row['ok'])
+        console.print(f"[green]✅ {killed}/{len(rows)} sesión(es) activa(s) desconectada(s)[/green]")
+        for row in rows:
+            if not row['ok']:
+                console.print(f"[yellow]⚠️  {row['user']} ({row['server']}): {row['detail']}[/yellow]")
+    elif not failed:
+        console.print("[dim]Ningún usuario revocado estaba conectado[/dim]")
+    for name, error in failed.items():
+        console.print(f"[yellow]⚠️  {name}: {error}. Sus sesiones siguen abiertas hasta la próxima renegociación TLS[/yellow]")
+    console.print("[dim]OpenVPN aplica la CRL en el próximo handshake: no hace falta reiniciarlo[/dim]")
 
 def revoke_user():
     """Opción 3: Revocar usuario"""
+    from pathlib import Path
+    
     clear_screen()
     show_header()
     
@@ -348,27 +3939,32 @@ def revoke_user():
     
     if not valid_users:
         console.print("[yellow]⚠️  No se encontraron certificados válidos[/yellow]")
-        console.print("[dim]Verifica que EASYRSA_PATH esté correctamente configurado[/dim]")
+        console.print("[dim]Verifica que easyrsa_path esté correctamente configurado[/dim]")
         console.print()
         Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
         return
     
     console.print(f"[green]✓ {len(valid_users)} usuario(s) con acceso activo[/green]\n")
     
-    username = select_user_from_list(valid_users, "📋 Usuarios con acceso activo")
+    usernames = select_user_from_list(valid_users, "📋 Usuarios con acceso activo", multiple=True)
     
-    if username == "CANCEL":
+    if usernames == "CANCEL":
         console.print("\n[yellow]← Volviendo al menú principal...[/yellow]")
         time.sleep(1)
         return
     
-    if not username:
+    if not usernames:
         console.print("\n[red]❌ Selección inválida[/red]")
         Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
         return
     
     console.print()
-    confirm = Confirm.ask(f"[bold red]⚠️  ¿Estás seguro de revocar el acceso a '{username}'?[/bold red]")
+    if len(usernames) == 1:
+        confirm = Confirm.ask(f"[bold red]⚠️  ¿Estás seguro de revocar el acceso a '{usernames[0]}'?[/bold red]")
+    else:
+        preview = ", ".join(usernames[:10]) + (f" y {len(usernames) - 10} más" if len(usernames) > 10 else "")
+        console.print(f"[bold]Usuarios seleccionados:[/bold] {preview}")
+        confirm = Confirm.ask(f"[bold red]⚠️  ¿Estás seguro de revocar el acceso a {len(usernames)} usuarios?[/bold red]")
     
     if not confirm:
         console.print("[yellow]❌ Operación cancelada[/yellow]")
@@ -376,51 +3972,56 @@ def revoke_user():
         return
     
     console.print()
-    with console.status(f"[bold yellow]🔒 Revocando certificado de '{username}'..."):
-        easyrsa_dir = Path(EASYRSA_PATH)
-        if not easyrsa_dir.exists():
-            console.print(f"[red]❌ No se encontró easy-rsa en: {EASYRSA_PATH}[/red]")
-            console.print("[yellow]💡 Edita EASYRSA_PATH en el script[/yellow]")
-            Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
-            return
+    easyrsa_dir = Path(current_settings().easyrsa_path)
+    if not easyrsa_dir.exists():
+        console.print(f"[red]❌ No se encontró easy-rsa en: {current_settings().easyrsa_path}[/red]")
+        console.print("[yellow]💡 Ajusta easyrsa_path en la configuración (o usa --easyrsa-path)[/yellow]")
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    
+    # Los nombres que no tienen certificado activo no llegan a easy-rsa
+    valid_set = set(valid_users)
+    unknown = [(u, False, "Sin certificado activo") for u in usernames if u not in valid_set]
+    targets = [u for u in usernames if u in valid_set]
+    
+    with console.status("[bold yellow]🔒 Revocando certificados...") as status:
+        def progress(i, total, username):
+            status.update(f"[bold yellow]🔒 Revocando certificado de '{username}' ({i}/{total})...")
         
         try:
-            result = subprocess.run(
-                ["./easyrsa", "revoke", username],
-                cwd=easyrsa_dir,
-                capture_output=True,
-                text=True,
-                input="yes\n"
-            )
-            
-            if result.returncode == 0:
-                console.print(f"[green]✅ Certificado de '{username}' revocado[/green]")
-                
-                console.print("\n[yellow]📝 Generando nueva CRL...[/yellow]")
-                crl_result = subprocess.run(
-                    ["./easyrsa", "gen-crl"],
-                    cwd=easyrsa_dir,
-                    capture_output=True,
-                    text=True
-                )
-                
-                if crl_result.returncode == 0:
-                    console.print("[green]✅ CRL actualizada[/green]")
-                    console.print("\n[yellow]⚠️  Recuerda reiniciar el servicio OpenVPN:[/yellow]")
-                    console.print("[cyan]   sudo systemctl restart openvpn@server[/cyan]")
-                else:
-                    console.print(f"[red]⚠️  Error al generar CRL: {crl_result.stderr}[/red]")
-            else:
-                console.print(f"[red]❌ Error al revocar: {result.stderr}[/red]")
-                
+            results, crl_error, timings = revoke_certificates(targets, progress)
         except Exception as e:
             console.print(f"[red]❌ Error: {e}[/red]")
+            console.print()
+            Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+            return
+    
+    results += unknown
+    revoked = [username for username, ok, _ in results if ok]
+    # Con la CRL ya publicada, las sesiones abiertas se cortan y no pueden volver a entrar
+    disconnected = revoked_disconnect(revoked, timings) if revoked and not crl_error else None
+    if len(usernames) == 1:
+        username, ok, detail = results[0]
+        if ok:
+            console.print(f"[green]✅ Certificado de '{username}' revocado[/green]")
+            if crl_error:
+                console.print(f"[red]⚠️  Error al generar CRL: {crl_error}[/red]")
+            else:
+                console.print("[green]✅ CRL actualizada[/green]")
+        else:
+            console.print(f"[red]❌ Error al revocar: {detail}[/red]")
+    else:
+        show_revocation_summary(results, crl_error, timings)
+    if disconnected:
+        show_disconnect_result(*disconnected)
     
     console.print()
     Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
 
 def restore_user():
     """Opción 4: Restaurar acceso de usuario"""
+    from pathlib import Path
+    
     clear_screen()
     show_header()
     
@@ -466,52 +4067,33 @@ def restore_user():
     
     console.print()
     with console.status(f"[bold yellow]🔓 Restaurando acceso de '{username}'..."):
-        easyrsa_dir = Path(EASYRSA_PATH)
+        easyrsa_dir = Path(current_settings().easyrsa_path)
         
         try:
-            # Remover del índice (esto permite regenerar el certificado)
-            index_file = easyrsa_dir / "pki" / "index.txt"
-            if index_file.exists():
-                with open(index_file, 'r') as f:
-                    lines = f.readlines()
-                
-                with open(index_file, 'w') as f:
-                    for line in lines:
-                        if f'/CN={username}' not in line:
-                            f.write(line)
+            # Todo el proceso bloquea el PKI frente a otras operaciones del manager
+            with pki_lock():
+                # Remover del índice (esto permite regenerar el certificado)
+                index_file = easyrsa_dir / "pki" / "index.txt"
+                if index_file.exists():
+                    removed = remove_index_entries(username, index_file)
+                    console.print(f"[green]✓ {removed} entrada(s) eliminada(s) del índice[/green]")
                 
-                console.print(f"[green]✓ Entrada eliminada del índice[/green]")
-            
-            # Generar nuevo certificado sin contraseña
-            result = subprocess.run(
-                ["./easyrsa", "build-client-full", username, "nopass"],
-                cwd=easyrsa_dir,
-                capture_output=True,
-                text=True
-            )
+                # Generar nuevo certificado sin contraseña
+                result = run_easyrsa("build-client-full", username, "nopass")
+                crl_error = regenerate_crl() if result.returncode == 0 else None
             
             if result.returncode == 0:
                 console.print(f"[green]✅ Nuevo certificado generado para '{username}'[/green]")
                 
-                # Regenerar CRL
-                console.print("\n[yellow]📝 Actualizando CRL...[/yellow]")
-                crl_result = subprocess.run(
-                    ["./easyrsa", "gen-crl"],
-                    cwd=easyrsa_dir,
-                    capture_output=True,
-                    text=True
-                )
-                
-                if crl_result.returncode == 0:
+                if not crl_error:
                     console.print("[green]✅ CRL actualizada[/green]")
                     console.print(f"\n[green]🎉 Acceso restaurado para '{username}'[/green]")
                     console.print("\n[cyan]📁 Archivos generados:[/cyan]")
                     console.print(f"   Certificado: {easyrsa_dir}/pki/issued/{username}.crt")
                     console.print(f"   Llave: {easyrsa_dir}/pki/private/{username}.key")
-                    console.print("\n[yellow]⚠️  Recuerda reiniciar el servicio OpenVPN:[/yellow]")
-                    console.print("[cyan]   sudo systemctl restart openvpn@server[/cyan]")
+                    console.print("[dim]OpenVPN aplica la CRL en el próximo handshake: no hace falta reiniciarlo[/dim]")
                 else:
-                    console.print(f"[red]⚠️  Error al generar CRL: {crl_result.stderr}[/red]")
+                    console.print(f"[red]⚠️  Error al generar CRL: {crl_error}[/red]")
             else:
                 console.print(f"[red]❌ Error al generar certificado: {result.stderr}[/red]")
                 
@@ -521,114 +4103,371 @@ def restore_user():
     console.print()
     Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
 
-def kick_user():
-    """Opción 5: Desconectar usuario"""
+def issue_certificates(usernames, workers: int = None, progress=None):
+    """
+    Emite certificados de cliente en paralelo y regenera la CRL una única vez.
+
+    La generación de claves (`gen-req`) es CPU intensiva y sólo escribe
+    archivos propios de cada usuario, así que se reparte entre `workers`
+    procesos de easy-rsa simultáneos. La firma (`sign-req`) modifica el
+    estado compartido del PKI (index.txt, serial) y se serializa con un lock.
+
+    Args:
+        usernames: Nombres de los certificados a emitir
+        workers: Ejecuciones simultáneas (por defecto, número de CPUs)
+        progress: Función opcional llamada con (usuario, ok) al terminar cada uno
+
+    Returns:
+        Tupla (resultados, crl_error, tiempos) como en revoke_certificates
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from pathlib import Path
+    
+    workers = workers or os.cpu_count() or 1
+    sign_lock = threading.Lock()
+    timings = {}
+    
+    def build(username):
+        request = run_easyrsa("--batch", "gen-req", username, "nopass")
+        if request.returncode != 0:
+            return username, False, easyrsa_error(request)
+        with sign_lock, pki_lock():
+            signed = run_easyrsa("--batch", "sign-req", "client", username)
+            if signed.returncode != 0:
+                # Sin borrar la clave y la solicitud, un reintento fallaría en gen-req
+                pki = Path(current_settings().easyrsa_path) / "pki"
+                for leftover in (pki / "private" / f"{username}.key", pki / "reqs" / f"{username}.req"):
+                    try:
+                        leftover.unlink()
+                    except FileNotFoundError:
+                        pass
+        if signed.returncode != 0:
+            return username, False, easyrsa_error(signed)
+        return username, True, "Emitido"
+    
+    started = time.perf_counter()
+    finished = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(copy_context().run, build, username)
+                                  for username in usernames]):
+            username, ok, detail = future.result()
+            finished[username] = (username, ok, detail)
+            if progress:
+                progress(username, ok)
+    timings['issue'] = time.perf_counter() - started
+    results = [finished[username] for username in usernames]
+    
+    crl_error = None
+    if any(ok for _, ok, _ in results):
+        started = time.perf_counter()
+        with pki_lock():
+            crl_error = regenerate_crl()
+        timings['gen-crl'] = time.perf_counter() - started
+    
+    return results, crl_error, timings
+
+def bulk_issue():
+    """Opción 9: Emitir certificados (alta masiva)"""
+    from pathlib import Path
+    
     clear_screen()
     show_header()
     
-    console.print(Panel("[bold]👢 Desconectar Usuario Activo[/bold]", border_style="yellow"))
+    console.print(Panel("[bold]🆕 Alta Masiva de Usuarios[/bold]", border_style="green"))
     console.print()
+    console.print("[dim]💡 Nombres separados por coma · @archivo (uno por línea)[/dim]")
     
-    # Obtener usuarios conectados
-    with console.status("[bold yellow]🔍 Obteniendo usuarios conectados..."):
-        try:
-            connections = get_active_connections_mgmt(DEFAULT_MGMT_HOST, DEFAULT_MGMT_PORT)
-        except:
-            try:
-                connections = parse_status_file(DEFAULT_STATUS_PATH)
-            except:
-                connections = []
+    selection = Prompt.ask("Usuarios a dar de alta").strip()
+    if not selection:
+        console.print("[yellow]❌ Operación cancelada[/yellow]")
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
     
-    if not connections:
-        console.print("[yellow]ℹ️  No hay usuarios conectados actualmente[/yellow]")
-        console.print()
+    try:
+        usernames = parse_multi_selection(selection, [])
+    except ValueError as e:
+        console.print(f"[red]❌ {e}[/red]")
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    except OSError as e:
+        console.print(f"[red]❌ No se pudo leer la lista: {e}[/red]")
         Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
         return
     
-    console.print(f"[green]✓ {len(connections)} usuario(s) conectado(s)[/green]\n")
+    easyrsa_dir = Path(current_settings().easyrsa_path)
+    if not easyrsa_dir.exists():
+        console.print(f"[red]❌ No se encontró easy-rsa en: {current_settings().easyrsa_path}[/red]")
+        console.print("[yellow]💡 Ajusta easyrsa_path en la configuración (o usa --easyrsa-path)[/yellow]")
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
     
-    connected_users = [conn['user'] for conn in connections]
-    username = select_user_from_list(connected_users, "📋 Usuarios conectados")
+    # Los usuarios con certificado vigente no se vuelven a emitir
+    existing = set(get_valid_certificates())
+    skipped = [(u, False, "Ya tiene certificado activo") for u in usernames if u in existing]
+    targets = [u for u in usernames if u not in existing]
     
-    if username == "CANCEL":
-        console.print("\n[yellow]← Volviendo al menú principal...[/yellow]")
-        time.sleep(1)
-        return
+    workers = Prompt.ask("Procesos simultáneos", default=str(os.cpu_count() or 1))
+    try:
+        workers = max(int(workers), 1)
+    except ValueError:
+        workers = os.cpu_count() or 1
     
-    if not username:
-        console.print("\n[red]❌ Selección inválida[/red]")
+    console.print()
+    if not Confirm.ask(f"[bold green]¿Emitir {len(targets)} certificado(s) con {workers} proceso(s)?[/bold green]"):
+        console.print("[yellow]❌ Operación cancelada[/yellow]")
         Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
         return
     
     console.print()
-    with console.status(f"[bold yellow]👢 Desconectando a '{username}'..."):
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            sock.connect((DEFAULT_MGMT_HOST, DEFAULT_MGMT_PORT))
-            
-            sock.recv(1024)
-            command = f"kill {username}\n"
-            sock.send(command.encode())
-            response = sock.recv(1024).decode('utf-8')
-            sock.close()
-            
-            if "SUCCESS" in response:
-                console.print(f"[green]✅ Usuario '{username}' desconectado[/green]")
-            else:
-                console.print(f"[yellow]⚠️  Respuesta: {response}[/yellow]")
-                
-        except Exception as e:
-            console.print(f"[red]❌ Error: {e}[/red]")
-            console.print("[yellow]💡 Asegúrate de que el management interface esté habilitado[/yellow]")
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[bold green]🔐 Emitiendo certificados"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        console=console,
+    ) as bar:
+        task = bar.add_task("issue", total=len(targets))
+        results, crl_error, timings = issue_certificates(
+            targets, workers, progress=lambda username, ok: bar.advance(task)
+        )
+    
+    results += skipped
+    table = Table(title="📋 Resultado del alta", box=box.ROUNDED)
+    table.add_column("Usuario", style="cyan bold")
+    table.add_column("Resultado", justify="center")
+    table.add_column("Detalle", style="dim")
+    for username, ok, detail in results:
+        table.add_row(username, "[green]✅[/green]" if ok else "[red]❌[/red]", detail)
+    console.print(table)
+    
+    issued = sum(1 for _, ok, _ in results if ok)
+    elapsed = timings.get('issue', 0)
+    rate = issued / elapsed if elapsed else 0
+    console.print(f"\n[bold]{issued}/{len(results)}[/bold] certificado(s) emitido(s) · [cyan]{rate:.2f} cert/s[/cyan]")
+    phases = f"⏱️  Emisión: {elapsed:.2f}s"
+    if 'gen-crl' in timings:
+        phases += f" · CRL: {timings['gen-crl']:.2f}s"
+    console.print(f"[dim]{phases}[/dim]")
+    if crl_error:
+        console.print(f"[red]⚠️  Error al generar CRL: {crl_error}[/red]")
+    if issued:
+        console.print(f"\n[cyan]📁 Archivos en:[/cyan] {easyrsa_dir}/pki/issued/ y {easyrsa_dir}/pki/private/")
     
     console.print()
     Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
 
-def show_stats():
-    """Opción 6: Estadísticas"""
+def ask_connection_filters():
+    """Pide los filtros de desconexión masiva (Enter = sin filtro)"""
+    filters = {
+        'pattern': Prompt.ask("Patrón de usuario (p. ej. ext-*)", default="") or None,
+        'network': Prompt.ask("Red CIDR de la IP real (p. ej. 203.0.113.0/24)", default="") or None,
+    }
+    idle = Prompt.ask("Minutos mínimos sin tráfico", default="")
+    min_mb = Prompt.ask("Tráfico mínimo en MB", default="")
+    try:
+        filters['idle'] = float(idle) * 60 if idle else None
+        filters['min_bytes'] = int(float(min_mb) * 1024 * 1024) if min_mb else None
+    except ValueError:
+        raise ValueError("los minutos y MB deben ser números") from None
+    return filters
+
+def show_kick_summary(rows, elapsed: float):
+    """Tabla de resultados de una desconexión (una fila por sesión)"""
+    table = Table(title="📋 Resultado de la desconexión", box=box.ROUNDED)
+    table.add_column("Usuario", style="cyan bold")
+    if is_multi_server():
+        table.add_column("Servidor", style="blue")
+    table.add_column("IP Real", style="yellow")
+    table.add_column("Resultado", justify="center")
+    table.add_column("Detalle", style="dim")
+    
+    for row in rows:
+        cells = [row['user']] + ([row['server'] or "—"] if is_multi_server() else [])
+        table.add_row(*cells, row['real_ip'] or "—", "[green]✅[/green]" if row['ok'] else "[red]❌[/red]",
+                      row['detail'])
+    console.print(table)
+    
+    killed = sum(1 for row in rows if row['ok'])
+    console.print(f"\n[bold]{killed}/{len(rows)}[/bold] sesión(es) desconectada(s)")
+    console.print(f"[dim]⏱️  {elapsed:.2f}s[/dim]")
+
+def kick_user():
+    """Opción 5: Desconectar usuario o sesiones por filtro"""
     clear_screen()
     show_header()
     
-    console.print(Panel("[bold]📊 Estadísticas Generales[/bold]", border_style="green"))
+    console.print(Panel("[bold]👢 Desconectar Usuario Activo[/bold]", border_style="yellow"))
     console.print()
     
-    with console.status("[bold green]📊 Calculando estadísticas..."):
-        try:
-            connections = get_active_connections_mgmt(DEFAULT_MGMT_HOST, DEFAULT_MGMT_PORT)
-        except:
-            try:
-                connections = parse_status_file(DEFAULT_STATUS_PATH)
-            except:
-                connections = []
+    # Una consulta (simultánea con varias instancias) dice qué sesiones hay y dónde
+    with console.status("[bold yellow]🔍 Obteniendo usuarios conectados..."):
+        connections, results = gather_connections()
+    
+    for name, result in results.items():
+        if result.error is not None:
+            console.print(f"[yellow]⚠️  {name}: {result.error}[/yellow]")
+    
+    if not connections:
+        console.print("[yellow]ℹ️  No hay usuarios conectados actualmente[/yellow]")
+        console.print()
+        Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+        return
+    
+    console.print(f"[green]✓ {len(connections)} sesión(es) activa(s)[/green]\n")
+    console.print("  [cyan]1[/cyan] Un usuario (todas sus sesiones)")
+    console.print("  [cyan]2[/cyan] Sesiones por filtro (patrón, red, inactividad, tráfico)")
+    mode = Prompt.ask("Modo", choices=["1", "2"], default="1")
+    console.print()
+    
+    if mode == "1":
+        connected_users = connections.users()
+        username = select_user_from_list(connected_users, "📋 Usuarios conectados")
         
-        valid_users = get_valid_certificates()
-        revoked_users = get_revoked_certificates()
+        if username == "CANCEL":
+            console.print("\n[yellow]← Volviendo al menú principal...[/yellow]")
+            time.sleep(1)
+            return
         
-        total_users = len(connections)
-        total_recv = sum(conn.get('bytes_recv', 0) for conn in connections)
-        total_sent = sum(conn.get('bytes_sent', 0) for conn in connections)
-        total_traffic = total_recv + total_sent
+        if not username:
+            console.print("\n[red]❌ Selección inválida[/red]")
+            Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+            return
+        targets = filter_connections(connections, users=[username])
+    else:
+        try:
+            filters = ask_connection_filters()
+            if filters['idle'] is not None:
+                with console.status("[bold yellow]🔍 Consultando la última actividad..."):
+                    attach_last_activity(connections)
+            targets = filter_connections(connections, **filters)
+        except ValueError as e:
+            console.print(f"\n[red]❌ {e}[/red]")
+            Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+            return
+        if not targets:
+            console.print("\n[yellow]ℹ️  Ninguna sesión cumple los filtros[/yellow]")
+            Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+            return
+        users = list(dict.fromkeys(conn.user for conn in targets))
+        preview = ", ".join(users[:10]) + (f" y {len(users) - 10} más" if len(users) > 10 else "")
+        console.print(f"\n[bold]{len(targets)}[/bold] sesión(es) de {len(users)} usuario(s): {preview}")
+        if not Confirm.ask("¿Desconectar estas sesiones?", default=False):
+            return
+    
+    console.print()
+    started = time.perf_counter()
+    with console.status(f"[bold yellow]👢 Desconectando {len(targets)} sesión(es)..."):
+        rows = kill_connections(targets)
+    show_kick_summary(rows, time.perf_counter() - started)
+    if not all(row['ok'] for row in rows):
+        console.print("[yellow]💡 Asegúrate de que el management interface esté habilitado[/yellow]")
+    
+    console.print()
+    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+
+STATS_SOURCE_LABELS = {
+    'management': "🔌 Management interface",
+    'status_file': "📄 Archivo de status",
+    'valid': "✅ Certificados activos",
+    'revoked': "🚫 Certificados revocados",
+    'history': "🕓 Histórico de tráfico",
+    'expiring': "⏳ Caducan pronto",
+}
+
+def render_stats(results: dict, sources):
+    """Tablas de estadísticas con los datos de las fuentes terminadas hasta ahora"""
+    pending = "[dim]…[/dim]"
+    connections, source = stats_connections(results)
+    servers = [name for name in sources if name.startswith('server:')]
     
     stats_table = Table(box=box.SIMPLE, show_header=False)
     stats_table.add_column("Métrica", style="cyan bold")
     stats_table.add_column("Valor", style="green bold")
     
-    stats_table.add_row("👥 Usuarios conectados", str(total_users))
-    stats_table.add_row("✅ Certificados activos", str(len(valid_users)))
-    stats_table.add_row("🚫 Certificados revocados", str(len(revoked_users)))
-    stats_table.add_row("📥 Tráfico descargado", format_bytes(total_recv))
-    stats_table.add_row("📤 Tráfico subido", format_bytes(total_sent))
-    stats_table.add_row("📊 Tráfico total", format_bytes(total_traffic))
+    if connections is None:
+        stats_table.add_row("👥 Usuarios conectados", pending)
+    else:
+        suffix = " [dim](archivo de status)[/dim]" if source == 'status_file' else ""
+        if source == 'servers':
+            answered = sum(1 for name in servers if name in results and results[name].error is None)
+            suffix = f" [dim]({answered}/{len(servers)} servidores)[/dim]"
+        stats_table.add_row("👥 Usuarios conectados", f"{len(connections)}{suffix}")
+    
+    for name in ('valid', 'revoked'):
+        result = results.get(name)
+        if result is None:
+            value = pending
+        elif result.error is not None:
+            value = "[red]no disponible[/red]"
+        else:
+            value = str(len(result.value))
+        stats_table.add_row(STATS_SOURCE_LABELS[name], value)
+    
+    if 'expiring' in sources:
+        result = results.get('expiring')
+        if result is None:
+            value = pending
+        elif result.error is not None:
+            value = "[red]no disponible[/red]"
+        else:
+            value = f"[yellow]{len(result.value)}[/yellow] [dim](≤ {current_settings().cert_expiring_days} días)[/dim]"
+        stats_table.add_row(STATS_SOURCE_LABELS['expiring'], value)
+    
+    if connections is None:
+        total_recv = total_sent = None
+    else:
+        total_recv = sum(conn.bytes_recv for conn in connections)
+        total_sent = sum(conn.bytes_sent for conn in connections)
+    stats_table.add_row("📥 Tráfico descargado", pending if total_recv is None else format_bytes(total_recv))
+    stats_table.add_row("📤 Tráfico subido", pending if total_sent is None else format_bytes(total_sent))
+    stats_table.add_row("📊 Tráfico total",
+                        pending if total_recv is None else format_bytes(total_recv + total_sent))
+    
+    sources_table = Table(title="Fuentes de datos", box=box.SIMPLE, title_style="dim")
+    sources_table.add_column("Fuente", style="cyan")
+    sources_table.add_column("Estado")
+    sources_table.add_column("Tiempo", style="dim", justify="right")
+    for name in sources:
+        label = STATS_SOURCE_LABELS.get(name) or f"🖧 Servidor {name[7:]}"
+        result = results.get(name)
+        if result is None:
+            sources_table.add_row(label, "[yellow]⏳ consultando[/yellow]", "")
+            continue
+        if isinstance(result.error, TimeoutError):
+            state = "[red]⌛ plazo agotado[/red]"
+        elif result.error is not None:
+            state = f"[red]❌ {result.error}[/red]"
+        else:
+            state = "[green]✅ ok[/green]"
+        sources_table.add_row(label, state, f"{result.elapsed * 1000:.0f} ms")
+    
+    return Group(stats_table, sources_table)
+
+def show_stats():
+    """Opción 6: Estadísticas"""
+    clear_screen()
+    show_header()
+    
+    console.print(Panel("[bold]📊 Estadísticas Generales[/bold]", border_style="green"))
+    console.print()
     
-    console.print(stats_table)
+    # Las fuentes se consultan a la vez y la tabla se rellena según van
+    # respondiendo, así un management interface caído no bloquea el resto
+    results = {}
+    sources = dict(stats_sources(), history=history_top_users,
+                   expiring=lambda: certificate_expiry_report(current_settings().cert_expiring_days))
+    with Live(render_stats(results, sources), console=console, auto_refresh=False) as live:
+        for result in gather_sources(sources, STATS_SOURCE_DEADLINES):
+            results[result.name] = result
+            live.update(render_stats(results, sources), refresh=True)
     
+    connections, _ = stats_connections(results)
     if connections:
-        console.print("\n[bold cyan]Top usuarios por tráfico:[/bold cyan]\n")
+        console.print("\n[bold cyan]Top usuarios por tráfico (sesiones activas):[/bold cyan]\n")
         
-        sorted_conns = sorted(connections, 
-                            key=lambda x: x.get('bytes_recv', 0) + x.get('bytes_sent', 0), 
-                            reverse=True)[:5]
+        sorted_conns = heapq.nlargest(
+            5, connections, key=lambda x: x.bytes_total)
         
         top_table = Table(box=box.ROUNDED)
         top_table.add_column("#", style="dim", width=3)
@@ -636,11 +4475,43 @@ def show_stats():
         top_table.add_column("Tráfico Total", style="green", justify="right")
         
         for i, conn in enumerate(sorted_conns, 1):
-            total = conn.get('bytes_recv', 0) + conn.get('bytes_sent', 0)
-            top_table.add_row(str(i), conn['user'], format_bytes(total))
+            top_table.add_row(str(i), conn.user, format_bytes(conn.bytes_total))
         
         console.print(top_table)
     
+    history = results['history'].value
+    if history:
+        console.print("\n[bold cyan]Top usuarios por tráfico (este mes, histórico):[/bold cyan]\n")
+        
+        month_table = Table(box=box.ROUNDED)
+        month_table.add_column("#", style="dim", width=3)
+        month_table.add_column("Usuario", style="cyan bold")
+        month_table.add_column("📥 Recibido", style="green", justify="right")
+        month_table.add_column("📤 Enviado", style="green", justify="right")
+        month_table.add_column("Tráfico Total", style="green bold", justify="right")
+        
+        for i, row in enumerate(history, 1):
+            month_table.add_row(str(i), row['user'], format_bytes(row['bytes_recv']),
+                                format_bytes(row['bytes_sent']), format_bytes(row['bytes_total']))
+        
+        console.print(month_table)
+    
+    expiring = results['expiring'].value
+    if expiring:
+        console.print(f"\n[bold yellow]Certificados que caducan en {current_settings().cert_expiring_days} días o menos:[/bold yellow]\n")
+        
+        expiry_table = Table(box=box.ROUNDED)
+        expiry_table.add_column("Usuario", style="cyan bold")
+        expiry_table.add_column("Caduca", style="white")
+        expiry_table.add_column("Días", style="yellow", justify="right")
+        
+        for entry in expiring[:10]:
+            expiry_table.add_row(entry.cn, openssl_date_iso(entry.expires), str(days_until(entry.expires)))
+        if len(expiring) > 10:
+            expiry_table.caption = f"y {len(expiring) - 10} más · ovpn-manager expiry"
+        
+        console.print(expiry_table)
+    
     console.print()
     Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
 
@@ -652,54 +4523,594 @@ def show_config():
     console.print(Panel("[bold]⚙️  Configuración Actual[/bold]", border_style="blue"))
     console.print()
     
+    current = current_settings()
     config_table = Table(box=box.SIMPLE, show_header=False)
     config_table.add_column("Parámetro", style="cyan bold")
     config_table.add_column("Valor", style="white")
     
-    config_table.add_row("📋 Log path", DEFAULT_LOG_PATH)
-    config_table.add_row("📊 Status path", DEFAULT_STATUS_PATH)
-    config_table.add_row("🔌 Management host", DEFAULT_MGMT_HOST)
-    config_table.add_row("🔌 Management port", str(DEFAULT_MGMT_PORT))
-    config_table.add_row("🔐 Easy-RSA path", EASYRSA_PATH)
+    config_table.add_row("📋 Log path", current.log_path)
+    config_table.add_row("📊 Status path", current.status_path)
+    config_table.add_row("🔌 Management host", current.mgmt_host)
+    config_table.add_row("🔌 Management port", str(current.mgmt_port))
+    config_table.add_row("🔌 Management socket unix", current.mgmt_unix_socket or "—")
+    config_table.add_row("🔑 Management pw-file", current.mgmt_password_file or "—")
+    config_table.add_row("🔐 Easy-RSA path", current.easyrsa_path)
+    config_table.add_row("📜 CRL publicada", current.crl_path or f"{current.easyrsa_path}/pki/crl.pem")
+    config_table.add_row("📄 Archivo de configuración", current.config_path or "— (valores por defecto)")
     
     console.print(config_table)
     
-    console.print("\n[yellow]💡 Para cambiar estos valores, edita las constantes al inicio del script[/yellow]")
+    servers = load_servers()
+    if len(servers) > 1:
+        servers_table = Table(title=f"🖧 Servidores ({current.servers_path})", box=box.SIMPLE)
+        servers_table.add_column("Nombre", style="cyan bold")
+        servers_table.add_column("Management", style="white")
+        servers_table.add_column("Status", style="dim")
+        for server in servers:
+            servers_table.add_row(server.name, server.unix_path or f"{server.host}:{server.port}",
+                                  server.status_path or "—")
+        console.print(servers_table)
+    
+    console.print(f"\n[yellow]💡 Para cambiar estos valores edita {CONFIG_PATHS[0]}, define variables {CONFIG_ENV_PREFIX}* o usa las opciones globales (ovpn-manager --help)[/yellow]")
+    
+    console.print()
+    Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
+
+CONNECTION_FIELDS = ['user', 'real_ip', 'virtual_ip', 'bytes_recv', 'bytes_sent', 'connected_since', 'client_id']
+RESULT_FIELDS = ['user', 'ok', 'detail']
+KICK_FIELDS = ['user', 'server', 'real_ip', 'client_id', 'ok', 'detail']
+
+@timed
+def emit_rows(rows, fields, fmt: str, out=None):
+    """
+    Escribe filas como JSON lines o CSV a medida que se generan.
+
+    Args:
+        rows: Iterable de diccionarios
+        fields: Columnas (y su orden en CSV)
+        fmt: 'json' o 'csv'
+        out: Destino (por defecto stdout)
+
+    Returns:
+        Número de filas escritas
+    """
+    out = out or sys.stdout
+    count = 0
+    if fmt == 'csv':
+        import csv
+        
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        import json
+        
+        for row in rows:
+            out.write(json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False) + "\n")
+            count += 1
+    out.flush()
+    return count
+
+def cli_command(func):
+    """
+    Decorador de los subcomandos: `handler(args, settings=None)`.
+
+    Con unos Settings explícitos, todo lo que se ejecuta durante la llamada
+    (hilos de gather_sources incluidos) los usa en lugar de los globales:
+    un test o un benchmark puede apuntar a un PKI de prueba o a un management
+    falso sin tocar el estado del módulo.
+    """
+    import functools
+    
+    @functools.wraps(func)
+    def wrapper(args, settings: Settings = None):
+        with using_settings(settings):
+            return func(args)
+    return wrapper
+
+def cli_error(message: str):
+    """Mensaje de error en modo no interactivo (stderr, sin formato)"""
+    print(f"ovpn-manager: {message}", file=sys.stderr)
+
+def cli_timings(action: str, timings: Timings):
+    """Desglose de --timings de un subcomando (stderr: stdout lleva los datos)"""
+    print(f"ovpn-manager: {action}: {timings.total() * 1000:.1f} ms", file=sys.stderr)
+    for row in timings.rows():
+        print(f"  {row['span']:<40} {row['calls']:>6}x {row['ms']:>10.1f} ms {row['percent']:>6.1f} %",
+              file=sys.stderr)
+    if _profile_path:
+        print(f"  perfil de cProfile en {_profile_path}", file=sys.stderr)
+
+def cli_usernames(args):
+    """Usuarios indicados como argumentos y/o en --file (- para stdin)"""
+    usernames = list(args.users)
+    if args.file:
+        usernames.extend(read_user_list(args.file))
+    return list(dict.fromkeys(usernames))
+
+@cli_command
+def cli_connections(args):
+    """Subcomando `connections`"""
+    fields = CONNECTION_FIELDS
+    failed = False
+    if is_multi_server():
+        rows, results = gather_connections()
+        for name, result in results.items():
+            if result.error is not None:
+                cli_error(f"{name}: {result.error}")
+                failed = True
+        fields = ['server'] + CONNECTION_FIELDS
+    else:
+        rows = iter_active_connections()
+    if args.sort == 'traffic':
+        rows = sorted(rows, key=lambda x: x.bytes_total, reverse=True)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+    emit_rows((conn.as_dict(fields) for conn in rows), fields, args.format)
+    return 1 if failed else 0
+
+@cli_command
+def cli_stats(args):
+    """Subcomando `stats`"""
+    results = {r.name: r for r in gather_sources(stats_sources(), STATS_SOURCE_DEADLINES)}
+    for name in ('valid', 'revoked'):
+        if results[name].error is not None:
+            raise RuntimeError(f"certificados ({name}): {results[name].error}")
+    connections, _ = stats_connections(results)
+    total_recv = sum(conn.bytes_recv for conn in connections)
+    total_sent = sum(conn.bytes_sent for conn in connections)
+    row = {
+        'connected_users': len(connections),
+        'valid_certificates': len(results['valid'].value),
+        'revoked_certificates': len(results['revoked'].value),
+        'bytes_recv': total_recv,
+        'bytes_sent': total_sent,
+        'bytes_total': total_recv + total_sent,
+    }
+    emit_rows([row], list(row), args.format)
+    return 0
+
+@cli_command
+def cli_certs(args):
+    """Subcomando `certs`"""
+    from pathlib import Path
+    
+    index_file = Path(current_settings().easyrsa_path) / "pki" / "index.txt"
+    if not index_file.exists():
+        if args.status not in ('valid', 'all'):
+            cli_error(f"no se encontró {index_file}")
+            return 1
+        rows = ({'user': user, 'status': 'valid'} for user in get_valid_certificates())
+        emit_rows(rows, ['user', 'status', 'expires', 'revoked', 'serial'], args.format)
+        return 0
+    
+    inventory = CertificateInventory.load()
+    statuses = ('valid', 'revoked', 'expired') if args.status == 'all' else (args.status,)
+    
+    def rows():
+        for status in statuses:
+            for user in getattr(inventory, status)():
+                latest = inventory.entries(user)[-1]
+                yield {
+                    'user': user,
+                    'status': status,
+                    'expires': openssl_date_iso(latest.expires),
+                    'revoked': openssl_date_iso(latest.revoked),
+                    'serial': latest.serial,
+                }
+    
+    emit_rows(rows(), ['user', 'status', 'expires', 'revoked', 'serial'], args.format)
+    return 0
+
+@cli_command
+def cli_expiry(args):
+    """Subcomando `expiry`: certificados vigentes que caducan pronto"""
+    days = None if args.all else (current_settings().cert_expiring_days if args.days is None else args.days)
+    rows = ({
+        'user': entry.cn,
+        'serial': entry.serial,
+        'expires': openssl_date_iso(entry.expires),
+        'days_left': days_until(entry.expires),
+        'source': entry.source,
+    } for entry in certificate_expiry_report(days))
+    emit_rows(rows, ['user', 'serial', 'expires', 'days_left', 'source'], args.format)
+    return 0
+
+@cli_command
+def cli_analyze(args):
+    """Subcomando `analyze`: agregados de muchos snapshots del archivo de status"""
+    started = time.perf_counter()
+    analytics = SnapshotAnalytics()
+    for path in sorted(args.snapshots, key=lambda path: os.stat(path).st_mtime, reverse=True):
+        try:
+            analytics.add_file(path)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    
+    if args.by == 'summary':
+        fields = ['metric', 'count', 'p50', 'p90', 'p99', 'max']
+        rows = []
+        for metric, values in (('duration_seconds', analytics.durations()),
+                               ('throughput_bytes_per_second', analytics.throughputs())):
+            points = percentiles(values)
+            rows.append({'metric': metric, 'count': len(values), 'p50': points[50], 'p90': points[90],
+                         'p99': points[99], 'max': max(values) if values else None})
+    elif args.by == 'user':
+        fields = ['user', 'sessions', 'bytes_recv', 'bytes_sent', 'bytes_total', 'seconds']
+        rows = ({'user': user, 'sessions': sessions, 'bytes_recv': recv, 'bytes_sent': sent,
+                 'bytes_total': recv + sent, 'seconds': seconds}
+                for user, (sessions, recv, sent, seconds) in analytics.by_user().items())
+    else:
+        fields = ['subnet', 'sessions', 'users', 'bytes_total']
+        rows = ({'subnet': subnet, 'sessions': sessions, 'users': users, 'bytes_total': total}
+                for subnet, (sessions, users, total) in analytics.by_subnet().items())
+    if args.by != 'summary':
+        key = lambda row: row['bytes_total']
+        rows = heapq.nlargest(args.limit, rows, key=key) if args.limit else sorted(rows, key=key, reverse=True)
+    
+    emit_rows(rows, fields, args.format)
+    print(f"{analytics.rows} filas de {analytics.snapshots} snapshot(s), {len(analytics)} sesiones "
+          f"en {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+@cli_command
+def cli_revoke(args):
+    """Subcomando `revoke`"""
+    usernames = cli_usernames(args)
+    if not usernames:
+        cli_error("indica al menos un usuario")
+        return 2
+    if not args.yes:
+        cli_error("la revocación requiere --yes en modo no interactivo")
+        return 2
+    
+    valid_set = set(get_valid_certificates())
+    unknown = [(u, False, "Sin certificado activo") for u in usernames if u not in valid_set]
+    results, crl_error, _ = revoke_certificates([u for u in usernames if u in valid_set])
+    results += unknown
+    
+    revoked = [u for u, ok, _ in results if ok]
+    if revoked and not crl_error and not args.no_kick:
+        rows, failed = disconnect_users(revoked)
+        for name, error in failed.items():
+            cli_error(f"{name}: {error}")
+        sessions = {}
+        for row in rows:
+            sessions.setdefault(row['user'], []).append(row['ok'])
+        results = [(u, ok, f"{d} · {sum(sessions[u])}/{len(sessions[u])} sesión(es) desconectada(s)"
+                    if u in sessions else d) for u, ok, d in results]
+    
+    emit_rows(({'user': u, 'ok': ok, 'detail': d} for u, ok, d in results), RESULT_FIELDS, args.format)
+    if crl_error:
+        cli_error(f"error al generar CRL: {crl_error.strip()}")
+    return 0 if not crl_error and all(ok for _, ok, _ in results) else 1
+
+@cli_command
+def cli_kick(args):
+    """Subcomando `kick`: desconecta sesiones por usuario y/o filtros"""
+    usernames = cli_usernames(args)
+    filters = dict(pattern=args.match, network=args.network, idle=args.idle,
+                   min_bytes=args.min_bytes, max_bytes=args.max_bytes)
+    if not usernames and all(value is None for value in filters.values()):
+        cli_error("indica al menos un usuario o un filtro (--match, --network, --idle, --min-bytes, --max-bytes)")
+        return 2
+    
+    started = time.perf_counter()
+    connections, results = gather_connections()
+    for name, result in results.items():
+        if result.error is not None:
+            cli_error(f"{name}: {result.error}")
+    if args.idle is not None:
+        attach_last_activity(connections)
+    targets = filter_connections(connections, users=usernames or None, **filters)
+    
+    if args.dry_run:
+        rows = [{'user': conn.user, 'server': conn.server or load_servers()[0].name,
+                 'real_ip': conn.real_ip, 'client_id': conn.client_id, 'ok': True,
+                 'detail': "sin desconectar (--dry-run)"} for conn in targets]
+    else:
+        rows = kill_connections(targets)
+    found = {row['user'] for row in rows}
+    rows.extend({'user': user, 'server': None, 'real_ip': '', 'client_id': '', 'ok': False,
+                 'detail': "no está conectado"} for user in usernames if user not in found)
+    
+    emit_rows(rows, KICK_FIELDS, args.format)
+    killed = sum(1 for row in rows if row['ok'] and row['server'])
+    print(f"{killed}/{len(targets)} sesión(es) {'seleccionadas' if args.dry_run else 'desconectadas'} "
+          f"en {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0 if all(row['ok'] for row in rows) else 1
+
+@cli_command
+def cli_logs(args):
+    """Subcomando `logs`"""
+    if args.user or args.ip or args.since or args.until:
+        since = parse_date_input(args.since or "")
+        until = parse_date_input(args.until or "")
+        with LogIndex() as index:
+            index.update()
+            lines = index.search(args.user, args.ip, since, until, limit=args.lines)
+    else:
+        try:
+            with open(current_settings().log_path, 'rb') as f:
+                lines = tail_lines(f, args.lines)
+        except OSError as e:
+            cli_error(str(e))
+            return 1
+    emit_rows(({'line': line} for line in lines), ['line'], args.format)
+    return 0
+
+@cli_command
+def cli_traffic_record(args):
+    """Subcomando `traffic record`: guarda snapshots de tráfico en el histórico"""
+    with TrafficHistory() as history:
+        if args.interval <= 0:
+            # Un único snapshot (pensado para cron)
+            history.record(iter_active_connections())
+            return 0
+        
+        client = get_mgmt_client()
+        client.add_listener(history.handle)
+        print(f"Registrando tráfico en {history.path} cada {args.interval:g} s", file=sys.stderr)
+        try:
+            while True:
+                history.record(iter_active_connections())
+                deadline = time.monotonic() + args.interval
+                while (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        client.poll(remaining)
+                    except OSError:
+                        # Sin management sólo hay snapshots del archivo de status
+                        time.sleep(remaining)
+                    history.flush_disconnects()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.remove_listener(history.handle)
+            history.flush_disconnects()
+    return 0
+
+@cli_command
+def cli_traffic_top(args):
+    """Subcomando `traffic top`: usuarios con más tráfico según el histórico"""
+    if args.period == 'month':
+        since = month_start()
+    elif args.period in ('day', 'week'):
+        since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if args.period == 'week':
+            since -= timedelta(days=since.weekday())
+    else:
+        since = None
+    since = parse_date_input(args.since) if args.since else since
+    until = parse_date_input(args.until) if args.until else None
+    with TrafficHistory() as history:
+        rows = history.top(since, until, limit=args.limit)
+    emit_rows(rows, ['user', 'bytes_recv', 'bytes_sent', 'bytes_total'], args.format)
+    return 0
+
+@cli_command
+def cli_serve_metrics(args):
+    """Subcomando `serve-metrics`: endpoint HTTP /metrics para Prometheus"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    host = current_settings().metrics_host if args.host is None else args.host
+    port = current_settings().metrics_port if args.port is None else args.port
+    collector = MetricsCollector(interval=args.interval, expiring_days=args.expiring_days)
+    collector.start()
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = collector.body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    print(f"Métricas en http://{host}:{server.server_port}/metrics "
+          f"(actualización cada {collector.interval:g} s)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        server.server_close()
+    return 0
+
+def build_arg_parser():
+    """Parser de la línea de comandos (sin subcomando se abre el menú interactivo)"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="ovpn-manager",
+        description="Gestión de servidor OpenVPN. Sin subcomando abre el menú interactivo.",
+        epilog=f"Los ajustes se leen de {CONFIG_PATHS[0]} (o .ini), de las variables "
+               f"{CONFIG_ENV_PREFIX}* y de las opciones globales, en ese orden de prioridad creciente.",
+    )
+    config = parser.add_argument_group("configuración (antes del subcomando)")
+    config.add_argument("--config", help=f"Archivo de configuración TOML/INI (por defecto {CONFIG_PATHS[0]})")
+    config.add_argument("--log-path", help="Log de OpenVPN")
+    config.add_argument("--status-path", help="Archivo de status de OpenVPN")
+    config.add_argument("--mgmt-host", help="Host del management interface")
+    config.add_argument("--mgmt-port", type=int, help="Puerto del management interface")
+    config.add_argument("--mgmt-socket", dest="mgmt_unix_socket", help="Socket unix del management interface")
+    config.add_argument("--mgmt-password-file", help="Archivo de contraseña del management interface")
+    config.add_argument("--easyrsa-path", help="Directorio de easy-rsa")
+    config.add_argument("--crl-path", help="Ruta de la CRL que lee OpenVPN (crl-verify)")
+    config.add_argument("--servers", dest="servers_path", help="Inventario de servidores (INI)")
+    diagnostics = parser.add_argument_group("diagnóstico")
+    diagnostics.add_argument("--timings", action="store_true",
+                             help="Desglose de tiempos por tramo al terminar cada acción (stderr en subcomandos)")
+    diagnostics.add_argument("--profile", metavar="ARCHIVO",
+                             help="Guardar el perfil de cProfile en ARCHIVO (implica --timings)")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=["json", "csv"], default="json",
+                        help="Formato de salida: JSON lines (por defecto) o CSV")
+    users = argparse.ArgumentParser(add_help=False)
+    users.add_argument("users", nargs="*", help="Usuarios (Common Name)")
+    users.add_argument("--file", help="Archivo con un usuario por línea (- para stdin)")
+    
+    sub = parser.add_subparsers(dest="command", metavar="COMANDO")
+    
+    cmd = sub.add_parser("connections", parents=[output], help="Conexiones activas")
+    cmd.add_argument("--sort", choices=["none", "traffic"], default="none", help="Orden de las filas")
+    cmd.add_argument("--limit", type=int, default=0, help="Máximo de filas (0 = todas)")
+    cmd.set_defaults(handler=cli_connections)
+    
+    cmd = sub.add_parser("stats", parents=[output], help="Estadísticas generales")
+    cmd.set_defaults(handler=cli_stats)
+    
+    cmd = sub.add_parser("certs", parents=[output], help="Inventario de certificados")
+    cmd.add_argument("--status", choices=["valid", "revoked", "expired", "all"], default="all")
+    cmd.set_defaults(handler=cli_certs)
+    
+    cmd = sub.add_parser("expiry", parents=[output], help="Certificados vigentes que caducan pronto")
+    cmd.add_argument("--days", type=int, help="Margen en días (por defecto el ajuste cert_expiring_days)")
+    cmd.add_argument("--all", action="store_true", help="Todos los vigentes, ordenados por caducidad")
+    cmd.set_defaults(handler=cli_expiry)
+    
+    cmd = sub.add_parser("revoke", parents=[output, users], help="Revocar certificados (una sola CRL)")
+    cmd.add_argument("--yes", action="store_true", help="Confirmar la revocación")
+    cmd.add_argument("--no-kick", action="store_true", help="No desconectar las sesiones abiertas de los revocados")
+    cmd.set_defaults(handler=cli_revoke)
+    
+    cmd = sub.add_parser("kick", parents=[output, users], help="Desconectar sesiones por usuario o filtro")
+    cmd.add_argument("--match", help="Patrón de usuario con comodines (p. ej. 'ext-*')")
+    cmd.add_argument("--network", help="Red CIDR de la IP real (p. ej. 203.0.113.0/24)")
+    cmd.add_argument("--idle", type=float, help="Segundos mínimos sin tráfico")
+    cmd.add_argument("--min-bytes", type=int, help="Tráfico total mínimo (bytes)")
+    cmd.add_argument("--max-bytes", type=int, help="Tráfico total máximo (bytes)")
+    cmd.add_argument("--dry-run", action="store_true", help="Mostrar las sesiones sin desconectarlas")
+    cmd.set_defaults(handler=cli_kick)
+    
+    cmd = sub.add_parser("logs", parents=[output], help="Últimas líneas o búsqueda en logs")
+    cmd.add_argument("-n", "--lines", type=int, default=50, help="Número de líneas / resultados")
+    cmd.add_argument("--user", help="Filtrar por usuario (usa el índice de logs)")
+    cmd.add_argument("--ip", help="Filtrar por IP real")
+    cmd.add_argument("--since", help="Desde YYYY-MM-DD [HH:MM]")
+    cmd.add_argument("--until", help="Hasta YYYY-MM-DD [HH:MM]")
+    cmd.set_defaults(handler=cli_logs)
     
+    cmd = sub.add_parser("traffic", help="Histórico de tráfico por usuario")
+    traffic = cmd.add_subparsers(dest="action", metavar="ACCIÓN", required=True)
+    cmd = traffic.add_parser("record", help="Registrar snapshots de tráfico")
+    cmd.add_argument("--interval", type=float, default=TRAFFIC_RECORD_INTERVAL,
+                     help="Segundos entre snapshots (0 = uno solo, para cron)")
+    cmd.set_defaults(handler=cli_traffic_record)
+    cmd = traffic.add_parser("top", parents=[output], help="Usuarios con más tráfico")
+    cmd.add_argument("--period", choices=["day", "week", "month", "all"], default="month",
+                     help="Periodo (por defecto el mes en curso)")
+    cmd.add_argument("--since", help="Desde YYYY-MM-DD [HH:MM] (sustituye a --period)")
+    cmd.add_argument("--until", help="Hasta YYYY-MM-DD [HH:MM]")
+    cmd.add_argument("--limit", type=int, default=20, help="Máximo de usuarios")
+    cmd.set_defaults(handler=cli_traffic_top)
+    
+    cmd = sub.add_parser("analyze", parents=[output], help="Análisis de snapshots archivados del status")
+    cmd.add_argument("snapshots", nargs="+", help="Archivos de status (versión 1, 2 o 3; admite .gz)")
+    cmd.add_argument("--by", choices=["summary", "user", "subnet"], default="summary",
+                     help="Percentiles de duración y throughput (por defecto), totales por usuario o por red /24")
+    cmd.add_argument("--limit", type=int, default=0, help="Máximo de filas por tráfico (0 = todas)")
+    cmd.set_defaults(handler=cli_analyze)
+    
+    cmd = sub.add_parser("serve-metrics", help="Exportador de métricas para Prometheus")
+    cmd.add_argument("--host", help=f"Dirección de escucha (ajuste metrics_host, por defecto {METRICS_HOST})")
+    cmd.add_argument("--port", type=int, help=f"Puerto (ajuste metrics_port, por defecto {METRICS_PORT})")
+    cmd.add_argument("--interval", type=float,
+                     help="Segundos entre consultas al servidor (ajuste metrics_interval)")
+    cmd.add_argument("--expiring-days", type=int,
+                     help="Margen en días para contar certificados que caducan pronto (ajuste cert_expiring_days)")
+    cmd.set_defaults(handler=cli_serve_metrics)
+    
+    return parser
+
+def show_timings(action: str, timings: Timings):
+    """Desglose de --timings de una opción del menú"""
+    table = Table(title=f"⏱  {action}: {timings.total() * 1000:.1f} ms", box=box.SIMPLE, title_style="bold")
+    table.add_column("Tramo", style="cyan")
+    table.add_column("Llamadas", justify="right")
+    table.add_column("Tiempo", style="green", justify="right")
+    table.add_column("%", style="dim", justify="right")
+    for row in timings.rows():
+        table.add_row(row['span'], str(row['calls']), f"{row['ms']:.1f} ms", f"{row['percent']:.1f}")
     console.print()
+    console.print(table)
+    if _profile_path:
+        console.print(f"[dim]Perfil de cProfile (acumulado de la sesión) en {_profile_path}[/dim]")
     Prompt.ask("[dim]Presiona Enter para continuar[/dim]")
 
-def main():
-    """Función principal con menú interactivo"""
+def interactive_menu():
+    """Menú interactivo"""
+    load_ui()
     while True:
         clear_screen()
         show_header()
         show_menu()
         
-        choice = Prompt.ask("Selecciona una opción", choices=["0", "1", "2", "3", "4", "5", "6", "7"], default="0")
+        choice = Prompt.ask("Selecciona una opción", choices=["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"], default="0")
         
         if choice == "0":
             console.print("\n[yellow]👋 ¡Hasta luego![/yellow]\n")
             break
-        elif choice == "1":
-            view_logs()
-        elif choice == "2":
-            view_connections()
-        elif choice == "3":
-            revoke_user()
-        elif choice == "4":
-            restore_user()
-        elif choice == "5":
-            kick_user()
-        elif choice == "6":
-            show_stats()
-        elif choice == "7":
-            show_config()
+        with measure(f"Opción {choice}", show_timings):
+            if choice == "1":
+                view_logs()
+            elif choice == "2":
+                view_connections()
+            elif choice == "3":
+                revoke_user()
+            elif choice == "4":
+                restore_user()
+            elif choice == "5":
+                kick_user()
+            elif choice == "6":
+                show_stats()
+            elif choice == "7":
+                show_config()
+            elif choice == "8":
+                search_logs()
+            elif choice == "9":
+                bulk_issue()
+
+def main(argv=None):
+    """Función principal: subcomando no interactivo o menú interactivo"""
+    args = build_arg_parser().parse_args(argv)
+    overrides = {name: getattr(args, name, None) for name in SETTINGS_DEFAULTS}
+    try:
+        configure(load_settings(args.config, overrides))
+    except (OSError, ValueError) as e:
+        cli_error(f"Configuración: {e}")
+        return 2
+    enable_profiling(args.timings, args.profile)
+    if not args.command:
+        interactive_menu()
+        return 0
+    action = " ".join(filter(None, (args.command, getattr(args, 'action', None))))
+    try:
+        with measure(action, cli_timings):
+            return args.handler(args)
+    except BrokenPipeError:
+        # La salida se canalizó a un proceso que terminó antes (p. ej. `| head`)
+        return 0
+    except (OSError, RuntimeError, ValueError) as e:
+        cli_error(str(e))
+        return 1
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         console.print("\n\n[yellow]👋 Interrumpido por el usuario. ¡Hasta luego![/yellow]\n")
     except Exception as e:
-        console.print(f"\n[red]❌ Error inesperado: {e}[/red]\n")
\ No newline at end of file
+        console.print(f"\n[red]❌ Error inesperado: {e}[/red]\n")
+    finally:
+        close_mgmt_client()